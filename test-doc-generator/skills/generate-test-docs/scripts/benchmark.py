@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准 - 生成合成语料并测量脚本各环节耗时、吞吐与峰值内存
+依赖：pip install openpyxl PyMuPDF python-docx
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+# 各子命令的启动耗时预算（毫秒，扣除空解释器启动时间后的增量）
+STARTUP_BUDGETS_MS = {
+    "memory_manager get-mode": 60,
+    "extract_document markdown": 80,
+    "generate_excel --help": 60,
+    "generate_excel markdown": 80,
+    "generate_excel --learn": 400,
+}
+# corpus 基准的回归判定：耗时或峰值内存超过基线的比例，耗时差小于噪声下限（秒）时不计
+REGRESSION_TOLERANCE = 0.25
+REGRESSION_MIN_SECONDS = 0.1
+
+
+def make_pdf(path: str, pages: int):
+    """生成多页合成 PDF（每页若干段需求描述）"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for page_num in range(1, pages + 1):
+        page = doc.new_page()
+        lines = [f"{page_num}. Module {page_num % 17}"]
+        for i in range(40):
+            lines.append(f"REQ_{page_num:04d}_{i:02d}: the system shall validate input "
+                         f"length between 1 and {i + 8} characters")
+        page.insert_text((40, 50), "\n".join(lines), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_pdf(pages: int, jobs_list: list, workdir: str) -> list:
+    """PDF 按页并行提取的扩展性：不同进程数下的耗时与加速比"""
+    from extract_document import extract_pdf
+
+    pdf_path = os.path.join(workdir, f"synthetic-{pages}p.pdf")
+    make_pdf(pdf_path, pages)
+
+    results = []
+    baseline = None
+    reference = None
+    for jobs in jobs_list:
+        elapsed, content = _timed(extract_pdf, pdf_path, jobs)
+        if reference is None:
+            reference = content
+        baseline = baseline or elapsed
+        results.append({
+            "suite": "pdf",
+            "pages": pages,
+            "jobs": jobs,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(pages / elapsed, 1),
+            "speedup": round(baseline / elapsed, 2),
+            "identical": content == reference,
+        })
+    return results
+
+
+def make_decisions(count: int) -> list:
+    """生成合成歧义决策（中英混合的上下文）"""
+    import random
+
+    rng = random.Random(42)
+    subjects = ["密码", "用户名", "验证码", "订单", "支付", "库存", "优惠券", "手机号",
+                "邮箱", "头像", "昵称", "地址", "发票", "退款", "积分", "会员"]
+    aspects = ["长度", "复杂度", "有效期", "格式", "上限", "重试次数", "超时", "精度"]
+    words = ["length", "timeout", "retry", "format", "limit", "expire", "precision", "range"]
+    types = ["BOUNDARY_UNCLEAR", "MISSING_ERROR", "RULE_CONFLICT", "UNDEFINED_TERM"]
+    return [{
+        "type": rng.choice(types),
+        "context": f"{rng.choice(subjects)}{rng.choice(aspects)}{rng.choice(aspects)} "
+                   f"{rng.choice(words)} M{rng.randrange(count)}",
+        "user_decision": f"决策 {i}",
+    } for i in range(count)]
+
+
+def bench_ambiguity(count: int, queries: int = 200) -> list:
+    """歧义决策索引：建索引耗时与单次 top-k 查询耗时"""
+    import random
+    import statistics
+    from memory_manager import build_ambiguity_index, search_ambiguity_index
+
+    decisions = make_decisions(count)
+    build_seconds, index = _timed(build_ambiguity_index, decisions)
+    rng = random.Random(7)
+    samples = []
+    for _ in range(queries):
+        context = rng.choice(decisions)["context"]
+        elapsed, _ = _timed(search_ambiguity_index, index, context, None, 5)
+        samples.append(elapsed * 1000)
+    samples.sort()
+    return [{
+        "suite": "ambiguity",
+        "decisions": count,
+        "build_seconds": round(build_seconds, 3),
+        "query_ms_median": round(statistics.median(samples), 3),
+        "query_ms_p95": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }]
+
+
+def _contention_writer(project: str, writer: int, records: int) -> int:
+    """并发写入进程：逐条追加生成记录（每条都是一次独立的读-改-写）"""
+    import contextlib
+    import io
+    from memory_manager import add_generation_record
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(records):
+            add_generation_record(project, {"type": "test_case", "writer": writer, "seq": i})
+    return records
+
+
+def bench_contention(writers: int, records: int, workdir: str, backend: str = "json") -> list:
+    """多个进程同时追加记录：全部记录是否落盘、JSON 是否完整，以及整体吞吐"""
+    import contextlib
+    import io
+    from concurrent.futures import ProcessPoolExecutor
+    from memory_manager import init_memory, migrate_memory, read_memory
+
+    project = os.path.join(workdir, f"contention-{backend}")
+    os.makedirs(project)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_memory(project)
+        if backend == "sqlite":
+            migrate_memory(project, "sqlite")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(_contention_writer, [project] * writers, range(writers),
+                      [records] * writers))
+    elapsed = time.perf_counter() - start
+
+    landed = read_memory(project, "generation_history").get("generations", [])
+    expected = writers * records
+    return [{
+        "suite": "contention",
+        "backend": backend,
+        "writers": writers,
+        "records": expected,
+        "landed": len(landed),
+        "complete": len(landed) == expected and
+                    len({(r["writer"], r["seq"]) for r in landed}) == expected,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(expected / elapsed, 1),
+    }]
+
+
+def make_cases(count: int) -> list:
+    """生成合成测试用例（默认列全部填充）"""
+    priorities = ["P0", "P1", "P2", "P3"]
+    regressions = ["冒烟", "核心", "全量"]
+    return [{
+        "用例编号": f"TC_M{i % 20:02d}_{i:06d}",
+        "模块名称": f"模块{i % 20}",
+        "用例标题": f"验证输入长度边界 {i}",
+        "优先级": priorities[i % 4],
+        "关联需求ID": f"REQ_{i % 500:04d}",
+        "设计方法": "BVA",
+        "前置条件": "用户已登录",
+        "测试步骤": "1. 打开页面\n2. 输入边界值\n3. 提交",
+        "预期结果": "提示长度错误",
+        "回归类型": regressions[i % 3],
+    } for i in range(count)]
+
+
+def bench_writers(count: int, workdir: str) -> list:
+    """同一批用例在各输出格式下的写出耗时与吞吐"""
+    from generate_excel import create_excel
+
+    cases = make_cases(count)
+    targets = [
+        ("xlsx", {}, "cases.xlsx"),
+        ("xlsx --streaming", {"streaming": True}, "cases-streaming.xlsx"),
+        ("csv", {}, "cases.csv"),
+        ("jsonl", {}, "cases.jsonl"),
+        ("markdown", {}, "cases.md"),
+    ]
+    results = []
+    baseline = None
+    for name, options, filename in targets:
+        output = os.path.join(workdir, filename)
+        elapsed, written = _timed(create_excel, output, cases, **options)
+        baseline = baseline or elapsed
+        results.append({
+            "suite": "writers",
+            "format": name,
+            "cases": written,
+            "seconds": round(elapsed, 3),
+            "cases_per_sec": round(written / elapsed, 1),
+            "speedup_vs_xlsx": round(baseline / elapsed, 2),
+            "bytes": os.path.getsize(output),
+        })
+    return results
+
+
+def make_docx(path: str, sections: int):
+    """生成大型合成 Word 文档：每章一个标题、若干段落和一个含合并单元格的表格
+
+    正文 XML 直接拼接写入，样式部件沿用 python-docx 默认模板。
+    """
+    import zipfile
+    from xml.sax.saxutils import escape
+
+    from docx import Document
+
+    base = os.path.join(os.path.dirname(path), "base.docx")
+    Document().save(base)
+
+    def para(text, style=None):
+        ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+        return f'<w:p>{ppr}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+    def cell(text, props=''):
+        return f'<w:tc><w:tcPr>{props}</w:tcPr>{para(text)}</w:tc>'
+
+    body = []
+    for n in range(1, sections + 1):
+        body.append(para(f"{n}. 模块 {n % 17} 功能需求", "Heading1"))
+        for i in range(12):
+            body.append(para(f"REQ_{n:05d}_{i:02d}：系统应校验输入长度在 1 到 {i + 8} 个字符之间，"
+                             f"超出范围时提示错误并保留已输入内容。"))
+        body.append('<w:p/>')
+        rows = ['<w:tr>' + cell("字段", '<w:gridSpan w:val="2"/>') + cell("规则") + '</w:tr>']
+        for r in range(6):
+            merge = '<w:vMerge w:val="restart"/>' if r == 0 else '<w:vMerge/>'
+            rows.append('<w:tr>' + cell(f"字段{r}") + cell(f"类型{r}")
+                        + cell(f"长度 {n}-{r}", merge) + '</w:tr>')
+        body.append('<w:tbl><w:tblGrid><w:gridCol/><w:gridCol/><w:gridCol/></w:tblGrid>'
+                    + ''.join(rows) + '</w:tbl>')
+
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                '<w:body>' + ''.join(body) + '<w:sectPr/></w:body></w:document>')
+    with zipfile.ZipFile(base) as src, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = document.encode('utf-8') if item.filename == 'word/document.xml' else src.read(item)
+            dst.writestr(item, data)
+    os.unlink(base)
+
+
+def legacy_extract_docx(file_path: str) -> dict:
+    """基于 python-docx 的原提取实现，作为 docx 基准的对照"""
+    from docx import Document
+
+    doc = Document(file_path)
+    paragraphs = [{"text": para.text, "style": para.style.name if para.style else None}
+                  for para in doc.paragraphs if para.text.strip()]
+    tables = [{"index": idx, "data": [[cell.text for cell in row.cells] for row in table.rows]}
+              for idx, table in enumerate(doc.tables)]
+    return {"format": "docx", "source": file_path, "paragraphs": paragraphs, "tables": tables,
+            "full_text": "\n".join(p["text"] for p in paragraphs)}
+
+
+# 子进程打印自身峰值常驻内存（KB）：Linux 读 VmHWM（exec 后重新计数），
+# 其他平台退回 ru_maxrss（fork 时会继承父进程的峰值，数值偏大）
+PEAK_RSS_SNIPPET = """
+try:
+    print([l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0])
+except OSError:
+    import resource, sys
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(rss // 1024 if sys.platform == 'darwin' else rss)
+"""
+
+
+def _peak_rss_mb(module: str, function: str, path: str) -> float:
+    """在子进程中执行一次提取函数，返回该进程的峰值常驻内存（MB）"""
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); "
+            f"import {module}; {module}.{function}(sys.argv[2])" + PEAK_RSS_SNIPPET)
+    output = subprocess.run([sys.executable, "-c", code, str(SCRIPTS_DIR), path],
+                            capture_output=True, text=True, check=True).stdout
+    return round(int(output.split()[-1]) / 1024, 1)
+
+
+def stream_docx_blocks(file_path: str) -> list:
+    """按正文顺序流式遍历所有块，只保留块类型（模拟 --stream 的逐条输出）"""
+    from extract_document import iter_docx_blocks
+
+    return [block["type"] for block in iter_docx_blocks(file_path)]
+
+
+def bench_docx(sections: int, workdir: str) -> list:
+    """Word 提取：流式 XML 解析与 python-docx 原实现的耗时、峰值内存与输出一致性"""
+    import extract_document
+
+    docx_path = os.path.join(workdir, f"synthetic-{sections}s.docx")
+    make_docx(docx_path, sections)
+    size_mb = round(os.path.getsize(docx_path) / 1024 / 1024, 2)
+
+    baseline, reference = _timed(legacy_extract_docx, docx_path)
+    expected_blocks = len(reference["paragraphs"]) + len(reference["tables"])
+    targets = [
+        ("python-docx", "benchmark", "legacy_extract_docx"),
+        ("iterparse", "extract_document", "extract_docx"),
+        ("iterparse --stream", "benchmark", "stream_docx_blocks"),
+    ]
+    results = []
+    for name, module, function in targets:
+        if function == "legacy_extract_docx":
+            elapsed, content = baseline, reference
+        else:
+            func = getattr(extract_document if module == "extract_document" else sys.modules[__name__],
+                           function)
+            elapsed, content = _timed(func, docx_path)
+        if isinstance(content, dict):
+            # 新实现额外输出标题级别，比较时去掉
+            paragraphs = [{k: v for k, v in p.items() if k != "level"} for p in content["paragraphs"]]
+            identical = paragraphs == reference["paragraphs"] and content["tables"] == reference["tables"]
+        else:
+            identical = len(content) == expected_blocks
+        results.append({
+            "suite": "docx",
+            "implementation": name,
+            "sections": sections,
+            "file_mb": size_mb,
+            "seconds": round(elapsed, 3),
+            "speedup": round(baseline / elapsed, 2),
+            "peak_rss_mb": _peak_rss_mb(module, function, docx_path),
+            "identical": identical,
+        })
+    return results
+
+
+def make_markdown(path: str, sections: int):
+    """生成多章节合成 Markdown PRD（二级模块、三级功能点）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# 合成需求规格说明书\n\n")
+        for n in range(1, sections + 1):
+            f.write(f"## {n}. 模块 {n % 17} 功能需求\n\n")
+            for sub in range(1, 3):
+                f.write(f"### {n}.{sub} 功能点\n\n")
+                for i in range(6):
+                    f.write(f"- REQ_{n:05d}{sub}{i}：系统应校验输入长度在 1 到 {i + 8} 个字符之间，"
+                            f"超出范围时提示错误。\n")
+                f.write("\n")
+
+
+def make_template(path: str, rows: int):
+    """生成带列宽、数据验证和示例数据的用例模板"""
+    from openpyxl import Workbook
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    cases = make_cases(rows)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "测试用例"
+    columns = list(cases[0])
+    ws.append(columns)
+    for col, name in enumerate(columns, 1):
+        ws.column_dimensions[ws.cell(1, col).column_letter].width = 12 + len(name) * 2
+    validation = DataValidation(type="list", formula1='"P0,P1,P2,P3"')
+    validation.add(f"D2:D{rows + 1}")
+    ws.add_data_validation(validation)
+    for case in cases:
+        ws.append([case[name] for name in columns])
+    wb.save(path)
+
+
+def make_history(project: str, runs: int, decisions: int):
+    """生成大型 .memory：初始化后直接写入生成历史与歧义决策"""
+    import random
+    from datetime import datetime, timedelta
+
+    os.makedirs(project, exist_ok=True)
+    subprocess.run([sys.executable, str(SCRIPTS_DIR / "memory_manager.py"), "--action", "init",
+                    "--project", project], stdout=subprocess.DEVNULL, check=True,
+                   env=dict(os.environ, TEST_DOC_NO_WORKER="1"))
+    rng = random.Random(3)
+    now = datetime.now()
+    generations = [{
+        "date": (now - timedelta(minutes=(runs - i) * 50)).isoformat(),
+        "type": rng.choice(["test_case", "test_case", "test_plan", "test_report"]),
+        "source": f"PRD-{i % 40}.pdf",
+        "output": f"用例-{i}.xlsx",
+        "case_count": rng.randrange(10, 400),
+        "modules": [f"模块{rng.randrange(20)}"],
+        "priority_distribution": {"P0": rng.randrange(10), "P1": rng.randrange(40)},
+        "coverage_rate": round(rng.random(), 2),
+    } for i in range(runs)]
+    memory = Path(project) / ".memory"
+    with open(memory / "generation-history.json", 'w', encoding='utf-8') as f:
+        json.dump({"generations": generations}, f, ensure_ascii=False)
+    with open(memory / "ambiguity-decisions.json", 'w', encoding='utf-8') as f:
+        json.dump({"decisions": make_decisions(decisions)}, f, ensure_ascii=False)
+
+
+# 子进程入口：以 __main__ 运行脚本，结束后输出峰值常驻内存，再以脚本的退出码退出
+CORPUS_RUNNER = """
+import os, runpy, sys
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(script))
+code = 0
+try:
+    runpy.run_path(script, run_name='__main__')
+except SystemExit as e:
+    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+""" + PEAK_RSS_SNIPPET + """
+sys.exit(code)
+"""
+
+
+def _run_measured(argv: list) -> tuple:
+    """在子进程中运行脚本，返回 (墙钟秒数, 峰值常驻内存 MB)，含解释器启动开销"""
+    env = dict(os.environ, TEST_DOC_NO_WORKER="1")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CORPUS_RUNNER] + argv,
+                          capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{Path(argv[0]).name} 执行失败: {proc.stderr.strip()[-500:]}")
+    return elapsed, round(int(proc.stdout.split()[-1]) / 1024, 1)
+
+
+def bench_corpus(workdir: str, pages: int, sections: int, case_counts: list,
+                 history_runs: int, decisions: int) -> list:
+    """端到端基准：在合成语料上运行各脚本的命令行，记录耗时、吞吐与峰值内存"""
+    extract = str(SCRIPTS_DIR / "extract_document.py")
+    generate = str(SCRIPTS_DIR / "generate_excel.py")
+    memory = str(SCRIPTS_DIR / "memory_manager.py")
+    results = []
+
+    def measure(name, argv, items, unit):
+        seconds, peak_rss_mb = _run_measured(argv)
+        results.append({
+            "suite": "corpus",
+            "name": name,
+            "items": items,
+            "unit": unit,
+            "seconds": round(seconds, 3),
+            "throughput": round(items / seconds, 1),
+            "peak_rss_mb": peak_rss_mb,
+        })
+
+    # 需求文档提取
+    documents = [("pdf", make_pdf, pages, "页"), ("docx", make_docx, sections, "章"),
+                 ("md", make_markdown, sections, "章")]
+    for suffix, make, size, unit in documents:
+        path = os.path.join(workdir, f"prd.{suffix}")
+        make(path, size)
+        measure(f"extract_document {suffix}", [extract, "-i", path, "--no-cache",
+                                               "-o", path + ".json"], size, unit)
+
+    # 模板学习（工作目录没有 .memory，不走 schema 缓存）
+    template = os.path.join(workdir, "template.xlsx")
+    make_template(template, 2000)
+    measure("generate_excel --learn", [generate, "--learn", template, "--project", workdir], 1, "次")
+
+    # 用例生成：普通 / 追溯矩阵 / 模板
+    requirements = os.path.join(workdir, "requirements.json")
+    with open(requirements, 'w', encoding='utf-8') as f:
+        json.dump([{"id": f"REQ_{i:04d}", "name": f"需求 {i}"} for i in range(600)], f, ensure_ascii=False)
+    for count in case_counts:
+        data = os.path.join(workdir, f"cases-{count}.json")
+        with open(data, 'w', encoding='utf-8') as f:
+            json.dump(make_cases(count), f, ensure_ascii=False)
+        output = os.path.join(workdir, f"cases-{count}.xlsx")
+        base = [generate, "--data-file", data, "-o", output]
+        measure(f"generate_excel {count}", base, count, "条")
+        measure(f"generate_excel {count} --traceability",
+                base + ["--traceability", "-r", requirements], count, "条")
+        measure(f"generate_excel {count} --template", base + ["-t", template], count, "条")
+
+    # 记忆操作：大型生成历史与歧义决策（add-record 触发自动压缩，放在最后）
+    project = os.path.join(workdir, "project")
+    make_history(project, history_runs, decisions)
+    record = json.dumps({"type": "test_case", "source": "PRD.pdf", "output": "用例.xlsx",
+                         "case_count": 20, "modules": ["模块1"]}, ensure_ascii=False)
+    operations = [
+        ("read generation_history", ["--type", "generation_history", "--action", "read"],
+         history_runs, "条"),
+        ("query", ["--action", "query", "--type", "generation_history", "--record-type", "test_case",
+                   "--limit", "50"], history_runs, "条"),
+        ("find-ambiguity", ["--action", "find-ambiguity", "--context", "密码长度 length",
+                            "--top-k", "5"], decisions, "条"),
+        ("get-mode", ["--action", "get-mode"], 1, "次"),
+        ("add-record（含自动压缩）", ["--action", "add-record", "--data", record], history_runs, "条"),
+    ]
+    for name, argv, items, unit in operations:
+        measure(f"memory_manager {name}", [memory, "--project", project] + argv, items, unit)
+    return results
+
+
+def compare_baseline(results: list, baseline_path: str, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """与保存的基线按名称比较：耗时或峰值内存超出 tolerance 比例的条目标记为回归"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r["name"]: r for r in json.load(f).get("results", []) if "name" in r}
+    for r in results:
+        base = baseline.get(r.get("name"))
+        if not base:
+            continue
+        slower = (r["seconds"] > base["seconds"] * (1 + tolerance)
+                  and r["seconds"] - base["seconds"] > REGRESSION_MIN_SECONDS)
+        larger = r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance)
+        r["baseline_seconds"] = base["seconds"]
+        r["baseline_rss_mb"] = base["peak_rss_mb"]
+        r["regression"] = slower or larger
+    return results
+
+
+def save_baseline(results: list, path: str):
+    """保存基线（附运行环境，换机器后应重新生成）"""
+    import platform
+    from datetime import datetime
+
+    payload = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def _startup_commands(workdir: str) -> dict:
+    """启动基准使用的子命令（在临时项目中执行）"""
+    from openpyxl import Workbook
+
+    md_path = os.path.join(workdir, "prd.md")
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write("# 登录模块\n\n## 1. 功能描述\n\n用户名长度 4-20 字符。\n")
+    template_path = os.path.join(workdir, "template.xlsx")
+    wb = Workbook()
+    wb.active.append(["用例编号", "用例标题", "优先级"])
+    wb.save(template_path)
+
+    scripts = SCRIPTS_DIR
+    return {
+        "memory_manager get-mode": [str(scripts / "memory_manager.py"),
+                                    "--action", "get-mode", "--project", workdir],
+        "extract_document markdown": [str(scripts / "extract_document.py"),
+                                      "-i", md_path, "--no-cache"],
+        "generate_excel --help": [str(scripts / "generate_excel.py"), "--help"],
+        "generate_excel markdown": [str(scripts / "generate_excel.py"), "-o", os.path.join(workdir, "cases.md"),
+                                    "-d", '[{"用例编号": "TC-001", "用例标题": "登录成功"}]'],
+        "generate_excel --learn": [str(scripts / "generate_excel.py"), "--learn", template_path],
+    }
+
+
+def _min_wall(argv: list, repeat: int) -> float:
+    # 不转发给常驻工作进程，测量的是冷启动而不是 socket 往返
+    env = dict(os.environ, TEST_DOC_NO_WORKER="1")
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True, env=env)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_startup(workdir: str, repeat: int = 7, budget_scale: float = 1.0) -> list:
+    """各子命令冷启动耗时，与 STARTUP_BUDGETS_MS 比较"""
+    baseline = _min_wall(["-c", "pass"], repeat)
+    results = []
+    for name, argv in _startup_commands(workdir).items():
+        overhead_ms = (_min_wall(argv, repeat) - baseline) * 1000
+        budget_ms = STARTUP_BUDGETS_MS[name] * budget_scale
+        results.append({
+            "suite": "startup",
+            "command": name,
+            "overhead_ms": round(overhead_ms, 1),
+            "budget_ms": budget_ms,
+            "within_budget": overhead_ms <= budget_ms,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测试文档脚本性能基准')
+    parser.add_argument('--suite', required=True, choices=['pdf', 'startup', 'ambiguity', 'contention', 'writers', 'docx', 'corpus'], help='基准类别')
+    parser.add_argument('--pages', type=int, default=800, help='合成 PDF 页数')
+    parser.add_argument('--decisions', type=int, default=20000, help='合成歧义决策条数')
+    parser.add_argument('--sections', type=int, default=3000, help='合成 Word 文档章节数')
+    parser.add_argument('--cases', type=int, default=20000, help='合成测试用例条数')
+    parser.add_argument('--case-counts', default='1000,10000,100000',
+                        help='corpus 基准的用例规模，逗号分隔')
+    parser.add_argument('--history-runs', type=int, default=20000, help='corpus 基准的生成历史条数')
+    parser.add_argument('--writers', type=int, default=8, help='并发写入进程数')
+    parser.add_argument('--records', type=int, default=50, help='每个写入进程追加的记录数')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json',
+                        help='记录型记忆的存储后端')
+    parser.add_argument('--jobs', default=None,
+                        help='逗号分隔的进程数列表，默认 1,2,4... 直到 CPU 数')
+    parser.add_argument('--repeat', type=int, default=7, help='启动基准每个命令的重复次数（取最小值）')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='启动预算倍数（较慢的机器上放宽预算）')
+    parser.add_argument('--baseline', help='与该基线文件比较，耗时或峰值内存超出容差时以非零状态退出（corpus）')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线文件（corpus）')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='回归容差（相对基线的比例）')
+    parser.add_argument('-o', '--output', help='结果 JSON 输出路径，不指定则输出到 stdout')
+    args = parser.parse_args()
+
+    if args.jobs:
+        jobs_list = [int(j) for j in args.jobs.split(',')]
+    else:
+        cpu = os.cpu_count() or 1
+        jobs_list = [1]
+        while jobs_list[-1] * 2 <= cpu:
+            jobs_list.append(jobs_list[-1] * 2)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.suite == 'pdf':
+            results = bench_pdf(args.pages, jobs_list, workdir)
+        elif args.suite == 'ambiguity':
+            results = bench_ambiguity(args.decisions)
+        elif args.suite == 'contention':
+            results = bench_contention(args.writers, args.records, workdir, args.backend)
+        elif args.suite == 'writers':
+            results = bench_writers(args.cases, workdir)
+        elif args.suite == 'docx':
+            results = bench_docx(args.sections, workdir)
+        elif args.suite == 'corpus':
+            case_counts = [int(c) for c in args.case_counts.split(',')]
+            results = bench_corpus(workdir, args.pages, args.sections, case_counts,
+                                   args.history_runs, args.decisions)
+        else:
+            results = bench_startup(workdir, args.repeat, args.budget_scale)
+
+    if args.baseline:
+        compare_baseline(results, args.baseline, args.tolerance)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+
+    for r in results:
+        if r['suite'] == 'corpus':
+            baseline = f"  基线 {r['baseline_seconds']:.3f}s / {r['baseline_rss_mb']:.1f}MB" \
+                if 'baseline_seconds' in r else ''
+            print(f"[{r['suite']}] {r['name']:<40} {r['seconds']:>8.3f}s  "
+                  f"{r['throughput']:>10.1f} {r['unit']}/秒  峰值内存 {r['peak_rss_mb']:.1f}MB"
+                  f"{baseline}{'  回归!' if r.get('regression') else ''}", file=sys.stderr)
+        elif r['suite'] == 'pdf':
+            print(f"[{r['suite']}] jobs={r['jobs']:<3} {r['seconds']:>8.3f}s  "
+                  f"{r['pages_per_sec']:>8.1f} 页/秒  x{r['speedup']:.2f}"
+                  f"{'' if r['identical'] else '  输出不一致!'}", file=sys.stderr)
+        elif r['suite'] == 'ambiguity':
+            print(f"[{r['suite']}] {r['decisions']} 条决策  建索引 {r['build_seconds']:.3f}s  "
+                  f"查询中位数 {r['query_ms_median']:.3f}ms  p95 {r['query_ms_p95']:.3f}ms",
+                  file=sys.stderr)
+        elif r['suite'] == 'writers':
+            print(f"[{r['suite']}] {r['format']:<18} {r['seconds']:>8.3f}s  "
+                  f"{r['cases_per_sec']:>10.1f} 条/秒  x{r['speedup_vs_xlsx']:.2f}", file=sys.stderr)
+        elif r['suite'] == 'docx':
+            print(f"[{r['suite']}] {r['implementation']:<20} {r['seconds']:>8.3f}s  x{r['speedup']:.2f}  "
+                  f"峰值内存 {r['peak_rss_mb']:.1f}MB{'' if r['identical'] else '  输出不一致!'}",
+                  file=sys.stderr)
+        elif r['suite'] == 'contention':
+            print(f"[{r['suite']}] {r['backend']} {r['writers']} 个进程  落盘 {r['landed']}/{r['records']}  "
+                  f"{r['records_per_sec']:.1f} 条/秒{'' if r['complete'] else '  记录丢失!'}",
+                  file=sys.stderr)
+        else:
+            print(f"[{r['suite']}] {r['command']:<28} {r['overhead_ms']:>7.1f}ms "
+                  f"/ 预算 {r['budget_ms']:.0f}ms{'' if r['within_budget'] else '  超出预算!'}",
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    # 启动耗时超出预算、并发写入丢失记录、提取输出不一致或相对基线回归时以非零状态退出，可直接用作回归检查
+    if any(not r.get('within_budget', True) or not r.get('complete', True)
+           or not r.get('identical', True) or r.get('regression') for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,99 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-统一文档提取器 - 支持 PDF、Word、Markdown、RTF
-依赖：pip install PyMuPDF python-docx
+统一文档提取器 - 支持 PDF、Word（.docx / .doc）、Markdown、RTF
+依赖：pip install PyMuPDF（Word 文档直接解析 XML，无需额外依赖）
 """
 
 import argparse
+import codecs
+import glob
+import hashlib
 import json
+import os
+import re
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
+import timings
+from timings import stage
 
-def extract_pdf(file_path: str) -> dict:
-    """提取 PDF 文档内容"""
+# 提取逻辑变化时递增，使旧缓存失效
+EXTRACTOR_VERSION = "4"
+CACHE_DIR_NAME = "extract-cache"
+CACHE_STATS_FILE = "_stats.json"
+CACHE_LOCK_FILE = ".lock"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 需求 ID 识别模式（references/PARSING-RULES.md「需求ID提取规则」，功能编号至少带一级小数点以减少误判）
+REQUIREMENT_ID_PATTERN = re.compile(
+    r'(?<![A-Za-z0-9])(?:REQ[-_]?\d{3,}|US[-_]?\d{3,}|F[-_]?\d+(?:\.\d+)+)(?![A-Za-z0-9])|需求\d+')
+MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+# PDF 无书签时按字号识别标题：字号至少为正文的倍数，最多区分的标题级数，标题行最大长度
+PDF_HEADING_SIZE_RATIO = 1.15
+PDF_HEADING_LEVELS = 4
+PDF_HEADING_MAX_CHARS = 80
+
+# 批量提取时收集的文档类型
+SUPPORTED_SUFFIXES = ['.pdf', '.docx', '.doc', '.md', '.markdown', '.txt', '.rtf']
+# 文本扩展名对应的格式，优先于文件头识别
+TEXT_SUFFIXES = {'.md': 'markdown', '.markdown': 'markdown', '.txt': 'text'}
+
+
+def _pdf_font_lines(page, textpage) -> dict:
+    """页面字号统计：各字号的字符数与可能是标题的短行 [文本, 字号, 行序号]"""
+    sizes, lines = {}, []
+    index = 0
+    for block in page.get_text("dict", textpage=textpage)["blocks"]:
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            for span in spans:
+                size = round(span["size"], 1)
+                sizes[size] = sizes.get(size, 0) + len(span["text"])
+            text = ''.join(span["text"] for span in spans).strip()
+            if len(text) <= PDF_HEADING_MAX_CHARS:
+                lines.append([text, round(max(span["size"] for span in spans), 1), index])
+            index += 1
+    return {"sizes": sizes, "lines": lines}
+
+
+def _pdf_page(page, page_num: int, with_fonts: bool = False) -> dict:
+    if not with_fonts:
+        return {"page": page_num, "text": page.get_text()}
+    # 文本与字号共用一次版面分析
+    import fitz  # PyMuPDF
+
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+    return {"page": page_num, "text": page.get_text(textpage=textpage),
+            "fonts": _pdf_font_lines(page, textpage)}
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int, with_fonts: bool = False) -> list:
+    """提取 PDF 页码区间 [start, end) 的文本，每个工作进程打开独立的文档句柄"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(file_path)
+    try:
+        return [_pdf_page(doc[i], i + 1, with_fonts) for i in range(start, end)]
+    finally:
+        doc.close()
+
+
+def _split_pages(page_count: int, parts: int) -> list:
+    """把页码范围切分为连续区间"""
+    size = max(1, -(-page_count // parts))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def iter_pdf_pages(file_path: str, jobs: int = 1, with_fonts: bool = False):
+    """按页顺序逐页产出 PDF 文本，jobs > 1 时按页分片并行提取
+
+    with_fonts 时每页附带 fonts（字号统计），供无书签的 PDF 识别标题。
+    """
     try:
         import fitz  # PyMuPDF
     except ImportError:
@@ -20,36 +101,242 @@ def extract_pdf(file_path: str) -> dict:
         sys.exit(1)
 
     doc = fitz.open(file_path)
+    if jobs > 1 and doc.page_count > 1:
+        page_count = doc.page_count
+        doc.close()
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 分片数多于进程数，页面复杂度不均时负载更平衡
+        ranges = _split_pages(page_count, jobs * 4)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = pool.map(_extract_pdf_pages,
+                             [file_path] * len(ranges),
+                             [r[0] for r in ranges],
+                             [r[1] for r in ranges],
+                             [with_fonts] * len(ranges))
+            while True:
+                # 计时只含等待工作进程的时间，不含调用方处理已产出页面的时间
+                with stage("pdf_page_range"):
+                    part = next(parts, None)
+                if part is None:
+                    break
+                yield from part
+    else:
+        try:
+            for page_num in range(1, doc.page_count + 1):
+                with stage("pdf_page"):
+                    record = _pdf_page(doc[page_num - 1], page_num, with_fonts)
+                yield record
+        finally:
+            doc.close()
+
+
+def _require_pdf_text(content: dict, file_path: str):
+    """PDF 没有任何可提取的文本时报错，避免把空结果当作需求内容继续生成"""
+    if not content["full_text"].strip():
+        raise ValueError(f"PDF 中没有可提取的文本（共 {len(content['pages'])} 页，"
+                         f"可能是扫描件或文件已损坏）: {file_path}")
+
+
+def extract_pdf(file_path: str, jobs: int = 1) -> dict:
+    """提取 PDF 文档内容，jobs > 1 时按页分片并行提取"""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        print("错误：请安装 PyMuPDF: pip install PyMuPDF", file=sys.stderr)
+        sys.exit(1)
+
+    with fitz.open(file_path) as doc:
+        toc = doc.get_toc()
+    # 有书签时直接用书签作为目录，否则额外统计字号识别标题
+    pages = list(iter_pdf_pages(file_path, jobs, with_fonts=not toc))
+    fonts = [page.pop("fonts", None) for page in pages]
     content = {
         "format": "pdf",
         "source": file_path,
-        "pages": [],
+        "pages": pages,
         "full_text": ""
     }
-
-    full_text = []
-    for page_num, page in enumerate(doc, 1):
-        text = page.get_text()
-        content["pages"].append({
-            "page": page_num,
-            "text": text
-        })
-        full_text.append(text)
-
-    content["full_text"] = "\n".join(full_text)
-    doc.close()
+    content["full_text"] = "\n".join(p["text"] for p in content["pages"])
+    _require_pdf_text(content, file_path)
+    content["outline"] = pdf_outline(pages, content["full_text"], toc, fonts)
     return content
 
 
+# WordprocessingML 命名空间与用到的标签
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+W_BODY, W_P, W_TBL, W_TR, W_TC = (W_NS + t for t in ('body', 'p', 'tbl', 'tr', 'tc'))
+W_R, W_HYPERLINK, W_T = W_NS + 'r', W_NS + 'hyperlink', W_NS + 't'
+W_VAL = W_NS + 'val'
+# 段落中 w:r 子元素对应的文本（w:br 单独处理）
+RUN_TEXT = {W_NS + 'tab': '\t', W_NS + 'ptab': '\t', W_NS + 'cr': '\n',
+            W_NS + 'noBreakHyphen': '-'}
+# Word 内部样式名到界面名称的映射（与 python-docx 一致）
+STYLE_UI_NAMES = {"caption": "Caption", "footer": "Footer", "header": "Header",
+                  **{f"heading {i}": f"Heading {i}" for i in range(1, 10)}}
+
+
+def _docx_part_names(zf) -> tuple:
+    """从关系文件找到正文与样式部件的路径"""
+    import posixpath
+    import xml.etree.ElementTree as ET
+
+    def targets(rels_name, base):
+        if rels_name not in zf.namelist():
+            return {}
+        found = {}
+        for rel in ET.fromstring(zf.read(rels_name)).iter(REL_NS + 'Relationship'):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+            found.setdefault(rel.get('Type', '').rsplit('/', 1)[-1], path)
+        return found
+
+    document = targets('_rels/.rels', '').get('officeDocument', 'word/document.xml')
+    folder, name = posixpath.split(document)
+    styles = targets(posixpath.join(folder, '_rels', name + '.rels'), folder).get('styles')
+    return document, styles
+
+
+def _docx_styles(zf, styles_name: str) -> tuple:
+    """读取段落样式：返回 (样式 ID -> (名称, 大纲级别), 默认段落样式)"""
+    import xml.etree.ElementTree as ET
+
+    if not styles_name or styles_name not in zf.namelist():
+        # 没有样式部件时 python-docx 使用内置默认模板，默认段落样式为 Normal
+        return {}, ("Normal", None)
+
+    styles, default = {}, (None, None)
+    for style in ET.fromstring(zf.read(styles_name)).iter(W_NS + 'style'):
+        if style.get(W_NS + 'type', 'paragraph') != 'paragraph':
+            continue
+        name = style.find(W_NS + 'name')
+        name = name.get(W_VAL) if name is not None else None
+        outline = style.find(f'{W_NS}pPr/{W_NS}outlineLvl')
+        entry = (STYLE_UI_NAMES.get(name, name),
+                 outline.get(W_VAL) if outline is not None else None)
+        styles.setdefault(style.get(W_NS + 'styleId'), entry)
+        if style.get(W_NS + 'default') in ('1', 'true', 'on'):
+            default = entry
+    return styles, default
+
+
+def _iter_docx_body(zf, document_name: str):
+    """流式解析正文 XML，按顺序产出正文的直接子元素 (标签, 元素)
+
+    元素产出后立即从树上移除，内存占用只与最大的单个段落 / 表格有关，与文档总大小无关。
+    """
+    import xml.etree.ElementTree as ET
+
+    depth, body_depth, body = 0, None, None
+    with zf.open(document_name) as stream:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if body is None and element.tag == W_BODY:
+                    body, body_depth = element, depth
+                continue
+            if body is not None and depth == body_depth + 1:
+                yield element.tag, element
+                body.remove(element)
+            depth -= 1
+
+
+def _docx_run_text(run) -> str:
+    parts = []
+    for child in run:
+        if child.tag == W_T:
+            parts.append(child.text or '')
+        elif child.tag == W_NS + 'br':
+            if child.get(W_NS + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        else:
+            parts.append(RUN_TEXT.get(child.tag, ''))
+    return ''.join(parts)
+
+
+def _docx_paragraph_text(p) -> str:
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_docx_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_docx_run_text(run) for run in child if run.tag == W_R)
+    return ''.join(parts)
+
+
+def _is_heading_style(style_name: str) -> bool:
+    return bool(style_name) and (style_name.startswith('Heading') or style_name.startswith('标题'))
+
+
+def _heading_level(style_name: str, outline_level: str) -> int:
+    """标题级别：优先按样式名（Heading N / 标题 N），其次按大纲级别，正文返回 None"""
+    if _is_heading_style(style_name):
+        digits = ''.join(ch for ch in style_name if ch.isdigit())
+        if digits:
+            return int(digits)
+    if outline_level is not None and outline_level.isdigit() and int(outline_level) < 9:
+        return int(outline_level) + 1
+    return None
+
+
+def _docx_paragraph(p, styles: tuple) -> dict:
+    """段落元素 -> {text, style[, level]}，空段落返回 None"""
+    text = _docx_paragraph_text(p)
+    if not text.strip():
+        return None
+
+    style_map, default = styles
+    style_id = outline = None
+    ppr = p.find(W_NS + 'pPr')
+    if ppr is not None:
+        node = ppr.find(W_NS + 'pStyle')
+        style_id = node.get(W_VAL) if node is not None else None
+        node = ppr.find(W_NS + 'outlineLvl')
+        outline = node.get(W_VAL) if node is not None else None
+    style_name, style_outline = style_map.get(style_id, default)
+
+    para = {"text": text, "style": style_name}
+    level = _heading_level(style_name, outline if outline is not None else style_outline)
+    if level:
+        para["level"] = level
+    return para
+
+
+def _docx_table(tbl) -> list:
+    """表格元素 -> 行列文本；横向合并的单元格按跨列数重复，纵向合并沿用上方单元格的内容"""
+    rows = []
+    above = {}
+    for tr in tbl.iterfind(W_TR):
+        grid_before = tr.find(f'{W_NS}trPr/{W_NS}gridBefore')
+        offset = int(grid_before.get(W_VAL, 0)) if grid_before is not None else 0
+        row, current = [], {}
+        for tc in tr.iterfind(W_TC):
+            span, merge = 1, None
+            tcpr = tc.find(W_NS + 'tcPr')
+            if tcpr is not None:
+                node = tcpr.find(W_NS + 'gridSpan')
+                span = int(node.get(W_VAL, 1)) if node is not None else 1
+                node = tcpr.find(W_NS + 'vMerge')
+                merge = node.get(W_VAL, 'continue') if node is not None else None
+            if merge == 'continue' and offset in above:
+                cell = above[offset]
+            else:
+                cell = ("\n".join(_docx_paragraph_text(p) for p in tc.iterfind(W_P)), span)
+            current[offset] = cell
+            row.extend([cell[0]] * cell[1])
+            offset += span
+        rows.append(row)
+        above = current
+    return rows
+
+
 def extract_docx(file_path: str) -> dict:
-    """提取 Word 文档内容"""
-    try:
-        from docx import Document
-    except ImportError:
-        print("错误：请安装 python-docx: pip install python-docx", file=sys.stderr)
-        sys.exit(1)
+    """提取 Word 文档内容（流式解析 document.xml，不依赖 python-docx）"""
+    import zipfile
 
-    doc = Document(file_path)
     content = {
         "format": "docx",
         "source": file_path,
@@ -58,31 +345,422 @@ def extract_docx(file_path: str) -> dict:
         "full_text": ""
     }
 
-    # 提取段落
-    paragraphs = []
-    for para in doc.paragraphs:
-        if para.text.strip():
-            paragraphs.append({
-                "text": para.text,
-                "style": para.style.name if para.style else None
-            })
-    content["paragraphs"] = paragraphs
-
-    # 提取表格
-    for table_idx, table in enumerate(doc.tables):
-        table_data = []
-        for row in table.rows:
-            row_data = [cell.text for cell in row.cells]
-            table_data.append(row_data)
-        content["tables"].append({
-            "index": table_idx,
-            "data": table_data
-        })
-
-    content["full_text"] = "\n".join([p["text"] for p in paragraphs])
+    with zipfile.ZipFile(file_path) as zf:
+        document, styles_name = _docx_part_names(zf)
+        styles = _docx_styles(zf, styles_name)
+        for tag, element in _iter_docx_body(zf, document):
+            if tag == W_P:
+                para = _docx_paragraph(element, styles)
+                if para:
+                    content["paragraphs"].append(para)
+            elif tag == W_TBL:
+                content["tables"].append({
+                    "index": len(content["tables"]),
+                    "data": _docx_table(element)
+                })
+
+    content["full_text"] = "\n".join(p["text"] for p in content["paragraphs"])
+    content["outline"] = build_outline(docx_headings(content["paragraphs"]), content["full_text"])
     return content
 
 
+# RTF 字符集（\fcharsetN）对应的代码页
+RTF_CHARSET_CODEPAGES = {0: 'cp1252', 128: 'cp932', 129: 'cp949', 134: 'gbk', 136: 'cp950',
+                         161: 'cp1253', 162: 'cp1254', 163: 'cp1258', 177: 'cp1255',
+                         178: 'cp1256', 186: 'cp1257', 204: 'cp1251', 222: 'cp874', 238: 'cp1250'}
+# 不输出正文的目标组（fonttbl / stylesheet 另行解析）
+RTF_SKIP_DESTINATIONS = {
+    'colortbl', 'info', 'pict', 'object', 'objdata', 'fldinst', 'header', 'headerl', 'headerr',
+    'headerf', 'footer', 'footerl', 'footerr', 'footerf', 'footnote', 'listtable',
+    'listoverridetable', 'revtbl', 'rsidtbl', 'generator', 'themedata', 'colorschememapping',
+    'datastore', 'latentstyles', 'xmlnstbl', 'filetbl', 'bkmkstart', 'bkmkend', 'nonshppict',
+    'shp', 'shpinst', 'mmathPr', 'pgdsctbl', 'userprops', 'docvar', 'template',
+}
+# 产生文本的控制字；None 表示结束当前段落
+RTF_SYMBOLS = {'par': None, 'sect': None, 'page': None, 'row': None,
+               'line': '\n', 'tab': '\t', 'cell': '\t', 'emdash': '\u2014', 'endash': '\u2013',
+               'bullet': '\u2022', 'lquote': '\u2018', 'rquote': '\u2019', 'ldblquote': '\u201c',
+               'rdblquote': '\u201d', 'emspace': ' ', 'enspace': ' ', 'qmspace': ' ',
+               '~': '\xa0', '_': '\u2011', '-': '', '{': '{', '}': '}', '\\': '\\'}
+# 控制字 | 连续的 \\'hh 字节 | 控制符号 | 花括号 | 换行（忽略）| 普通文本
+RTF_TOKEN = re.compile(rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|((?:\\'[0-9a-fA-F]{2})+)|\\(.)|([{}])|[\r\n]+"
+                       rb"|([^\\{}\r\n]+)", re.S)
+RTF_CHUNK_SIZE = 1 << 16
+
+
+def _rtf_codepage(name: str) -> str:
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return 'cp1252'
+
+
+def iter_rtf_paragraphs(file_path: str):
+    """流式解析 RTF，逐段产出 {text, style[, level]}
+
+    按块读取文件，支持 \\uN Unicode 转义（含 \\ucN 替代字符跳过）、\\'hh 字节按字体字符集或
+    \\ansicpg 解码（GB2312 / GBK 等多字节代码页）、样式表中的标题样式与 \\outlinelevel。
+    """
+    fonts, styles = {}, {}
+    ansi_cp = 'cp1252'
+    default_font = None
+    font_def = None
+    style_entry = None
+
+    # 组状态：dest 为 None（正文）/ skip / fonttbl / stylesheet / style
+    state = {"dest": None, "uc": 1, "font": None}
+    stack = []
+    group_start = False
+    skip_chars = 0
+    skip_bytes = 0
+
+    para, pending, pending_cp = [], bytearray(), None
+    para_style, para_level, surrogates = 0, None, False
+
+    def flush():
+        nonlocal pending
+        if pending:
+            para.append(pending.decode(pending_cp or ansi_cp, 'replace'))
+            pending = bytearray()
+
+    def emit():
+        nonlocal para, surrogates
+        flush()
+        text = ''.join(para).rstrip('\t')
+        if surrogates:
+            text = text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        para, surrogates = [], False
+        if not text.strip():
+            return None
+        name = styles.get(para_style)
+        record = {"text": text, "style": name}
+        level = _heading_level(name, None if para_level is None else str(para_level))
+        if level:
+            record["level"] = level
+        return record
+
+    def add_bytes(data: bytes):
+        nonlocal pending_cp
+        if state["dest"] == 'style':
+            style_entry["name"] += data
+            return
+        if state["dest"] is not None:
+            return
+        cp = fonts.get(state["font"] if state["font"] is not None else default_font, ansi_cp)
+        if cp != pending_cp:
+            flush()
+            pending_cp = cp
+        pending.extend(data)
+
+    with open(file_path, 'rb') as f:
+        carry = b''
+        while True:
+            chunk = f.read(RTF_CHUNK_SIZE)
+            data = carry + chunk
+            if skip_bytes:
+                consumed = min(skip_bytes, len(data))
+                data, skip_bytes = data[consumed:], skip_bytes - consumed
+            end = len(data)
+            if chunk:
+                # 末尾可能是被截断的控制字，留到下一块
+                cut = data.rfind(b'\\', max(0, end - 64))
+                if cut >= 0:
+                    end = cut
+            carry = data[end:]
+            pos = 0
+            while pos < end:
+                match = RTF_TOKEN.match(data, pos, end)
+                if match is None:
+                    break
+                pos = match.end()
+                word, param, hex_bytes, symbol, brace, text = match.groups()
+                first, group_start = group_start, False
+
+                if brace == b'{':
+                    stack.append(state)
+                    state = dict(state)
+                    skip_chars = 0
+                    group_start = True
+                    if state["dest"] == 'stylesheet':
+                        state["dest"] = 'style'
+                        style_entry = {"id": 0, "name": b''}
+                    continue
+                if brace == b'}':
+                    if state["dest"] == 'style' and stack and stack[-1]["dest"] == 'stylesheet':
+                        if style_entry["id"] is not None:
+                            name = style_entry["name"].decode(ansi_cp, 'replace').split(';')[0].strip()
+                            styles[style_entry["id"]] = STYLE_UI_NAMES.get(name, name)
+                    if stack:
+                        state = stack.pop()
+                    skip_chars = 0
+                    continue
+                if state["dest"] == 'skip':
+                    if word == b'bin' and param:
+                        skip_bytes = int(param)
+                        consumed = min(skip_bytes, end - pos)
+                        pos, skip_bytes = pos + consumed, skip_bytes - consumed
+                    continue
+
+                if text is not None:
+                    if skip_chars:
+                        dropped = min(skip_chars, len(text))
+                        text, skip_chars = text[dropped:], skip_chars - dropped
+                    if text:
+                        add_bytes(text)
+                    continue
+                if hex_bytes is not None:
+                    hex_bytes = bytes.fromhex(hex_bytes.replace(b"\\'", b"").decode('ascii'))
+                    if skip_chars:
+                        dropped = min(skip_chars, len(hex_bytes))
+                        hex_bytes, skip_chars = hex_bytes[dropped:], skip_chars - dropped
+                    if hex_bytes:
+                        add_bytes(hex_bytes)
+                    continue
+                if symbol is not None:
+                    symbol = symbol.decode('latin-1')
+                    if symbol == '*' and first:
+                        state["dest"] = 'skip'
+                    elif skip_chars:
+                        skip_chars -= 1
+                    elif state["dest"] is None and symbol in RTF_SYMBOLS:
+                        flush()
+                        para.append(RTF_SYMBOLS[symbol])
+                    continue
+                if word is None:
+                    continue
+
+                word = word.decode('ascii')
+                value = int(param) if param else None
+                if skip_chars and word != 'u':
+                    skip_chars -= 1
+                    continue
+                if word in RTF_SKIP_DESTINATIONS and first:
+                    state["dest"] = 'skip'
+                elif word == 'fonttbl':
+                    state["dest"] = 'fonttbl'
+                elif word == 'stylesheet':
+                    state["dest"] = 'stylesheet'
+                elif word == 'bin' and value:
+                    skip_bytes = value
+                    consumed = min(skip_bytes, end - pos)
+                    pos, skip_bytes = pos + consumed, skip_bytes - consumed
+                elif state["dest"] == 'fonttbl':
+                    if word == 'f':
+                        font_def = value
+                    elif word == 'fcharset' and value in RTF_CHARSET_CODEPAGES:
+                        fonts[font_def] = RTF_CHARSET_CODEPAGES[value]
+                    elif word == 'cpg' and value:
+                        fonts[font_def] = _rtf_codepage(f'cp{value}')
+                elif state["dest"] == 'style':
+                    if word == 's':
+                        style_entry["id"] = value or 0
+                    elif word in ('cs', 'ds', 'ts'):
+                        style_entry["id"] = None
+                elif word == 'ansicpg' and value:
+                    ansi_cp = _rtf_codepage(f'cp{value}')
+                elif word == 'deff':
+                    default_font = value
+                elif word == 'uc':
+                    state["uc"] = value or 0
+                elif state["dest"] is not None:
+                    continue
+                elif word == 'u' and value is not None:
+                    flush()
+                    code = value + 65536 if value < 0 else value
+                    surrogates = surrogates or 0xD800 <= code <= 0xDFFF
+                    para.append(chr(code))
+                    skip_chars = state["uc"]
+                elif word == 'f':
+                    state["font"] = value
+                elif word == 'plain':
+                    state["font"] = None
+                elif word == 'pard':
+                    para_style, para_level = 0, None
+                elif word == 's':
+                    para_style = value or 0
+                elif word == 'outlinelevel' and value is not None and 0 <= value < 9:
+                    para_level = value
+                elif word in RTF_SYMBOLS:
+                    symbol = RTF_SYMBOLS[word]
+                    if symbol is None:
+                        record = emit()
+                        if record:
+                            yield record
+                    else:
+                        flush()
+                        para.append(symbol)
+            if not chunk:
+                break
+            carry = data[pos:]
+
+    record = emit()
+    if record:
+        yield record
+
+
+def extract_rtf(file_path: str) -> dict:
+    """提取 RTF 文档内容（纯 Python 流式解析，不整体读入文件）"""
+    paragraphs = list(iter_rtf_paragraphs(file_path))
+    full_text = "\n".join(p["text"] for p in paragraphs)
+    return {
+        "format": "rtf",
+        "source": file_path,
+        "paragraphs": paragraphs,
+        "full_text": full_text,
+        "outline": build_outline(docx_headings(paragraphs), full_text)
+    }
+
+
+# OLE 复合文档（旧版 .doc）
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+OLE_END_OF_CHAIN = 0xFFFFFFFE
+# Word 正文中的控制字符：单元格 / 行结束、手动换行、分页、不间断连字符、可选连字符、嵌入对象
+DOC_CONTROL_CHARS = str.maketrans({'\x07': '\t', '\x0b': '\n', '\x0c': '\n', '\x1e': '-',
+                                   '\x1f': '', '\x01': '', '\x08': '', '\x05': ''})
+
+
+def _ole_streams(data: bytes, names: tuple) -> dict:
+    """从 OLE 复合文档中读取指定名称的流"""
+    import struct
+
+    if data[:8] != OLE_MAGIC:
+        raise ValueError("不是 OLE 复合文档")
+    sector_size = 1 << struct.unpack_from('<H', data, 0x1E)[0]
+    mini_size = 1 << struct.unpack_from('<H', data, 0x20)[0]
+    fat_count, dir_start = struct.unpack_from('<II', data, 0x2C)
+    mini_cutoff, minifat_start, _, difat_start, difat_count = struct.unpack_from('<IIIII', data, 0x38)
+
+    def sector(n):
+        offset = (n + 1) * sector_size
+        return data[offset:offset + sector_size]
+
+    fat_sectors = [n for n in struct.unpack_from('<109I', data, 0x4C)[:fat_count]]
+    per_sector = sector_size // 4
+    for _ in range(difat_count):
+        if difat_start >= OLE_END_OF_CHAIN:
+            break
+        entries = struct.unpack(f'<{per_sector}I', sector(difat_start))
+        fat_sectors.extend(entries[:-1])
+        difat_start = entries[-1]
+    fat = []
+    for n in fat_sectors[:fat_count]:
+        fat.extend(struct.unpack(f'<{per_sector}I', sector(n)))
+
+    def chain(start, table):
+        seen = set()
+        while start < OLE_END_OF_CHAIN and start < len(table) and start not in seen:
+            seen.add(start)
+            yield start
+            start = table[start]
+
+    def read(start):
+        return b''.join(sector(n) for n in chain(start, fat))
+
+    directory = read(dir_start)
+    entries = {}
+    for offset in range(0, len(directory) - 127, 128):
+        name_len, entry_type = struct.unpack_from('<HB', directory, offset + 64)
+        if entry_type not in (2, 5):
+            continue
+        name = directory[offset:offset + max(name_len - 2, 0)].decode('utf-16-le', 'replace')
+        start, size = struct.unpack_from('<II', directory, offset + 116)
+        entries[name if entry_type == 2 else '<root>'] = (start, size)
+
+    mini_stream = minifat = None
+    streams = {}
+    for name in names:
+        if name not in entries:
+            continue
+        start, size = entries[name]
+        if size < mini_cutoff:
+            if mini_stream is None:
+                mini_stream = read(entries['<root>'][0])
+                raw = read(minifat_start) if minifat_start < OLE_END_OF_CHAIN else b''
+                minifat = struct.unpack(f'<{len(raw) // 4}I', raw)
+            streams[name] = b''.join(mini_stream[n * mini_size:(n + 1) * mini_size]
+                                     for n in chain(start, minifat))[:size]
+        else:
+            streams[name] = read(start)[:size]
+    return streams
+
+
+def _doc_strip_fields(text: str) -> str:
+    """去掉域代码（\\x13 代码 \\x14 结果 \\x15），只保留域结果"""
+    if '\x13' not in text:
+        return text
+    parts, fields = [], []
+    for token in re.split('([\x13\x14\x15])', text):
+        if token == '\x13':
+            fields.append(True)
+        elif token == '\x14':
+            if fields:
+                fields[-1] = False
+        elif token == '\x15':
+            if fields:
+                fields.pop()
+        elif not any(fields):
+            parts.append(token)
+    return ''.join(parts)
+
+
+def extract_doc(file_path: str) -> dict:
+    """提取旧版 Word（.doc，Word 97-2003）正文：解析 OLE 容器与 piece table，纯 Python 实现
+
+    只提取正文文本（不含页眉页脚、脚注），不识别样式，表格单元格以制表符分隔。
+    """
+    import struct
+
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    streams = _ole_streams(data, ('WordDocument', '0Table', '1Table'))
+    word = streams.get('WordDocument')
+    if not word or struct.unpack_from('<H', word, 0)[0] != 0xA5EC:
+        raise ValueError(f"不是 Word 97-2003 文档: {file_path}")
+    flags = struct.unpack_from('<H', word, 0x0A)[0]
+    if flags & 0x0100:
+        raise ValueError(f"文档已加密，无法提取: {file_path}")
+    table = streams.get('1Table' if flags & 0x0200 else '0Table')
+    if table is None:
+        raise ValueError(f"Word 文档缺少表流: {file_path}")
+
+    ccp_text = struct.unpack_from('<i', word, 0x4C)[0]
+    fc_clx, lcb_clx = struct.unpack_from('<II', word, 0x01A2)
+    clx = table[fc_clx:fc_clx + lcb_clx]
+    pos = 0
+    while pos < len(clx) and clx[pos] == 0x01:
+        pos += 3 + struct.unpack_from('<H', clx, pos + 1)[0]
+    if pos >= len(clx) or clx[pos] != 0x02:
+        raise ValueError(f"无法解析 Word 文档的文本结构: {file_path}")
+    lcb = struct.unpack_from('<I', clx, pos + 1)[0]
+    plc = clx[pos + 5:pos + 5 + lcb]
+    pieces = (lcb - 4) // 12
+    cps = struct.unpack_from(f'<{pieces + 1}I', plc, 0)
+
+    parts = []
+    for i in range(pieces):
+        start, end = cps[i], min(cps[i + 1], ccp_text)
+        if start >= end:
+            break
+        fc = struct.unpack_from('<I', plc, 4 * (pieces + 1) + 8 * i + 2)[0]
+        count = end - start
+        if fc & 0x40000000:
+            offset = (fc & 0x3FFFFFFF) // 2
+            parts.append(word[offset:offset + count].decode('cp1252', 'replace'))
+        else:
+            parts.append(word[fc:fc + 2 * count].decode('utf-16-le', 'replace'))
+
+    text = _doc_strip_fields(''.join(parts)).translate(DOC_CONTROL_CHARS)
+    paragraphs = [{"text": line.rstrip('\t')} for line in text.split('\r') if line.strip()]
+    full_text = "\n".join(p["text"] for p in paragraphs)
+    return {
+        "format": "doc",
+        "source": file_path,
+        "paragraphs": paragraphs,
+        "full_text": full_text,
+        "outline": []
+    }
+
+
 def extract_markdown(file_path: str) -> dict:
     """提取 Markdown 文档内容"""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -91,63 +769,876 @@ def extract_markdown(file_path: str) -> dict:
     return {
         "format": "markdown",
         "source": file_path,
-        "full_text": text
+        "full_text": text,
+        "outline": build_outline(markdown_headings(text), text)
+    }
+
+
+def build_outline(headings: list, full_text: str) -> list:
+    """由按位置排序的 (级别, 标题, 起始偏移, 页码) 构建章节索引
+
+    每个章节的 [start, end) 为 full_text 中的字符区间，包含其下级章节；
+    parent 为上级章节在索引中的位置；requirement_ids 为区间内识别到的需求 ID。
+    """
+    from bisect import bisect_left
+
+    with stage("outline"):
+        matches = [(m.start(), m.group()) for m in REQUIREMENT_ID_PATTERN.finditer(full_text)]
+        positions = [pos for pos, _ in matches]
+
+        outline, open_sections = [], []
+        for level, title, start, page in headings:
+            while open_sections and outline[open_sections[-1]]["level"] >= level:
+                outline[open_sections.pop()]["end"] = start
+            entry = {"title": title, "level": level,
+                     "parent": open_sections[-1] if open_sections else None,
+                     "start": start, "end": len(full_text)}
+            if page is not None:
+                entry["page"] = page
+            open_sections.append(len(outline))
+            outline.append(entry)
+
+        for entry in outline:
+            lo, hi = bisect_left(positions, entry["start"]), bisect_left(positions, entry["end"])
+            entry["requirement_ids"] = list(dict.fromkeys(rid for _, rid in matches[lo:hi]))
+    return outline
+
+
+def markdown_lines(lines):
+    """逐行产出 (行, 标题匹配)：ATX 标题（# ~ ######）返回正则匹配，其他行和代码块内的行为 None"""
+    fence = None
+    for line in lines:
+        stripped = line.lstrip()
+        match = None
+        if stripped.startswith(('```', '~~~')):
+            marker = stripped[:3]
+            fence = None if fence == marker else (fence or marker)
+        elif fence is None:
+            match = MARKDOWN_HEADING.match(line.rstrip('\r\n'))
+        yield line, match
+
+
+def markdown_headings(text: str) -> list:
+    """Markdown ATX 标题（# ~ ######），跳过代码块"""
+    headings, offset = [], 0
+    for line, match in markdown_lines(text.splitlines(keepends=True)):
+        if match:
+            headings.append((len(match.group(1)), match.group(2), offset, None))
+        offset += len(line)
+    return headings
+
+
+def docx_headings(paragraphs: list) -> list:
+    """Word 标题段落（带 level 的段落），偏移对应以换行拼接段落得到的 full_text"""
+    headings, offset = [], 0
+    for para in paragraphs:
+        if para.get("level"):
+            headings.append((para["level"], para["text"].strip(), offset, None))
+        offset += len(para["text"]) + 1
+    return headings
+
+
+def pdf_outline(pages: list, full_text: str, toc: list = None, fonts: list = None) -> list:
+    """PDF 章节索引：优先使用书签，没有书签时按字号识别标题"""
+    from bisect import bisect_right
+
+    page_starts, offset = [], 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page["text"]) + 1
+
+    headings = []
+    if toc:
+        for level, title, page_num in toc:
+            if not 1 <= page_num <= len(pages):
+                continue
+            title = title.strip()
+            pos = pages[page_num - 1]["text"].find(title)
+            headings.append((level, title, page_starts[page_num - 1] + max(pos, 0), page_num))
+        headings.sort(key=lambda heading: heading[2])
+    elif fonts and any(fonts):
+        sizes = {}
+        for page_fonts in fonts:
+            for size, chars in page_fonts["sizes"].items():
+                sizes[size] = sizes.get(size, 0) + chars
+        body = max(sizes, key=sizes.get) if sizes else 0
+        heading_sizes = sorted({size for page_fonts in fonts for _, size, _ in page_fonts["lines"]
+                                if size >= body * PDF_HEADING_SIZE_RATIO}, reverse=True)
+        level_of = {size: level for level, size in enumerate(heading_sizes[:PDF_HEADING_LEVELS], 1)}
+
+        for page_index, page_fonts in enumerate(fonts):
+            text, cursor, previous = pages[page_index]["text"], 0, None
+            for line, size, line_index in page_fonts["lines"]:
+                if size not in level_of:
+                    continue
+                pos = text.find(line, cursor)
+                if pos < 0:
+                    continue
+                cursor = pos + len(line)
+                # 折行的标题：紧邻的同字号行并入上一行
+                if previous and previous[1] == size and previous[2] == line_index - 1:
+                    headings[-1] = (headings[-1][0], f"{headings[-1][1]} {line}",
+                                    headings[-1][2], headings[-1][3])
+                else:
+                    headings.append((level_of[size], line, page_starts[page_index] + pos, page_index + 1))
+                previous = (line, size, line_index)
+
+    outline = build_outline(headings, full_text)
+    for entry in outline:
+        entry["end_page"] = bisect_right(page_starts, max(entry["end"] - 1, entry["start"]))
+    return outline
+
+
+def section_text(content: dict, title: str) -> dict:
+    """按标题取出单个章节的文本：先精确匹配，再不区分大小写的包含匹配"""
+    outline = content.get("outline") or []
+    if "full_text" not in content:
+        raise ValueError("提取结果中没有 full_text，无法按章节截取")
+    matches = [entry for entry in outline if entry["title"] == title]
+    if not matches:
+        needle = title.casefold()
+        matches = [entry for entry in outline if needle in entry["title"].casefold()]
+    if not matches:
+        raise ValueError(f"未找到章节: {title}")
+    entry = matches[0]
+    return {"format": content.get("format"), "source": content.get("source"),
+            "section": entry, "text": content["full_text"][entry["start"]:entry["end"]]}
+
+
+def sniff_format(file_path: str) -> str:
+    """按文件头识别二进制文档格式，文本类文件返回 None
+
+    PDF 头只在开头的空白或 BOM 之后识别；以 PK 开头但不是 ZIP 包的文件按文本处理。
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(1024)
+    if head.startswith(b'{\\rtf'):
+        return 'rtf'
+    if head.startswith(OLE_MAGIC):
+        return 'doc'
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    if head.lstrip().startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        import zipfile
+
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                is_word = any(name.startswith('word/') for name in zf.namelist())
+        except zipfile.BadZipFile:
+            return None
+        if not is_word:
+            raise ValueError(f"不是 Word 文档（可能是其他 Office 格式）: {file_path}")
+        return 'docx'
+    return None
+
+
+def detect_format(file_path: str, format_hint: str = None) -> str:
+    """根据格式提示或文件头确定文档格式；文本扩展名优先，其他文本类文件按扩展名区分"""
+    if format_hint:
+        return format_hint.lower()
+    suffix = Path(file_path).suffix.lower()
+    # 文本扩展名不看文件头：正文中恰好出现 %PDF- 或以 PK 开头的文本仍按文本读取
+    if suffix in TEXT_SUFFIXES:
+        return TEXT_SUFFIXES[suffix]
+    sniffed = sniff_format(file_path)
+    if sniffed:
+        return sniffed
+    if suffix in ['.pdf', '.docx', '.doc', '.rtf']:
+        # 扩展名是二进制格式但文件头不符，直接报错而不是解析失败后才发现
+        raise ValueError(f"文件内容与扩展名 {suffix} 不符（文件可能已损坏）: {file_path}")
+    return 'text'
+
+
+def file_hash(file_path: str) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(file_path: str, format_type: str) -> str:
+    """缓存键：内容哈希 + 提取器版本 + 格式"""
+    raw = f"{file_hash(file_path)}:{EXTRACTOR_VERSION}:{format_type}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _update_cache_stats(cache_dir: Path, **deltas):
+    """累加缓存计数：持锁读-改-写并原子替换，批量提取的并行进程不会丢失计数或写坏文件"""
+    from memory_manager import file_lock
+
+    stats_path = cache_dir / CACHE_STATS_FILE
+    with file_lock(cache_dir / CACHE_LOCK_FILE):
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        if stats_path.exists():
+            try:
+                stats.update(json.loads(stats_path.read_text(encoding='utf-8')))
+            except ValueError:
+                pass
+        for name, delta in deltas.items():
+            stats[name] = stats.get(name, 0) + delta
+        tmp = cache_dir / f".{CACHE_STATS_FILE}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(stats), encoding='utf-8')
+        os.replace(tmp, stats_path)
+
+
+def cache_get(cache_dir: str, key: str) -> dict:
+    """读取缓存条目，命中时刷新访问时间（用于 LRU 淘汰）"""
+    cache_path = Path(cache_dir)
+    entry = cache_path / f"{key}.json"
+    try:
+        with open(entry, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        cache_path.mkdir(parents=True, exist_ok=True)
+        _update_cache_stats(cache_path, misses=1)
+        return None
+    os.utime(entry)
+    _update_cache_stats(cache_path, hits=1)
+    return content
+
+
+def cache_put(cache_dir: str, key: str, content: dict,
+              max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+    """写入缓存条目（先写临时文件再替换），超出容量时按最近使用时间淘汰"""
+    cache_path = Path(cache_dir)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    entry = cache_path / f"{key}.json"
+    tmp = cache_path / f".{key}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(content, f, ensure_ascii=False)
+    os.replace(tmp, entry)
+    evict_cache(cache_dir, max_bytes)
+
+
+def _cache_entries(cache_path: Path) -> list:
+    entries = []
+    for entry in cache_path.glob("*.json"):
+        if entry.name == CACHE_STATS_FILE:
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    return entries
+
+
+def evict_cache(cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> int:
+    """淘汰最久未使用的条目，直到总大小不超过 max_bytes，返回淘汰数量"""
+    cache_path = Path(cache_dir)
+    entries = sorted(_cache_entries(cache_path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    if evicted:
+        _update_cache_stats(cache_path, evictions=evicted)
+    return evicted
+
+
+def cache_stats(cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> dict:
+    """缓存统计：条目数、占用大小、命中/未命中/淘汰计数"""
+    cache_path = Path(cache_dir)
+    entries = _cache_entries(cache_path) if cache_path.exists() else []
+    stats = {"hits": 0, "misses": 0, "evictions": 0}
+    stats_path = cache_path / CACHE_STATS_FILE
+    if stats_path.exists():
+        stats.update(json.loads(stats_path.read_text(encoding='utf-8')))
+    return {
+        "cache_dir": str(cache_path),
+        "entries": len(entries),
+        "size_bytes": sum(size for _, size, _ in entries),
+        "max_bytes": max_bytes,
+        **stats
     }
 
 
-def extract_document(file_path: str, format_hint: str = None) -> dict:
-    """根据格式提取文档"""
+def extract_document(file_path: str, format_hint: str = None, jobs: int = 1,
+                     cache_dir: str = None,
+                     cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> dict:
+    """根据格式提取文档，jobs 用于 PDF 按页并行提取
+
+    指定 cache_dir 时按内容哈希缓存提取结果，未变化的文档直接返回缓存。
+    """
     path = Path(file_path)
 
     if not path.exists():
         raise FileNotFoundError(f"文件不存在: {file_path}")
 
     # 自动检测格式
-    suffix = path.suffix.lower()
-    if format_hint:
-        format_type = format_hint.lower()
-    elif suffix == '.pdf':
-        format_type = 'pdf'
-    elif suffix in ['.docx', '.doc']:
-        format_type = 'docx'
-    elif suffix in ['.md', '.markdown']:
-        format_type = 'markdown'
-    else:
-        format_type = 'text'
+    with stage("detect_format"):
+        format_type = detect_format(file_path, format_hint)
+
+    key = None
+    if cache_dir:
+        with stage("cache_lookup"):
+            key = cache_key(file_path, format_type)
+            cached = cache_get(cache_dir, key)
+        if cached is not None:
+            cached["source"] = file_path
+            return cached
 
     # 提取内容
+    with stage(f"extract_{format_type}"):
+        if format_type == 'pdf':
+            content = extract_pdf(file_path, jobs)
+        elif format_type == 'docx':
+            content = extract_docx(file_path)
+        elif format_type == 'rtf':
+            content = extract_rtf(file_path)
+        elif format_type == 'doc':
+            content = extract_doc(file_path)
+        elif format_type in ['markdown', 'md']:
+            content = extract_markdown(file_path)
+        else:
+            # 默认作为纯文本处理
+            with open(file_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            content = {
+                "format": "text",
+                "source": file_path,
+                "full_text": text,
+                "outline": build_outline(markdown_headings(text), text)
+            }
+
+    if key:
+        with stage("cache_write"):
+            cache_put(cache_dir, key, content, cache_max_bytes)
+    return content
+
+
+def _fingerprint(*parts) -> str:
+    """内容块指纹"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def diff_blocks(old: list, new: list) -> dict:
+    """比较新旧指纹序列，返回新增 / 修改 / 删除的块位置
+
+    changed、added 为新序列中的位置，removed 为旧序列中的位置。
+    """
+    import difflib
+
+    added, changed, removed = [], [], []
+    matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        changed.extend(range(j1, j1 + paired))
+        added.extend(range(j1 + paired, j2))
+        removed.extend(range(i1 + paired, i2))
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def extract_pdf_incremental(file_path: str, previous: dict = None) -> dict:
+    """增量提取 PDF：按页内容流计算指纹，只对变化的页重新提取文本
+
+    章节索引与 extract_pdf 一致；没有书签时各页的字号统计保存在 page_fonts 中，供下次复用。
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        print("错误：请安装 PyMuPDF: pip install PyMuPDF", file=sys.stderr)
+        sys.exit(1)
+
+    previous = previous or {}
+    old_fps = previous.get("fingerprints", [])
+    # 字号统计经 JSON 往返后字号键变为字符串，复用前还原为数值
+    old_fonts = [fonts and {"sizes": {float(size): chars for size, chars in fonts["sizes"].items()},
+                            "lines": fonts["lines"]}
+                 for fonts in previous.get("page_fonts") or [None] * len(old_fps)]
+    reusable = {fp: (page["text"], fonts)
+                for fp, page, fonts in zip(old_fps, previous.get("pages", []), old_fonts)}
+
+    doc = fitz.open(file_path)
+    toc = doc.get_toc()
+    content = {
+        "format": "pdf",
+        "source": file_path,
+        "pages": [],
+        "full_text": "",
+        "fingerprints": []
+    }
+
+    extracted = 0
+    page_fonts = []
+    for page_num, page in enumerate(doc, 1):
+        fonts = sorted(font[3] for font in page.get_fonts())
+        # 页面引用的 Form XObject（含嵌套）的内容流也计入指纹，只改了其中文字的页同样视为变化
+        xobjects = [doc.xref_stream(xobject[0]) or b'' for xobject in page.get_xobjects()]
+        fp = _fingerprint(page.read_contents(), page.rect, *fonts, *xobjects)
+        cached = reusable.get(fp)
+        # 无书签时复用的页还需要字号统计，旧结果中没有时重新提取
+        if cached is not None and (toc or cached[1] is not None):
+            record = {"page": page_num, "text": cached[0], "fonts": cached[1]}
+        else:
+            record = _pdf_page(page, page_num, with_fonts=not toc)
+            extracted += 1
+        page_fonts.append(record.pop("fonts", None))
+        content["pages"].append(record)
+        content["fingerprints"].append(fp)
+    doc.close()
+
+    content["full_text"] = "\n".join(p["text"] for p in content["pages"])
+    _require_pdf_text(content, file_path)
+    content["outline"] = pdf_outline(content["pages"], content["full_text"], toc, page_fonts)
+    if not toc:
+        content["page_fonts"] = page_fonts
+
+    positions = diff_blocks(old_fps, content["fingerprints"])
+    content["diff"] = {
+        "added": [{"page": i + 1} for i in positions["added"]],
+        "changed": [{"page": i + 1} for i in positions["changed"]],
+        "removed": [{"page": i + 1} for i in positions["removed"]],
+        "extracted": extracted,
+        "reused": len(content["pages"]) - extracted
+    }
+    return content
+
+
+def extract_docx_incremental(file_path: str, previous: dict = None) -> dict:
+    """增量提取 Word：按正文段落 / 表格的 XML 计算指纹，只重新读取变化的块
+
+    标题级别取决于样式部件，样式部件的哈希作为文档级的键保存在 styles_hash 中；
+    它变化时所有段落重新提取，提取结果（如标题级别）变化的段落计入 changed。
+    """
+    import xml.etree.ElementTree as ET
+    import zipfile
+
+    previous = previous or {}
+    old_blocks = previous.get("fingerprints", [])
+
+    # 旧指纹 -> 旧提取结果
+    reusable = {}
+    old_paras = iter(previous.get("paragraphs", []))
+    old_tables = iter(previous.get("tables", []))
+    for block in old_blocks:
+        source = old_paras if block["kind"] == "paragraph" else old_tables
+        reusable[block["hash"]] = next(source, None)
+
+    content = {
+        "format": "docx",
+        "source": file_path,
+        "paragraphs": [],
+        "tables": [],
+        "full_text": "",
+        "fingerprints": []
+    }
+
+    sections = []
+    section = None
+    extracted = 0
+    restyled = []  # 样式变化导致提取结果变化的块位置
+    with zipfile.ZipFile(file_path) as zf:
+        document, styles_name = _docx_part_names(zf)
+        styles = _docx_styles(zf, styles_name)
+        has_styles = styles_name and styles_name in zf.namelist()
+        content["styles_hash"] = _fingerprint(zf.read(styles_name) if has_styles else b'')
+        styles_changed = content["styles_hash"] != previous.get("styles_hash")
+        for tag, element in _iter_docx_body(zf, document):
+            if tag not in (W_P, W_TBL):
+                continue
+            kind = 'p' if tag == W_P else 'tbl'
+            fp = _fingerprint(kind, ET.tostring(element))
+            cached = reusable.get(fp)
+
+            if tag == W_P:
+                if cached is None or styles_changed:
+                    para = _docx_paragraph(element, styles)
+                    if para is None:
+                        continue
+                    extracted += 1
+                    if cached is not None and para != cached:
+                        restyled.append(len(content["fingerprints"]))
+                    cached = para
+                if cached.get("level") or _is_heading_style(cached["style"]):
+                    section = cached["text"]
+                content["paragraphs"].append(cached)
+                content["fingerprints"].append({"kind": "paragraph", "hash": fp})
+            else:
+                if cached is None:
+                    cached = {"data": _docx_table(element)}
+                    extracted += 1
+                content["tables"].append({"index": len(content["tables"]), "data": cached["data"]})
+                content["fingerprints"].append({"kind": "table", "hash": fp})
+            sections.append(section)
+
+    content["full_text"] = "\n".join(p["text"] for p in content["paragraphs"])
+    content["outline"] = build_outline(docx_headings(content["paragraphs"]), content["full_text"])
+
+    def describe(blocks, index, section_of=None):
+        item = {"kind": blocks[index]["kind"], "position": index}
+        if section_of is not None:
+            item["section"] = section_of[index]
+        return item
+
+    positions = diff_blocks([b["hash"] for b in old_blocks],
+                            [b["hash"] for b in content["fingerprints"]])
+    positions["changed"] = sorted(set(positions["changed"]) | set(restyled) - set(positions["added"]))
+    content["diff"] = {
+        "added": [describe(content["fingerprints"], i, sections) for i in positions["added"]],
+        "changed": [describe(content["fingerprints"], i, sections) for i in positions["changed"]],
+        "removed": [describe(old_blocks, i) for i in positions["removed"]],
+        "extracted": extracted,
+        "reused": len(content["fingerprints"]) - extracted
+    }
+    return content
+
+
+def split_sections(text: str) -> list:
+    """按 Markdown 标题行切分章节（与章节索引一致，代码块中的 # 行不算标题），
+    返回 [(标题行, [行...]), ...]"""
+    sections = []
+    for line, heading in markdown_lines(text.splitlines(keepends=True)):
+        if not sections or heading:
+            sections.append((line.strip(), []))
+        sections[-1][1].append(line)
+    return sections
+
+
+def extract_text_incremental(file_path: str, format_type: str, previous: dict = None) -> dict:
+    """增量提取 Markdown / 纯文本：按标题切分章节并比较指纹"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    sections = split_sections(text)
+
+    old_fps = (previous or {}).get("fingerprints", [])
+    fingerprints = [_fingerprint(''.join(lines)) for _, lines in sections]
+    old_titles = (previous or {}).get("sections", [])
+    titles = [title for title, _ in sections]
+    positions = diff_blocks(old_fps, fingerprints)
+
+    return {
+        "format": "markdown" if format_type in ['markdown', 'md'] else "text",
+        "source": file_path,
+        "full_text": text,
+        "outline": build_outline(markdown_headings(text), text),
+        "sections": titles,
+        "fingerprints": fingerprints,
+        "diff": {
+            "added": [{"section": titles[i]} for i in positions["added"]],
+            "changed": [{"section": titles[i]} for i in positions["changed"]],
+            "removed": [{"section": old_titles[i] if i < len(old_titles) else None}
+                        for i in positions["removed"]],
+            "extracted": len(positions["added"]) + len(positions["changed"]),
+            "reused": len(fingerprints) - len(positions["added"]) - len(positions["changed"])
+        }
+    }
+
+
+def extract_paragraphs_incremental(file_path: str, format_type: str, previous: dict = None) -> dict:
+    """增量提取 RTF / .doc：全量解析后按段落指纹比较，输出差异"""
+    content = extract_rtf(file_path) if format_type == 'rtf' else extract_doc(file_path)
+    old_fps = (previous or {}).get("fingerprints", [])
+    fingerprints = [_fingerprint(p["text"]) for p in content["paragraphs"]]
+    positions = diff_blocks(old_fps, fingerprints)
+    content["fingerprints"] = fingerprints
+    content["diff"] = {
+        "added": [{"kind": "paragraph", "position": i} for i in positions["added"]],
+        "changed": [{"kind": "paragraph", "position": i} for i in positions["changed"]],
+        "removed": [{"kind": "paragraph", "position": i} for i in positions["removed"]],
+        "extracted": len(fingerprints),
+        "reused": 0
+    }
+    return content
+
+
+def extract_document_incremental(file_path: str, format_hint: str = None,
+                                 previous: dict = None) -> dict:
+    """增量提取：与上一次提取结果比较，只重新提取变化的页 / 块，并输出差异"""
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+
+    format_type = detect_format(file_path, format_hint)
+    output_format = {'md': 'markdown'}.get(format_type, format_type)
+    if output_format not in ('pdf', 'docx', 'doc', 'rtf', 'markdown'):
+        output_format = 'text'
+    if previous and previous.get("format") != output_format:
+        # 格式不同的旧结果无法复用
+        previous = None
+
+    if format_type == 'pdf':
+        return extract_pdf_incremental(file_path, previous)
+    elif format_type == 'docx':
+        return extract_docx_incremental(file_path, previous)
+    elif format_type in ('rtf', 'doc'):
+        return extract_paragraphs_incremental(file_path, format_type, previous)
+    return extract_text_incremental(file_path, format_type, previous)
+
+
+def iter_records(file_path: str, format_hint: str = None, jobs: int = 1):
+    """逐条产出提取记录（NDJSON 流式输出用）
+
+    首条为文档信息，之后 PDF 每页一条、Word 按正文顺序每个段落 / 表格一条、
+    Markdown / 纯文本每个章节一条。不构建 full_text。
+    """
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+
+    format_type = detect_format(file_path, format_hint)
+    output_format = {'md': 'markdown'}.get(format_type, format_type)
+    if output_format not in ('pdf', 'docx', 'doc', 'rtf', 'markdown'):
+        output_format = 'text'
+    yield {"type": "document", "format": output_format, "source": file_path}
+
     if format_type == 'pdf':
-        return extract_pdf(file_path)
+        for page in iter_pdf_pages(file_path, jobs):
+            yield {"type": "page", **page}
     elif format_type == 'docx':
-        return extract_docx(file_path)
-    elif format_type in ['markdown', 'md']:
-        return extract_markdown(file_path)
+        yield from iter_docx_blocks(file_path)
+    elif format_type == 'rtf':
+        for para in iter_rtf_paragraphs(file_path):
+            yield {"type": "paragraph", **para}
+    elif format_type == 'doc':
+        for para in extract_doc(file_path)["paragraphs"]:
+            yield {"type": "paragraph", **para}
     else:
-        # 默认作为纯文本处理
         with open(file_path, 'r', encoding='utf-8') as f:
-            return {
-                "format": "text",
-                "source": file_path,
-                "full_text": f.read()
-            }
+            title, lines = None, []
+            for line, heading in markdown_lines(f):
+                if heading and lines:
+                    yield {"type": "section", "title": title, "text": ''.join(lines)}
+                    lines = []
+                if not lines:
+                    title = line.strip() if heading else None
+                lines.append(line)
+            if lines:
+                yield {"type": "section", "title": title, "text": ''.join(lines)}
+
+
+def iter_docx_blocks(file_path: str):
+    """按正文顺序逐个产出 Word 段落与表格，边解析边产出"""
+    import zipfile
+
+    with zipfile.ZipFile(file_path) as zf:
+        document, styles_name = _docx_part_names(zf)
+        styles = _docx_styles(zf, styles_name)
+        table_idx = 0
+        for tag, element in _iter_docx_body(zf, document):
+            if tag == W_P:
+                para = _docx_paragraph(element, styles)
+                if para:
+                    yield {"type": "paragraph", **para}
+            elif tag == W_TBL:
+                yield {"type": "table", "index": table_idx, "data": _docx_table(element)}
+                table_idx += 1
+
+
+def write_stream(records, out):
+    """以 NDJSON 写出记录，每条写完立即刷新"""
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        out.flush()
+        count += 1
+    return count
+
+
+def collect_documents(target: str) -> tuple:
+    """展开目录或 glob 模式，返回 (基准目录, 文档路径列表)"""
+    path = Path(target)
+    if path.is_dir():
+        base = path
+        files = [p for p in path.rglob('*') if p.is_file()]
+    else:
+        # 基准目录取 glob 模式中第一个通配段之前的部分
+        prefix = []
+        for part in path.parts:
+            if any(c in part for c in '*?['):
+                break
+            prefix.append(part)
+        base = Path(*prefix) if len(prefix) < len(path.parts) and prefix else path.parent
+        files = [Path(p) for p in glob.glob(target, recursive=True) if Path(p).is_file()]
+    files = sorted(p for p in files
+                   if p.suffix.lower() in SUPPORTED_SUFFIXES and not p.name.startswith(('.', '~$')))
+    return base, files
+
+
+def _extract_to_file(file_path: str, output_path: str, format_hint: str = None,
+                     cache_dir: str = None,
+                     cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> dict:
+    """提取单个文档并写出 JSON，返回索引条目；异常只影响当前文件"""
+    start = time.perf_counter()
+    entry = {"file": file_path, "output": output_path, "format": None,
+             "pages": None, "elapsed": None, "error": None}
+    try:
+        content = extract_document(file_path, format_hint, 1, cache_dir, cache_max_bytes)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False, indent=2)
+        entry["format"] = content.get("format")
+        if "pages" in content:
+            entry["pages"] = len(content["pages"])
+    except (Exception, SystemExit) as e:  # extract_* 缺少依赖时会 sys.exit；Ctrl-C 照常中止
+        entry["output"] = None
+        entry["error"] = str(e) or type(e).__name__
+    entry["elapsed"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def extract_bulk(target: str, output_dir: str, jobs: int = 1, format_hint: str = None,
+                 cache_dir: str = None,
+                 cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> dict:
+    """批量提取目录或 glob 匹配的所有文档，写出各自的 JSON 和汇总索引 index.json"""
+    base, files = collect_documents(target)
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    outputs = []
+    for file in files:
+        try:
+            rel = file.resolve().relative_to(base.resolve())
+        except ValueError:
+            rel = Path(file.name)
+        outputs.append(str(out_dir / rel.with_name(rel.name + '.json')))
+
+    args = ([str(f) for f in files], outputs, [format_hint] * len(files),
+            [cache_dir] * len(files), [cache_max_bytes] * len(files))
+    start = time.perf_counter()
+    if jobs > 1 and len(files) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            entries = list(pool.map(_extract_to_file, *args))
+    else:
+        entries = [_extract_to_file(*a) for a in zip(*args)]
+
+    index = {
+        "target": target,
+        "output_dir": str(out_dir),
+        "generated_at": datetime.now().isoformat(),
+        "elapsed": round(time.perf_counter() - start, 3),
+        "succeeded": sum(1 for e in entries if not e["error"]),
+        "failed": sum(1 for e in entries if e["error"]),
+        "files": entries
+    }
+    with open(out_dir / "index.json", 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return index
+
+
+def requirements_dir_from_memory(project_path: str) -> str:
+    """读取 project-context.json 中记录的需求目录"""
+    context_path = Path(project_path) / ".memory" / "project-context.json"
+    if context_path.exists():
+        with open(context_path, 'r', encoding='utf-8') as f:
+            requirements_dir = json.load(f).get("requirements_dir")
+        if requirements_dir:
+            return str(Path(project_path) / requirements_dir)
+    return str(Path(project_path) / "requirements")
+
+
+def default_cache_dir(project_path: str) -> str:
+    """项目已初始化 .memory 时使用其中的缓存目录，否则不缓存"""
+    memory_path = Path(project_path) / ".memory"
+    return str(memory_path / CACHE_DIR_NAME) if memory_path.is_dir() else None
 
 
 def main():
-    parser = argparse.ArgumentParser(description='提取文档内容（PDF/Word/Markdown）')
-    parser.add_argument('-i', '--input', required=True, help='输入文件路径')
-    parser.add_argument('-f', '--format', help='文档格式（pdf/docx/md），不指定则自动检测')
+    parser = argparse.ArgumentParser(description='提取文档内容（PDF/Word/RTF/Markdown）')
+    parser.add_argument('-i', '--input', help='输入文件路径')
+    parser.add_argument('-f', '--format', help='文档格式（pdf/docx/doc/rtf/md），不指定则按文件头自动检测')
     parser.add_argument('-o', '--output', help='输出 JSON 文件路径，不指定则输出到 stdout')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='并行进程数：单个 PDF 按页并行，批量模式按文件并行（0 表示使用全部 CPU）')
+    parser.add_argument('--project', default='.', help='项目路径（缓存默认位于其 .memory/extract-cache）')
+    parser.add_argument('--cache-dir', help='提取缓存目录')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help='提取缓存容量上限（MB），超出时按最近使用淘汰')
+    parser.add_argument('--no-cache', action='store_true', help='不读取也不写入提取缓存')
+    parser.add_argument('--cache-stats', action='store_true', help='输出缓存统计并退出')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量提取：与上次结果比较，只重新提取变化的页/块，并输出差异')
+    parser.add_argument('--previous', help='上次增量提取的结果 JSON（默认使用 -o 指定的文件）')
+    parser.add_argument('--stream', action='store_true',
+                        help='以 NDJSON 流式输出：每页/段落/表格一行，边提取边输出')
+    parser.add_argument('--no-full-text', action='store_true',
+                        help='输出中不包含与 pages/paragraphs 重复的 full_text')
+    parser.add_argument('--outline', action='store_true',
+                        help='只输出章节索引（标题层级、字符区间、页码、需求 ID）')
+    parser.add_argument('--section', help='只输出标题匹配的单个章节文本（含其下级章节）')
+    parser.add_argument('--bulk', nargs='?', const='',
+                        help='批量提取目录或 glob 模式下的所有文档（不带值时使用 .memory 中记录的需求目录）')
+    parser.add_argument('--output-dir', help='批量提取的输出目录（写出各文档 JSON 和 index.json）')
+    timings.add_arguments(parser)
     args = parser.parse_args()
+    timings.begin("extract_document", args.timings, args.profile)
+
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir(args.project))
+    cache_max_bytes = args.cache_max_mb * 1024 * 1024
+
+    if args.cache_stats:
+        stats_dir = args.cache_dir or str(Path(args.project) / ".memory" / CACHE_DIR_NAME)
+        print(json.dumps(cache_stats(stats_dir, cache_max_bytes), ensure_ascii=False, indent=2))
+        return
+    if args.bulk is not None:
+        if not args.output_dir:
+            parser.error('批量提取需要指定 --output-dir')
+        target = args.bulk or requirements_dir_from_memory(args.project)
+        jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+        index = extract_bulk(target, args.output_dir, jobs, args.format, cache_dir, cache_max_bytes)
+        for entry in index["files"]:
+            if entry["error"]:
+                print(f"提取失败: {entry['file']}: {entry['error']}", file=sys.stderr)
+        print(f"批量提取完成: 成功 {index['succeeded']}，失败 {index['failed']}，"
+              f"耗时 {index['elapsed']}s，索引: {Path(args.output_dir) / 'index.json'}")
+        if index["failed"]:
+            sys.exit(1)
+        return
+    if not args.input:
+        parser.error('需要指定 -i/--input')
 
     try:
-        content = extract_document(args.input, args.format)
+        if args.stream:
+            jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+            records = iter_records(args.input, args.format, jobs)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    count = write_stream(records, f)
+                print(f"已提取到: {args.output}（{count} 条记录）")
+            else:
+                write_stream(records, sys.stdout)
+            return
 
-        if args.output:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                json.dump(content, f, ensure_ascii=False, indent=2)
-            print(f"已提取到: {args.output}")
+        if args.incremental:
+            previous = None
+            previous_path = args.previous or args.output
+            if previous_path and Path(previous_path).exists():
+                with open(previous_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            with stage("extract_incremental"):
+                content = extract_document_incremental(args.input, args.format, previous)
         else:
-            print(json.dumps(content, ensure_ascii=False, indent=2))
+            jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+            content = extract_document(args.input, args.format, jobs, cache_dir, cache_max_bytes)
+
+        if args.section:
+            content = section_text(content, args.section)
+        elif args.outline:
+            content = {"format": content.get("format"), "source": content.get("source"),
+                       "outline": content.get("outline", [])}
+        elif args.no_full_text and ("pages" in content or "paragraphs" in content):
+            content.pop("full_text", None)
+
+        with stage("write_output"):
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(content, f, ensure_ascii=False, indent=2)
+                print(f"已提取到: {args.output}")
+            else:
+                print(json.dumps(content, ensure_ascii=False, indent=2))
 
     except Exception as e:
         print(f"提取失败: {e}", file=sys.stderr)
@@ -155,4 +1646,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # 常驻工作进程运行时转发给它执行，否则在本进程内执行
+    from worker import run_via_worker
+    if not run_via_worker("extract_document"):
+        main()
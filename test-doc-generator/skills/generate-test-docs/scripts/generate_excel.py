@@ -7,16 +7,16 @@
 
 import argparse
 import json
+import os
 import sys
+from functools import lru_cache
+from io import TextIOWrapper
 from pathlib import Path
 
-try:
-    from openpyxl import Workbook, load_workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.worksheet.datavalidation import DataValidation
-except ImportError:
-    print("错误：请先安装 openpyxl: pip install openpyxl", file=sys.stderr)
-    sys.exit(1)
+import timings
+from timings import stage
+
+# openpyxl 及其子模块在用到的函数内按需导入，--help、纯数据处理等路径不承担其导入开销
 
 DEFAULT_COLUMNS = ['用例编号', '模块名称', '用例标题', '优先级', '关联需求ID',
                    '设计方法', '前置条件', '测试步骤', '预期结果', '实际结果',
@@ -30,8 +30,51 @@ PRIORITY_COLORS = {
     'P3': '99CC00',  # Green
 }
 
+# 下拉验证：(列名, 可选值公式, 错误提示)
+DATA_VALIDATIONS = [
+    ('优先级', '"P0,P1,P2,P3"', '请选择有效的优先级'),
+    ('回归类型', '"冒烟,核心,全量"', '请选择有效的回归类型'),
+    ('是否通过', '"通过,未通过,阻塞,未执行"', '请选择有效的状态'),
+]
+# 执行列：增量更新时保留测试人员填写的内容
+EXECUTION_COLUMNS = ['实际结果', '是否通过']
+REMOVED_MARK = '[已移除]'
+TRACE_SHEETS = ['需求追溯矩阵', '覆盖率统计']
+
 REGRESSION_TYPES = ['冒烟', '核心', '全量']
 DESIGN_METHODS = ['EP', 'BVA', 'ST', 'EG', 'EP+BVA']
+# 数字记录之后允许出现的字符；读到其中之一才能确定数字已完整
+JSON_NUMBER_DELIMITERS = ' \t\r\n,]}'
+
+@lru_cache(maxsize=None)
+def shared_styles() -> dict:
+    """共享样式对象（首次使用时创建），各单元格引用同一实例"""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    thin = Side(style='thin')
+    return {
+        "border": Border(left=thin, right=thin, top=thin, bottom=thin),
+        "header_font": Font(bold=True, color="FFFFFF", size=11),
+        "header_fill": PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        "header_alignment": Alignment(horizontal='center', vertical='center'),
+        "cell_alignment": Alignment(vertical='top', wrap_text=True),
+    }
+
+
+# 模板缓存：(路径, mtime) -> 模板内容与表头
+_TEMPLATE_CACHE = {}
+# 复制模板行属性时跳过的键：行号、列跨度和行样式（样式编号指向模板自己的样式表）
+TEMPLATE_ROW_ATTRS_SKIPPED = {'r', 'spans', 's', 'customFormat'}
+# 流式复制模板时无法重建的内容（图片 / 图表、表格、超链接、透视表、图表 Sheet、外部链接），
+# 出现时改为整体载入模板；值为工作表 XML 的顶层标签或关系类型
+TEMPLATE_UNSUPPORTED = {'drawing', 'tableParts', 'table', 'hyperlinks', 'pivotTable',
+                        'chartsheet', 'externalLink'}
+# SpreadsheetML 包关系命名空间：定位工作簿部件与各工作表的 XML 路径
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+DOCUMENT_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+SHEET_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+# template-schemas.json 中按模板绝对路径缓存学习结果的字段
+TEMPLATE_SCHEMA_KEY = "excel_templates"
 
 # 字段名称标准化映射
 FIELD_MAP = {
@@ -53,27 +96,230 @@ FIELD_MAP = {
 }
 
 
+def _open_source(source: str):
+    """打开数据来源，'-' 表示标准输入"""
+    if source == '-':
+        return TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(source, 'r', encoding='utf-8')
+
+
+def iter_json_records(stream, chunk_size: int = 1 << 16):
+    """从文本流增量读取记录，支持 JSON 数组和 JSON Lines
+
+    按块读取并逐条解码，内存中只保留当前记录和一个读取块。
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = None
+    # 数组模式下期待的下一个记号：first 首个元素或 ]，value 元素，sep 逗号或 ]
+    expect = 'first'
+
+    while True:
+        # 跳过空白，必要时继续读取
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n\ufeff':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        if pos >= len(buf):
+            if in_array:
+                raise ValueError("JSON 数组未闭合")
+            return
+        if in_array is None:
+            in_array = buf[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array:
+            char = buf[pos]
+            if expect == 'sep':
+                if char == ']':
+                    return
+                if char != ',':
+                    raise ValueError(f"JSON 数组元素之间缺少逗号: {buf[pos:pos + 20]!r}")
+                expect = 'value'
+                pos += 1
+                continue
+            if char == ']' and expect == 'first':
+                return
+            if char in ',]':
+                raise ValueError("JSON 数组中有空元素")
+
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if not eof and isinstance(record, (int, float)) and not isinstance(record, bool) \
+                and (end == len(buf) or buf[end] not in JSON_NUMBER_DELIMITERS):
+            # 数字可能跨块被截断（如 "12" + "34"、"-6." + "5"），读到分隔符或文件末尾再解码
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = end
+        expect = 'sep'
+        yield record
+
+
+def read_json_records(source: str):
+    """逐条读取文件或标准输入（'-'）中的 JSON / JSONL 记录"""
+    with _open_source(source) as f:
+        yield from iter_json_records(f)
+
+
+def _is_inline_json(value: str) -> bool:
+    return value.lstrip().startswith(('[', '{'))
+
+
+def load_json_arg(value: str, records: bool = False):
+    """解析 JSON 参数：内联 JSON 字符串、文件路径或 '-'（标准输入）
+
+    records 为 True 时文件内容按 JSON 数组或 JSON Lines 读取为列表。
+    """
+    if value is None:
+        return None
+    if _is_inline_json(value):
+        return json.loads(value)
+    if records:
+        return list(read_json_records(value))
+    with _open_source(value) as f:
+        return json.load(f)
+
+
+def build_col_index(columns: list) -> dict:
+    """建立列名到列号的索引（同时登记标准化字段名）"""
+    col_index = {}
+    for i, col_name in enumerate(columns):
+        normalized = col_name.lower().strip()
+        standard_name = FIELD_MAP.get(normalized, col_name)
+        col_index[standard_name] = i + 1
+        col_index[col_name] = i + 1
+    return col_index
+
+
+def case_values(case: dict, col_index: dict, width: int) -> list:
+    """按列顺序取出一条用例的值（字段名按 FIELD_MAP 标准化后匹配列）"""
+    values = [None] * width
+    for key, value in case.items():
+        col_num = col_index.get(key)
+        if col_num:
+            values[col_num - 1] = value
+    return values
+
+
+def _package_targets(archive, rels_name: str, base: str) -> dict:
+    """读取关系文件：关系 ID -> (类型, 包内路径)，外部链接不计入"""
+    import posixpath
+    import xml.etree.ElementTree as ET
+
+    if rels_name not in archive.namelist():
+        return {}
+    found = {}
+    for rel in ET.fromstring(archive.read(rels_name)).iter(PACKAGE_REL_NS + 'Relationship'):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target', '')
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+        found[rel.get('Id')] = (rel.get('Type', '').rsplit('/', 1)[-1], path)
+    return found
+
+
+def _workbook_parts(archive) -> dict:
+    """解析 workbook.xml 及其关系文件
+
+    返回 sheets（按工作簿中的顺序：名称、类型、XML 路径、显示状态、局部定义名称）、
+    names（全局定义名称）和 parts（工作簿级部件类型 -> 路径）。
+    """
+    import posixpath
+    import xml.etree.ElementTree as ET
+
+    workbook = next((path for kind, path in _package_targets(archive, '_rels/.rels', '').values()
+                     if kind == 'officeDocument'), 'xl/workbook.xml')
+    folder, name = posixpath.split(workbook)
+    targets = _package_targets(archive, posixpath.join(folder, '_rels', name + '.rels'), folder)
+    root = ET.fromstring(archive.read(workbook))
+    sheets = []
+    for sheet in root.iter(SHEET_MAIN_NS + 'sheet'):
+        kind, path = targets.get(sheet.get(DOCUMENT_REL_NS + 'id'), (None, None))
+        sheets.append({"title": sheet.get('name'), "kind": kind, "path": path,
+                       "state": sheet.get('state', 'visible'), "names": []})
+    names = []
+    element = root.find(SHEET_MAIN_NS + 'definedNames')
+    if element is not None:
+        from openpyxl.workbook.defined_name import DefinedNameList
+
+        for defn in DefinedNameList.from_tree(element).definedName:
+            if defn.localSheetId is None:
+                names.append(defn)
+            elif defn.localSheetId < len(sheets):
+                sheets[defn.localSheetId]["names"].append(defn)
+    return {"sheets": sheets, "names": names, "parts": {kind: path for kind, path in targets.values()}}
+
+
+def _sheet_xml_path(archive, title: str) -> str:
+    """工作表名称对应的 XML 路径"""
+    for sheet in _workbook_parts(archive)["sheets"]:
+        if sheet["kind"] == 'worksheet' and sheet["title"] == title:
+            return sheet["path"]
+    raise ValueError(f"模板中找不到工作表: {title}")
+
+
+def _read_column_widths(template_path: str, title: str) -> dict:
+    """从工作表 XML 的 <cols> 读取列宽（列号 -> 宽度），读到 <sheetData> 即停止"""
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+
+    widths = {}
+    with zipfile.ZipFile(template_path) as archive:
+        with archive.open(_sheet_xml_path(archive, title)) as f:
+            for _, elem in iterparse(f, events=('start',)):
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag == 'sheetData':
+                    break
+                if tag == 'col':
+                    width = elem.get('width')
+                    for col in range(int(elem.get('min')), int(elem.get('max')) + 1):
+                        widths[col] = float(width) if width else 13.0
+    return widths
+
+
 def learn_template(template_path: str) -> dict:
-    """学习用户模板结构，返回 schema"""
-    wb = load_workbook(template_path)
+    """学习用户模板结构，返回 schema（只读模式，仅读取表头、首个示例行和列宽）"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(template_path, read_only=True)
     ws = wb.active
+    rows = list(ws.iter_rows(min_row=1, max_row=2, values_only=True))
+    title = ws.title
+    wb.close()
 
+    header = rows[0] if rows else ()
+    sheet_widths = _read_column_widths(template_path, title)
     columns = []
     column_widths = []
 
-    for col_idx, cell in enumerate(ws[1], 1):
-        if cell.value:
-            col_name = str(cell.value).strip()
+    for col_idx, value in enumerate(header, 1):
+        if value:
+            col_name = str(value).strip()
             columns.append(col_name)
-            # 获取列宽
-            col_letter = chr(64 + col_idx)
-            width = ws.column_dimensions[col_letter].width or 12
-            column_widths.append(width)
+            # 获取列宽（未设置时为 Excel 默认宽度）
+            column_widths.append(sheet_widths.get(col_idx, 13.0))
 
     # 检测 ID 格式（如果有示例行）
     id_format = None
-    if ws.max_row >= 2:
-        first_id = ws.cell(row=2, column=1).value
+    if len(rows) >= 2:
+        first_id = rows[1][0] if rows[1] else None
         if first_id and isinstance(first_id, str):
             # 尝试识别格式
             if '_' in first_id:
@@ -89,112 +335,404 @@ def learn_template(template_path: str) -> dict:
         "learned_at": str(Path(template_path).stat().st_mtime)
     }
 
-    wb.close()
     return schema
 
 
-def create_excel(output: str, data: list, template: str = None, schema: dict = None):
-    """生成测试用例 Excel"""
+def _file_sha256(path: Path) -> str:
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_learn_template(template_path: str, project_path: str = None,
+                          relearn: bool = False) -> dict:
+    """学习模板结构，结果按 路径 + mtime + 内容哈希 缓存在 .memory/template-schemas.json
+
+    mtime 与大小未变时直接复用；mtime 变了但内容哈希相同（如仅被 touch 或复制）时
+    只刷新 mtime；项目没有 .memory 时不缓存。
+    """
+    if not project_path or not (Path(project_path) / ".memory").is_dir():
+        with stage("learn_template"):
+            return learn_template(template_path)
+
+    from memory_manager import memory_lock, read_memory, update_memory
+
+    path = Path(template_path).resolve()
+    stat = path.stat()
+    key = str(path)
+    with memory_lock(project_path):
+        cached = read_memory(project_path, "template_schemas").get(TEMPLATE_SCHEMA_KEY, {}).get(key)
+        if not relearn and cached and cached.get("mtime_ns") == stat.st_mtime_ns \
+                and cached.get("size") == stat.st_size:
+            return cached
+
+        digest = _file_sha256(path)
+        if not relearn and cached and cached.get("sha256") == digest:
+            schema = dict(cached, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            with stage("learn_template"):
+                schema = learn_template(template_path)
+            schema.update({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest})
+        update_memory(project_path, "template_schemas",
+                      {TEMPLATE_SCHEMA_KEY: {key: schema}}, quiet=True)
+    return schema
+
+
+def _sheet_settings() -> dict:
+    """工作表 XML 中原样复制的顶层元素：标签 -> (工作表属性, 解析类)"""
+    from openpyxl.worksheet.filters import AutoFilter
+    from openpyxl.worksheet.header_footer import HeaderFooter
+    from openpyxl.worksheet.page import PageMargins, PrintOptions, PrintPageSetup
+    from openpyxl.worksheet.pagebreak import ColBreak, RowBreak
+    from openpyxl.worksheet.properties import WorksheetProperties
+    from openpyxl.worksheet.protection import SheetProtection
+    from openpyxl.worksheet.views import SheetViewList
+    from openpyxl.worksheet.dimensions import SheetFormatProperties
+
+    return {
+        'sheetPr': ('sheet_properties', WorksheetProperties),
+        'sheetViews': ('views', SheetViewList),
+        'sheetFormatPr': ('sheet_format', SheetFormatProperties),
+        'sheetProtection': ('protection', SheetProtection),
+        'autoFilter': ('auto_filter', AutoFilter),
+        'printOptions': ('print_options', PrintOptions),
+        'pageMargins': ('page_margins', PageMargins),
+        'pageSetup': ('page_setup', PrintPageSetup),
+        'headerFooter': ('HeaderFooter', HeaderFooter),
+        'rowBreaks': ('row_breaks', RowBreak),
+        'colBreaks': ('col_breaks', ColBreak),
+    }
+
+
+def _read_sheet_parts(archive, sheet_path: str, max_row: int = None) -> dict:
+    """从工作表 XML 及其关系文件读取复制模板所需的部件
+
+    返回列宽、数据验证、合并单元格、条件格式、行属性（行高、隐藏等）、页面设置等
+    工作表属性（settings）和批注；unsupported 列出流式复制无法重建的内容（图片、图表、
+    表格、超链接、透视表等）。max_row 不为 None 时只保留不超过该行的合并区域、行属性和
+    批注（活动 Sheet 只复制表头行）。逐行丢弃已解析的 <sheetData> 内容，内存占用与行数无关。
+    """
+    import posixpath
+    from xml.etree.ElementTree import fromstring, iterparse
+    from openpyxl.comments.comment_sheet import CommentSheet
+    from openpyxl.formatting.formatting import ConditionalFormatting
+    from openpyxl.utils.cell import coordinate_to_tuple
+    from openpyxl.worksheet.cell_range import CellRange
+    from openpyxl.worksheet.datavalidation import DataValidationList
+
+    settings = _sheet_settings()
+    parts = {"widths": {}, "validations": [], "merged": [], "formatting": [], "row_dimensions": {},
+             "settings": {}, "comments": {}, "unsupported": []}
+    row_idx, depth = 0, 0
+    with archive.open(sheet_path) as f:
+        for event, elem in iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if depth == 2 and tag == 'row':
+                row_idx = int(float(elem.get('r', row_idx + 1)))
+                attrs = {k: v for k, v in elem.attrib.items()
+                         if k not in TEMPLATE_ROW_ATTRS_SKIPPED and not k.startswith('{')}
+                if attrs and (max_row is None or row_idx <= max_row):
+                    parts["row_dimensions"][row_idx] = attrs
+                elem.clear()
+            elif depth != 1:
+                continue
+            elif tag == 'cols':
+                for col in elem:
+                    width = col.get('width')
+                    for col_idx in range(int(col.get('min')), int(col.get('max')) + 1):
+                        parts["widths"][col_idx] = float(width) if width else 13.0
+            elif tag == 'mergeCells':
+                for merged in elem:
+                    ref = merged.get('ref')
+                    if max_row is None or CellRange(ref).max_row <= max_row:
+                        parts["merged"].append(ref)
+            elif tag == 'conditionalFormatting':
+                try:
+                    parts["formatting"].append(ConditionalFormatting.from_tree(elem))
+                except TypeError:
+                    pass  # openpyxl 也无法读取的规则，与 load_workbook 一样丢弃
+            elif tag == 'dataValidations':
+                parts["validations"] = list(DataValidationList.from_tree(elem).dataValidation)
+            elif tag in settings:
+                attr, cls = settings[tag]
+                parts["settings"][attr] = cls.from_tree(elem)
+            elif tag in TEMPLATE_UNSUPPORTED:
+                parts["unsupported"].append(tag)
+
+    folder, name = posixpath.split(sheet_path)
+    for kind, path in _package_targets(archive, posixpath.join(folder, '_rels', name + '.rels'),
+                                       folder).values():
+        if kind == 'comments':
+            for ref, comment in CommentSheet.from_tree(fromstring(archive.read(path))).comments:
+                row, col = coordinate_to_tuple(ref)
+                if max_row is None or row <= max_row:
+                    parts["comments"][(row, col)] = comment
+        elif kind in TEMPLATE_UNSUPPORTED:
+            parts["unsupported"].append(kind)
+    return parts
+
+
+def _read_differential_styles(archive, styles_path: str) -> list:
+    """模板样式表中的差异样式（dxf），条件格式规则按 dxfId 引用"""
+    from xml.etree.ElementTree import fromstring
+    from openpyxl.styles.differential import DifferentialStyleList
+
+    if not styles_path or styles_path not in archive.namelist():
+        return []
+    element = fromstring(archive.read(styles_path)).find(SHEET_MAIN_NS + 'dxfs')
+    return list(DifferentialStyleList.from_tree(element).dxf) if element is not None else []
+
+
+def _cell_snapshot(cell) -> list:
+    """只读单元格的值与样式（字体、填充、边框、对齐、数字格式），批注随后补入"""
+    if not getattr(cell, 'has_style', False):
+        return [cell.value, None, None]
+    return [cell.value, (cell.font, cell.fill, cell.border, cell.alignment, cell.number_format), None]
+
+
+def _template_skeleton(template: str) -> dict:
+    """读取模板骨架，按路径 + mtime 缓存，供同一进程内多次生成复用
+
+    活动 Sheet 只读取表头行，不读取示例行；其他 Sheet（如填写说明、下拉列表）原样保留值和样式。
+    各 Sheet 同时保留显示状态、列宽、行高、合并单元格、条件格式、数据验证、批注、筛选、
+    打印与页面设置，工作簿保留定义名称。unsupported 非空时模板含有无法流式复制的内容。
+    """
+    import zipfile
+    from openpyxl import load_workbook
+
+    path = Path(template).resolve()
+    key = (str(path), path.stat().st_mtime_ns)
+    skeleton = _TEMPLATE_CACHE.get(key)
+    if skeleton is None:
+        with stage("load_template"):
+            wb = load_workbook(path, read_only=True)
+            active_title = wb.active.title
+            sheets = []
+            with zipfile.ZipFile(path) as archive:
+                book = _workbook_parts(archive)
+                unsupported = [kind for kind in book["parts"] if kind in TEMPLATE_UNSUPPORTED]
+                unsupported += [sheet["kind"] for sheet in book["sheets"] if sheet["kind"] != 'worksheet']
+                dxfs = _read_differential_styles(archive, book["parts"].get('styles'))
+                for info in book["sheets"]:
+                    if info["kind"] != 'worksheet':
+                        continue
+                    ws = wb[info["title"]]
+                    active = ws.title == active_title
+                    max_row = 1 if active else None
+                    parts = _read_sheet_parts(archive, info["path"], max_row)
+                    unsupported += parts.pop("unsupported")
+                    # 条件格式的样式（dxf）在模板的样式表中，随规则一起带到新工作簿
+                    for cf in parts["formatting"]:
+                        for rule in cf.rules:
+                            if rule.dxfId is not None and rule.dxfId < len(dxfs):
+                                rule.dxf = dxfs[rule.dxfId]
+                    rows = [[_cell_snapshot(cell) for cell in row]
+                            for row in ws.iter_rows(min_row=1, max_row=max_row)]
+                    # 批注可能在没有值的单元格上，按位置补齐行列
+                    for (row_idx, col_idx), comment in parts.pop("comments").items():
+                        while len(rows) < row_idx:
+                            rows.append([])
+                        row = rows[row_idx - 1]
+                        while len(row) < col_idx:
+                            row.append([None, None, None])
+                        row[col_idx - 1][2] = comment
+                    sheets.append({
+                        "title": ws.title,
+                        "active": active,
+                        "state": info["state"],
+                        # 筛选区域由 auto_filter 重建，不复制其隐藏名称
+                        "names": [defn for defn in info["names"] if defn.name != '_xlnm._FilterDatabase'],
+                        "rows": rows,
+                        **parts,
+                    })
+            wb.close()
+        skeleton = {"sheets": sheets, "names": book["names"], "unsupported": sorted(set(unsupported)),
+                    # 文档属性、1904 日期系统和工作簿保护
+                    "workbook": {"properties": wb.properties, "epoch": wb.epoch, "security": wb.security}}
+        _TEMPLATE_CACHE[key] = skeleton
+    return skeleton
+
+
+def _copied_cell(ws, value, style, comment=None):
+    """按快照创建 write-only 单元格"""
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    if style:
+        cell.font, cell.fill, cell.border, cell.alignment, cell.number_format = style
+    if comment is not None:
+        cell.comment = comment
+    return cell
+
+
+def _template_validations(validations, col_index: dict) -> list:
+    """模板自带的数据验证，去掉覆盖本脚本下拉验证列的区域，避免同一单元格有两个验证"""
+    from copy import copy
+    from openpyxl.worksheet.cell_range import MultiCellRange
+
+    validated = {col_index[name] for name, _, _ in DATA_VALIDATIONS if name in col_index}
+    kept = []
+    for dv in validations:
+        ranges = [cr for cr in dv.sqref.ranges
+                  if not any(cr.min_col <= col <= cr.max_col for col in validated)]
+        if not ranges:
+            continue
+        dv = copy(dv)
+        dv.sqref = MultiCellRange(ranges)
+        kept.append(dv)
+    return kept
+
+
+def create_excel(output: str, data, template: str = None, schema: dict = None,
+                 traceability: bool = False, requirements: list = None,
+                 streaming: bool = False, project: str = None,
+                 output_format: str = None) -> int:
+    """生成测试用例 Excel（或 CSV / JSONL / Markdown），返回写入的用例数量
+
+    data 可以是列表或任意可迭代对象；流式模式下逐条消费，不整体载入内存。
+    project 有 .memory 时复用其中缓存的模板 schema。
+    output_format 不指定时按输出文件扩展名推断。
+    """
+    output_format = output_format or detect_output_format(output)
+    if output_format != "xlsx":
+        if output_format not in WRITERS:
+            raise ValueError(f"不支持的输出格式: {output_format}，可选 {' / '.join(OUTPUT_FORMATS)}")
+        if traceability:
+            raise ValueError("追溯矩阵仅支持 xlsx 输出，覆盖率统计可使用 --stats-only")
+        if template and Path(template).exists():
+            columns = cached_learn_template(template, project)["columns"]
+        else:
+            columns = schema.get("columns", DEFAULT_COLUMNS) if schema else DEFAULT_COLUMNS
+        with stage(f"write_{output_format}"):
+            return WRITERS[output_format](output, data, columns)
 
     if template and Path(template).exists():
-        # 基于用户模板
-        wb = load_workbook(template)
-        ws = wb.active
-        columns = [cell.value for cell in ws[1] if cell.value]
-        start_row = 2
-
-        # 清除示例数据
-        for row in ws.iter_rows(min_row=start_row, max_row=ws.max_row):
-            for cell in row:
-                cell.value = None
-    else:
-        # 使用默认格式或 schema
+        # 基于用户模板：复制模板骨架后逐行写出，两种模式相同
+        columns = cached_learn_template(template, project)["columns"]
+        return create_excel_from_template(output, data, template, columns,
+                                          traceability, requirements)
+
+    if streaming:
         columns = schema.get("columns", DEFAULT_COLUMNS) if schema else DEFAULT_COLUMNS
         widths = schema.get("widths", DEFAULT_WIDTHS) if schema else DEFAULT_WIDTHS
-        start_row = 2
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "测试用例"
-
-        # 写入表头
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
+        return create_excel_streaming(output, data, columns, widths, traceability, requirements)
 
-        for col, name in enumerate(columns, 1):
-            cell = ws.cell(row=1, column=col, value=name)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
 
-        # 设置列宽
-        for i, width in enumerate(widths):
-            if i < len(columns):
-                ws.column_dimensions[chr(65 + i)].width = width
+    # 使用默认格式或 schema
+    columns = schema.get("columns", DEFAULT_COLUMNS) if schema else DEFAULT_COLUMNS
+    widths = schema.get("widths", DEFAULT_WIDTHS) if schema else DEFAULT_WIDTHS
 
-    # 建立列索引
-    col_index = {}
-    for i, col_name in enumerate(columns):
-        normalized = col_name.lower().strip()
-        standard_name = FIELD_MAP.get(normalized, col_name)
-        col_index[standard_name] = i + 1
-        col_index[col_name] = i + 1
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "测试用例"
 
-    # 写入数据
-    border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
+    # 写入表头
+    styles = shared_styles()
+    for col, name in enumerate(columns, 1):
+        cell = ws.cell(row=1, column=col, value=name)
+        cell.font = styles["header_font"]
+        cell.fill = styles["header_fill"]
+        cell.alignment = styles["header_alignment"]
+        cell.border = styles["border"]
+
+    # 设置列宽
+    for i, width in enumerate(widths):
+        if i < len(columns):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width
+
+    return write_case_sheet(wb, ws, data, columns, output, traceability, requirements)
+
+
+def write_case_sheet(wb, ws, data, columns: list, output: str,
+                     traceability: bool = False, requirements: list = None) -> int:
+    """在已有表头的用例 Sheet 第 2 行起写入用例，添加下拉验证、优先级颜色和追溯统计后保存
+
+    返回写入的用例数量。
+    """
+    if not isinstance(data, list):
+        with stage("read_input"):
+            data = list(data)
+    start_row = 2
+
+    with stage("write_rows"):
+        # 建立列索引
+        col_index = build_col_index(columns)
+
+        # 写入数据
+        cell_alignment = shared_styles()["cell_alignment"]
+        border = shared_styles()["border"]
+        stats = new_case_stats() if traceability else None
+        for row_idx, case in enumerate(data, start_row):
+            if stats is not None:
+                add_case_stats(stats, case)
+            for key, value in case.items():
+                col_num = col_index.get(key)
+                if col_num:
+                    cell = ws.cell(row=row_idx, column=col_num, value=value)
+                    cell.alignment = cell_alignment
+                    cell.border = border
+
+    end_row = start_row + len(data) - 1 if data else start_row
 
-    for row_idx, case in enumerate(data, start_row):
-        for key, value in case.items():
-            col_num = col_index.get(key)
-            if col_num:
-                cell = ws.cell(row=row_idx, column=col_num, value=value)
-                cell.alignment = Alignment(vertical='top', wrap_text=True)
-                cell.border = border
+    # 添加数据验证和优先级颜色
+    with stage("data_validation"):
+        add_data_validation(ws, start_row, end_row, col_index)
+    with stage("priority_colors"):
+        apply_priority_colors(ws, start_row, end_row, col_index)
 
     ws.freeze_panes = 'A2'
-    wb.save(output)
-    print(f"已生成: {output}")
+    extend_auto_filter(ws, len(data) + 1)
+
+    # 生成追溯矩阵和覆盖率统计（如果启用）
+    if stats is not None:
+        with stage("traceability"):
+            finish_case_stats(stats, requirements)
+            create_traceability_sheet(wb, stats)
+        with stage("coverage_stats"):
+            create_coverage_stats_sheet(wb, stats)
+
+    with stage("save"):
+        wb.save(output)
+    return len(data)
 
 
 def add_data_validation(ws, start_row: int, end_row: int, col_index: dict):
     """添加数据验证（下拉列表）"""
-    # 优先级下拉
-    if '优先级' in col_index:
-        priority_col = col_index['优先级']
-        priority_dv = DataValidation(type="list", formula1='"P0,P1,P2,P3"', allow_blank=True)
-        priority_dv.error = '请选择有效的优先级'
-        priority_dv.errorTitle = '无效输入'
-        ws.add_data_validation(priority_dv)
-        for row in range(start_row, end_row + 1):
-            priority_dv.add(ws.cell(row=row, column=priority_col))
-
-    # 回归类型下拉
-    if '回归类型' in col_index:
-        regression_col = col_index['回归类型']
-        regression_dv = DataValidation(type="list", formula1='"冒烟,核心,全量"', allow_blank=True)
-        regression_dv.error = '请选择有效的回归类型'
-        regression_dv.errorTitle = '无效输入'
-        ws.add_data_validation(regression_dv)
-        for row in range(start_row, end_row + 1):
-            regression_dv.add(ws.cell(row=row, column=regression_col))
-
-    # 是否通过下拉
-    if '是否通过' in col_index:
-        pass_col = col_index['是否通过']
-        pass_dv = DataValidation(type="list", formula1='"通过,未通过,阻塞,未执行"', allow_blank=True)
-        pass_dv.error = '请选择有效的状态'
-        pass_dv.errorTitle = '无效输入'
-        ws.add_data_validation(pass_dv)
-        for row in range(start_row, end_row + 1):
-            pass_dv.add(ws.cell(row=row, column=pass_col))
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    for column, formula, error in DATA_VALIDATIONS:
+        if column not in col_index:
+            continue
+        dv = DataValidation(type="list", formula1=formula, allow_blank=True)
+        dv.error = error
+        dv.errorTitle = '无效输入'
+        # 按区域添加，write-only 工作表没有 add_data_validation
+        ws.data_validations.append(dv)
+        letter = get_column_letter(col_index[column])
+        dv.add(f"{letter}{start_row}:{letter}{end_row}")
+
+
+def extend_auto_filter(ws, last_row: int):
+    """模板的筛选区域从表头开始时，把它扩展（或收缩）到最后一条用例"""
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+
+    if not ws.auto_filter.ref:
+        return
+    cr = CellRange(ws.auto_filter.ref)
+    if cr.min_row == 1:
+        ws.auto_filter.ref = f"{get_column_letter(cr.min_col)}1:{get_column_letter(cr.max_col)}{last_row}"
 
 
 def apply_priority_colors(ws, start_row: int, end_row: int, col_index: dict):
@@ -204,40 +742,100 @@ def apply_priority_colors(ws, start_row: int, end_row: int, col_index: dict):
 
     priority_col = col_index['优先级']
     for row in range(start_row, end_row + 1):
-        cell = ws.cell(row=row, column=priority_col)
-        priority = str(cell.value).upper() if cell.value else ''
-        if priority in PRIORITY_COLORS:
-            cell.fill = PatternFill(start_color=PRIORITY_COLORS[priority],
-                                    end_color=PRIORITY_COLORS[priority],
-                                    fill_type="solid")
-            if priority in ['P0', 'P1']:
-                cell.font = Font(bold=True, color="FFFFFF")
-
-
-def create_traceability_sheet(wb, data: list, requirements: list = None):
-    """创建需求追溯矩阵 Sheet"""
+        color_priority_cell(ws.cell(row=row, column=priority_col))
+
+
+def color_priority_cell(cell, reset: bool = False):
+    """按优先级为单元格着色；reset 时无效优先级恢复为无填充的默认字体"""
+    from openpyxl.styles import Font, PatternFill
+
+    priority = str(cell.value).upper() if cell.value else ''
+    if priority in PRIORITY_COLORS:
+        cell.fill = PatternFill(start_color=PRIORITY_COLORS[priority],
+                                end_color=PRIORITY_COLORS[priority],
+                                fill_type="solid")
+        if priority in ['P0', 'P1']:
+            cell.font = Font(bold=True, color="FFFFFF")
+        elif reset:
+            cell.font = Font()
+    elif reset:
+        cell.fill = PatternFill()
+        cell.font = Font()
+
+
+def new_case_stats() -> dict:
+    """空的用例统计（需求-用例映射、优先级 / 回归类型分布、孤儿用例数）"""
+    return {
+        "total_cases": 0,
+        "orphan_cases": 0,
+        "priority_counts": {'P0': 0, 'P1': 0, 'P2': 0, 'P3': 0},
+        "regression_counts": {'冒烟': 0, '核心': 0, '全量': 0},
+        "req_case_map": {},
+    }
+
+
+def add_case_stats(stats: dict, case: dict):
+    """把一条用例计入统计，各字段只解析一次"""
+    stats["total_cases"] += 1
+
+    priority = str(case.get('优先级') or case.get('priority') or '').upper()
+    if priority in stats["priority_counts"]:
+        stats["priority_counts"][priority] += 1
+
+    regression = case.get('回归类型') or case.get('regression') or ''
+    if regression in stats["regression_counts"]:
+        stats["regression_counts"][regression] += 1
+
+    req_id = case.get('关联需求ID') or case.get('req_id') or ''
+    if not req_id:
+        stats["orphan_cases"] += 1
+        return
+    case_id = case.get('用例编号') or case.get('id') or ''
+    req_case_map = stats["req_case_map"]
+    for rid in str(req_id).split(','):
+        rid = rid.strip()
+        if rid:
+            case_ids = req_case_map.setdefault(rid, [])
+            if case_id:
+                case_ids.append(case_id)
+
+
+def finish_case_stats(stats: dict, requirements: list = None) -> dict:
+    """合并需求列表（未关联用例的需求计为未覆盖）并计算覆盖率"""
+    req_case_map = stats["req_case_map"]
+    for req in requirements or []:
+        req_id = req.get('id') or req.get('需求ID') or ''
+        if req_id and req_id not in req_case_map:
+            req_case_map[req_id] = []
+
+    total_reqs = len(req_case_map)
+    covered = sum(1 for case_ids in req_case_map.values() if case_ids)
+    stats.update({
+        "total_requirements": total_reqs,
+        "covered_requirements": covered,
+        "uncovered_requirements": sorted(r for r, case_ids in req_case_map.items() if not case_ids),
+        # 百分数（0-100），与生成历史中的 coverage_rate 单位相同
+        "coverage_rate": round(covered / total_reqs * 100, 1) if total_reqs else 0.0,
+        "coverage_depth": round(stats["total_cases"] / total_reqs, 2) if total_reqs else 0,
+    })
+    return stats
+
+
+def analyze_cases(cases, requirements: list = None) -> dict:
+    """单次遍历用例，计算需求-用例映射、优先级 / 回归类型分布、孤儿用例数和覆盖率"""
+    stats = new_case_stats()
+    for case in cases:
+        add_case_stats(stats, case)
+    return finish_case_stats(stats, requirements)
+
+
+def create_traceability_sheet(wb, stats: dict):
+    """创建需求追溯矩阵 Sheet（stats 来自 analyze_cases / finish_case_stats）"""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
     ws = wb.create_sheet(title="需求追溯矩阵")
 
-    # 构建需求-用例映射
-    req_case_map = {}
-    for case in data:
-        req_id = case.get('关联需求ID') or case.get('req_id') or ''
-        if req_id:
-            req_ids = [r.strip() for r in str(req_id).split(',')]
-            for rid in req_ids:
-                if rid:
-                    if rid not in req_case_map:
-                        req_case_map[rid] = []
-                    case_id = case.get('用例编号') or case.get('id') or ''
-                    if case_id:
-                        req_case_map[rid].append(case_id)
-
-    # 如果提供了需求列表，合并
-    if requirements:
-        for req in requirements:
-            req_id = req.get('id') or req.get('需求ID') or ''
-            if req_id and req_id not in req_case_map:
-                req_case_map[req_id] = []
+    req_case_map = stats["req_case_map"]
 
     # 写入表头
     headers = ['需求ID', '需求名称', '所属模块', '关联用例', '用例数量', '覆盖状态']
@@ -257,14 +855,10 @@ def create_traceability_sheet(wb, data: list, requirements: list = None):
 
     # 写入数据
     row_idx = 2
-    covered_count = 0
-    total_count = len(req_case_map)
 
     for req_id, case_ids in sorted(req_case_map.items()):
         case_count = len(case_ids)
         covered = case_count > 0
-        if covered:
-            covered_count += 1
 
         ws.cell(row=row_idx, column=1, value=req_id).border = border
         ws.cell(row=row_idx, column=2, value='').border = border  # 需求名称需从 requirements 获取
@@ -286,46 +880,25 @@ def create_traceability_sheet(wb, data: list, requirements: list = None):
         ws.column_dimensions[chr(65 + i)].width = width
 
     ws.freeze_panes = 'A2'
-    return covered_count, total_count
-
-
-def create_coverage_stats_sheet(wb, data: list, covered_count: int, total_req_count: int):
-    """创建覆盖率统计 Sheet"""
-    ws = wb.create_sheet(title="覆盖率统计")
-
-    # 计算统计数据
-    total_cases = len(data)
-    priority_counts = {'P0': 0, 'P1': 0, 'P2': 0, 'P3': 0}
-    regression_counts = {'冒烟': 0, '核心': 0, '全量': 0}
-    orphan_count = 0
 
-    for case in data:
-        priority = str(case.get('优先级') or case.get('priority') or '').upper()
-        if priority in priority_counts:
-            priority_counts[priority] += 1
 
-        regression = case.get('回归类型') or case.get('regression') or ''
-        if regression in regression_counts:
-            regression_counts[regression] += 1
+def compute_coverage_stats(stats: dict) -> list:
+    """由用例统计生成覆盖率统计项，返回 (统计项, 数值) 列表"""
+    total_req_count = stats["total_requirements"]
+    covered_count = stats["covered_requirements"]
+    priority_counts = stats["priority_counts"]
+    regression_counts = stats["regression_counts"]
 
-        req_id = case.get('关联需求ID') or case.get('req_id') or ''
-        if not req_id:
-            orphan_count += 1
-
-    coverage_rate = (covered_count / total_req_count * 100) if total_req_count > 0 else 0
-    coverage_depth = (total_cases / total_req_count) if total_req_count > 0 else 0
-
-    # 写入统计数据
-    stats = [
+    return [
         ('统计项', '数值'),
         ('总需求数', total_req_count),
         ('已覆盖需求数', covered_count),
         ('未覆盖需求数', total_req_count - covered_count),
-        ('需求覆盖率', f'{coverage_rate:.1f}%'),
+        ('需求覆盖率', f'{stats["coverage_rate"]:.1f}%'),
         ('', ''),
-        ('总用例数', total_cases),
-        ('覆盖深度', f'{coverage_depth:.2f} 用例/需求'),
-        ('孤儿用例数', orphan_count),
+        ('总用例数', stats["total_cases"]),
+        ('覆盖深度', f'{stats["coverage_depth"]:.2f} 用例/需求'),
+        ('孤儿用例数', stats["orphan_cases"]),
         ('', ''),
         ('P0 用例数', priority_counts['P0']),
         ('P1 用例数', priority_counts['P1']),
@@ -337,6 +910,15 @@ def create_coverage_stats_sheet(wb, data: list, covered_count: int, total_req_co
         ('全量回归用例', regression_counts['全量']),
     ]
 
+
+def create_coverage_stats_sheet(wb, stats: dict):
+    """创建覆盖率统计 Sheet"""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    ws = wb.create_sheet(title="覆盖率统计")
+
+    rows = compute_coverage_stats(stats)
+
     header_font = Font(bold=True, color="FFFFFF", size=11)
     header_fill = PatternFill(start_color="1565C0", end_color="1565C0", fill_type="solid")
     border = Border(
@@ -344,7 +926,7 @@ def create_coverage_stats_sheet(wb, data: list, covered_count: int, total_req_co
         top=Side(style='thin'), bottom=Side(style='thin')
     )
 
-    for row_idx, (label, value) in enumerate(stats, 1):
+    for row_idx, (label, value) in enumerate(rows, 1):
         label_cell = ws.cell(row=row_idx, column=1, value=label)
         value_cell = ws.cell(row=row_idx, column=2, value=value)
 
@@ -364,111 +946,639 @@ def create_coverage_stats_sheet(wb, data: list, covered_count: int, total_req_co
     ws.column_dimensions['B'].width = 20
 
 
+def register_named_styles(wb):
+    """注册共享的命名样式，所有单元格按名称引用，避免逐单元格创建样式对象"""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+    from openpyxl.styles.fonts import DEFAULT_FONT
+
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    white_bold = Font(bold=True, color="FFFFFF", size=11)
+    center = Alignment(horizontal='center', vertical='center')
+
+    def solid(color):
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+    top_wrap = Alignment(vertical='top', wrap_text=True)
+    left = Alignment(horizontal='left', vertical='center')
+
+    styles = [
+        NamedStyle(name='tc_header', font=white_bold, fill=solid("4472C4"),
+                   alignment=center, border=border),
+        NamedStyle(name='tc_cell', font=DEFAULT_FONT, alignment=top_wrap, border=border),
+        NamedStyle(name='tc_trace_header', font=white_bold, fill=solid("2E7D32"),
+                   alignment=center, border=border),
+        NamedStyle(name='tc_bordered', font=DEFAULT_FONT, border=border),
+        NamedStyle(name='tc_uncovered', font=DEFAULT_FONT, fill=solid("FFCDD2"), border=border),
+        NamedStyle(name='tc_stats_header_label', font=white_bold, fill=solid("1565C0"),
+                   alignment=left, border=border),
+        NamedStyle(name='tc_stats_header_value', font=white_bold, fill=solid("1565C0"),
+                   alignment=center, border=border),
+        NamedStyle(name='tc_stats_label', font=DEFAULT_FONT, alignment=left, border=border),
+        NamedStyle(name='tc_stats_value', font=DEFAULT_FONT, alignment=center, border=border),
+    ]
+    for priority, color in PRIORITY_COLORS.items():
+        font = Font(bold=True, color="FFFFFF") if priority in ['P0', 'P1'] else DEFAULT_FONT
+        styles.append(NamedStyle(name=f'tc_priority_{priority}', font=font, fill=solid(color),
+                                 alignment=top_wrap, border=border))
+
+    for style in styles:
+        if style.name not in wb.named_styles:
+            wb.add_named_style(style)
+
+
+def _styled(ws, value, style: str):
+    """创建引用命名样式的 write-only 单元格"""
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def create_excel_streaming(output: str, cases, columns: list, widths: list,
+                           traceability: bool = False, requirements: list = None) -> int:
+    """流式生成测试用例 Excel（write-only 模式，逐行写出，内存占用与用例数量无关）
+
+    返回写入的用例数量。
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    register_named_styles(wb)
+    ws = wb.create_sheet(title="测试用例")
+
+    # write-only 模式下列宽与冻结窗格必须在写入行之前设置
+    for i, width in enumerate(widths[:len(columns)], 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = 'A2'
+
+    ws.append([_styled(ws, name, 'tc_header') for name in columns])
+
+    stats = new_case_stats() if traceability else None
+    case_count = _append_case_rows(ws, cases, columns, stats)
+
+    if stats is not None:
+        with stage("traceability"):
+            finish_case_stats(stats, requirements)
+            write_traceability_sheet_streaming(wb, stats)
+        with stage("coverage_stats"):
+            write_coverage_stats_sheet_streaming(wb, stats)
+
+    with stage("save"):
+        wb.save(output)
+    return case_count
+
+
+def _append_case_rows(ws, cases, columns: list, stats: dict = None) -> int:
+    """在表头之后逐行写出用例并添加数据验证，返回写入的用例数量
+
+    stats 不为 None 时在同一次遍历中累计用例统计。
+    """
+    from openpyxl.cell import WriteOnlyCell
+
+    col_index = build_col_index(columns)
+    priority_col = col_index.get('优先级')
+    start_row = 2
+    case_count = 0
+
+    # 优先级颜色随单元格样式一起写出；流式读取输入时包含解析记录的时间
+    with stage("write_rows"):
+        for case in cases:
+            row = [None] * len(columns)
+            for key, value in case.items():
+                col_num = col_index.get(key)
+                if col_num:
+                    style = 'tc_cell'
+                    if col_num == priority_col:
+                        priority = str(value).upper() if value else ''
+                        if priority in PRIORITY_COLORS:
+                            style = f'tc_priority_{priority}'
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.style = style
+                    row[col_num - 1] = cell
+            ws.append(row)
+            case_count += 1
+            if stats is not None:
+                add_case_stats(stats, case)
+
+    end_row = start_row + case_count - 1 if case_count else start_row
+    with stage("data_validation"):
+        add_data_validation(ws, start_row, end_row, col_index)
+    return case_count
+
+
+def create_excel_from_template(output: str, cases, template: str, columns: list,
+                               traceability: bool = False, requirements: list = None) -> int:
+    """基于模板流式生成：复制模板表头和各 Sheet 的值、样式、格式与页面设置，其后逐行写出用例
+
+    不载入、也不逐行清空模板中的示例行，耗时与新用例数量成正比，与模板大小无关。
+    模板含有图片、图表、表格、超链接、透视表等无法流式复制的内容时，改为整体载入模板。
+    返回写入的用例数量。
+    """
+    from copy import copy, deepcopy
+
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.dimensions import RowDimension
+
+    skeleton = _template_skeleton(template)
+    if skeleton["unsupported"]:
+        return create_excel_from_loaded_template(output, cases, template, columns,
+                                                 traceability, requirements)
+
+    wb = Workbook(write_only=True)
+    register_named_styles(wb)
+    for attr, value in skeleton["workbook"].items():
+        setattr(wb, attr, deepcopy(value))
+    for defn in skeleton["names"]:
+        wb.defined_names.add(copy(defn))
+    case_count = 0
+    stats = new_case_stats() if traceability else None
+    col_index = build_col_index(columns)
+
+    for sheet_idx, sheet in enumerate(skeleton["sheets"]):
+        ws = wb.create_sheet(title=sheet["title"])
+        ws.sheet_state = sheet["state"]
+        # 缓存的骨架被多次复用，冻结窗格等修改只作用于副本
+        for attr, value in sheet["settings"].items():
+            setattr(ws, attr, deepcopy(value))
+        for defn in sheet["names"]:
+            ws.defined_names.add(copy(defn))
+        for col, width in sheet["widths"].items():
+            ws.column_dimensions[get_column_letter(col)].width = width
+        # write-only 模式下行属性必须在写入对应行之前设置
+        for row_idx, attrs in sheet["row_dimensions"].items():
+            ws.row_dimensions[row_idx] = RowDimension(ws, index=row_idx, **attrs)
+        for ref in sheet["merged"]:
+            ws.merged_cells.add(ref)
+        for cf in sheet["formatting"]:
+            for rule in cf.rules:
+                ws.conditional_formatting.add(str(cf.sqref), copy(rule))
+        validations = sheet["validations"]
+        if sheet["active"]:
+            # 本脚本会为部分列添加下拉验证，模板中覆盖它们的验证不再复制，避免区域重叠
+            validations = _template_validations(validations, col_index)
+        for dv in validations:
+            ws.data_validations.append(dv)
+        if sheet["active"]:
+            ws.freeze_panes = 'A2'
+            wb.active = sheet_idx
+        for row in sheet["rows"]:
+            ws.append([_copied_cell(ws, *cell) for cell in row])
+        if sheet["active"]:
+            case_count = _append_case_rows(ws, cases, columns, stats)
+            extend_auto_filter(ws, case_count + 1)
+
+    if stats is not None:
+        with stage("traceability"):
+            finish_case_stats(stats, requirements)
+            write_traceability_sheet_streaming(wb, stats)
+        with stage("coverage_stats"):
+            write_coverage_stats_sheet_streaming(wb, stats)
+
+    with stage("save"):
+        wb.save(output)
+    return case_count
+
+
+def create_excel_from_loaded_template(output: str, cases, template: str, columns: list,
+                                      traceability: bool = False, requirements: list = None) -> int:
+    """整体载入模板，删除示例行后写入用例，返回写入的用例数量
+
+    用于含有图片、图表、表格、超链接、透视表等流式复制无法重建内容的模板。
+    """
+    from openpyxl import load_workbook
+
+    with stage("load_template"):
+        wb = load_workbook(template)
+    ws = wb.active
+    if ws.max_row > 1:
+        ws.delete_rows(2, ws.max_row - 1)
+    # 示例行所在的合并区域和行属性随示例行删除
+    for cr in list(ws.merged_cells.ranges):
+        if cr.max_row > 1:
+            ws.merged_cells.remove(cr)
+    for row_idx in [idx for idx in ws.row_dimensions if idx > 1]:
+        del ws.row_dimensions[row_idx]
+    ws.data_validations.dataValidation = _template_validations(
+        ws.data_validations.dataValidation, build_col_index(columns))
+    return write_case_sheet(wb, ws, cases, columns, output, traceability, requirements)
+
+
+def write_traceability_sheet_streaming(wb, stats: dict):
+    """以 write-only 方式写出需求追溯矩阵 Sheet"""
+    from openpyxl.utils import get_column_letter
+
+    ws = wb.create_sheet(title="需求追溯矩阵")
+    for i, width in enumerate([14, 25, 15, 40, 10, 12], 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = 'A2'
+
+    headers = ['需求ID', '需求名称', '所属模块', '关联用例', '用例数量', '覆盖状态']
+    ws.append([_styled(ws, name, 'tc_trace_header') for name in headers])
+
+    for req_id, case_ids in sorted(stats["req_case_map"].items()):
+        covered = len(case_ids) > 0
+        ws.append([
+            _styled(ws, req_id, 'tc_bordered'),
+            _styled(ws, '', 'tc_bordered'),
+            _styled(ws, '', 'tc_bordered'),
+            _styled(ws, ', '.join(case_ids), 'tc_bordered'),
+            _styled(ws, len(case_ids), 'tc_bordered'),
+            _styled(ws, '✅ 已覆盖' if covered else '❌ 未覆盖',
+                    'tc_bordered' if covered else 'tc_uncovered'),
+        ])
+
+
+def write_coverage_stats_sheet_streaming(wb, stats: dict):
+    """以 write-only 方式写出覆盖率统计 Sheet"""
+    ws = wb.create_sheet(title="覆盖率统计")
+    ws.column_dimensions['A'].width = 18
+    ws.column_dimensions['B'].width = 20
+
+    for row_idx, (label, value) in enumerate(compute_coverage_stats(stats), 1):
+        if row_idx == 1:
+            ws.append([_styled(ws, label, 'tc_stats_header_label'),
+                       _styled(ws, value, 'tc_stats_header_value')])
+        else:
+            ws.append([_styled(ws, label, 'tc_stats_label'), _styled(ws, value, 'tc_stats_value')])
+
+
+def _blank_to_none(value):
+    return None if value == '' else value
+
+
+def _existing_requirements(wb) -> list:
+    """读取已有追溯矩阵中的需求 ID（保留没有关联用例的需求）"""
+    if TRACE_SHEETS[0] not in wb.sheetnames:
+        return []
+    ws = wb[TRACE_SHEETS[0]]
+    return [{"id": str(req_id)} for (req_id,) in
+            ws.iter_rows(min_row=2, max_col=1, values_only=True) if req_id]
+
+
+def update_excel(existing: str, data, output: str = None, requirements: list = None,
+                 traceability: bool = None) -> dict:
+    """增量更新已有的用例工作簿，返回新增 / 修改 / 未变 / 移除 / 恢复的用例数量
+
+    按用例编号匹配行，只改写值有变化的单元格，新用例追加在最后一个非空行之后；缺少用例
+    编号的用例无法匹配，计入 skipped 不写入。不在 data 中的用例划线并在备注前加 [已移除]。
+    执行列（实际结果、是否通过）保留原值。追溯矩阵和覆盖率统计按更新后的用例重算；
+    traceability 为 None 时仅在工作簿已有这两个 Sheet 时重算。
+    """
+    from copy import copy
+
+    from openpyxl import load_workbook
+
+    with stage("load_workbook"):
+        wb = load_workbook(existing)
+    ws = wb.active
+    columns = ['' if c.value is None else str(c.value).strip() for c in ws[1]]
+    col_index = build_col_index(columns)
+    id_col = col_index.get('用例编号')
+    if not id_col:
+        raise ValueError("工作簿缺少“用例编号”列，无法按用例匹配")
+    priority_col = col_index.get('优先级')
+    note_col = col_index.get('备注')
+    protected = {col_index[c] for c in EXECUTION_COLUMNS if c in col_index}
+    styles = shared_styles()
+
+    # 新用例追加在最后一个非空行之后，避免覆盖用例下方的说明、合计等行
+    rows = {}
+    last_row = 1
+    for row_idx, values in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
+        if any(value not in (None, '') for value in values):
+            last_row = row_idx
+        case_id = values[id_col - 1] if len(values) >= id_col else None
+        if case_id not in (None, '') and str(case_id) not in rows:
+            rows[str(case_id)] = row_idx
+
+    summary = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "restored": 0, "skipped": 0}
+    seen = set()
+    with stage("merge_rows"):
+        for case in data:
+            values = case_values(case, col_index, len(columns))
+            if values[id_col - 1] in (None, ''):
+                summary["skipped"] += 1
+                continue
+            key = str(values[id_col - 1])
+            seen.add(key)
+            row_idx = rows.get(key)
+            is_new = row_idx is None
+            if is_new:
+                last_row += 1
+                row_idx = rows[key] = last_row
+
+            changed = False
+            for col_num, value in enumerate(values, 1):
+                if col_num in protected and not is_new:
+                    continue
+                cell = ws.cell(row=row_idx, column=col_num)
+                if _blank_to_none(cell.value) == _blank_to_none(value):
+                    continue
+                cell.value = value
+                cell.alignment = styles["cell_alignment"]
+                cell.border = styles["border"]
+                if col_num == priority_col:
+                    color_priority_cell(cell, reset=True)
+                changed = True
+
+            id_cell = ws.cell(row=row_idx, column=id_col)
+            if not is_new and id_cell.font.strike:
+                # 移除时只加了删除线和灰色，其余字体属性保留；颜色取同行其他单元格的颜色
+                sibling = ws.cell(row=row_idx, column=1 if id_col != 1 else 2)
+                font = copy(id_cell.font)
+                font.strike = False
+                font.color = copy(sibling.font.color)
+                id_cell.font = font
+                summary["restored"] += 1
+            if is_new:
+                summary["added"] += 1
+            else:
+                summary["changed" if changed else "unchanged"] += 1
+
+        for key, row_idx in rows.items():
+            if key in seen:
+                continue
+            id_cell = ws.cell(row=row_idx, column=id_col)
+            if id_cell.font.strike:
+                continue
+            font = copy(id_cell.font)
+            font.strike = True
+            font.color = "999999"
+            id_cell.font = font
+            if note_col:
+                note_cell = ws.cell(row=row_idx, column=note_col)
+                note_cell.value = f"{REMOVED_MARK} {note_cell.value or ''}".strip()
+            summary["removed"] += 1
+
+    # 重建本脚本添加的下拉验证以覆盖新增行，模板自带的验证保留
+    own_formulas = {formula for _, formula, _ in DATA_VALIDATIONS}
+    ws.data_validations.dataValidation = [
+        dv for dv in ws.data_validations.dataValidation if dv.formula1 not in own_formulas]
+    with stage("data_validation"):
+        add_data_validation(ws, 2, last_row, col_index)
+
+    if traceability is None:
+        traceability = any(name in wb.sheetnames for name in TRACE_SHEETS)
+    if traceability:
+        if requirements is None:
+            requirements = _existing_requirements(wb)
+        standard = [FIELD_MAP.get(name.lower(), name) for name in columns]
+        with stage("traceability"):
+            stats = new_case_stats()
+            for values in ws.iter_rows(min_row=2, max_row=last_row, values_only=True):
+                case_id = values[id_col - 1]
+                if case_id not in (None, '') and str(case_id) in seen:
+                    add_case_stats(stats, dict(zip(standard, values)))
+            finish_case_stats(stats, requirements)
+            for name in TRACE_SHEETS:
+                if name in wb.sheetnames:
+                    del wb[name]
+            create_traceability_sheet(wb, stats)
+        with stage("coverage_stats"):
+            create_coverage_stats_sheet(wb, stats)
+
+    with stage("save"):
+        wb.save(output or existing)
+    return summary
+
+
+def write_csv(output: str, cases, columns: list) -> int:
+    """逐行写出 CSV（UTF-8 BOM，Excel 可直接打开），返回写入的用例数量"""
+    import csv
+
+    col_index = build_col_index(columns)
+    case_count = 0
+    with open(output, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for case in cases:
+            writer.writerow(case_values(case, col_index, len(columns)))
+            case_count += 1
+    return case_count
+
+
+def write_jsonl(output: str, cases, columns: list) -> int:
+    """逐行写出 JSON Lines，每行一条以列名为键的用例，返回写入的用例数量"""
+    col_index = build_col_index(columns)
+    case_count = 0
+    with open(output, 'w', encoding='utf-8') as f:
+        for case in cases:
+            values = case_values(case, col_index, len(columns))
+            f.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+            f.write('\n')
+            case_count += 1
+    return case_count
+
+
+def _markdown_cell(value) -> str:
+    if value is None:
+        return ''
+    return str(value).replace('|', '\\|').replace('\r\n', '<br>').replace('\n', '<br>')
+
+
+def write_markdown(output: str, cases, columns: list) -> int:
+    """逐行写出 Markdown 表格（供测试计划等文档引用），返回写入的用例数量"""
+    col_index = build_col_index(columns)
+    case_count = 0
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write('| ' + ' | '.join(_markdown_cell(c) for c in columns) + ' |\n')
+        f.write('|' + '---|' * len(columns) + '\n')
+        for case in cases:
+            values = case_values(case, col_index, len(columns))
+            f.write('| ' + ' | '.join(_markdown_cell(v) for v in values) + ' |\n')
+            case_count += 1
+    return case_count
+
+
+# 非 xlsx 输出格式：格式名 -> 写出函数（签名均为 (output, cases, columns) -> 用例数量）
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "markdown": write_markdown,
+}
+OUTPUT_FORMATS = ["xlsx"] + list(WRITERS)
+_FORMAT_SUFFIXES = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".md": "markdown"}
+
+
+def detect_output_format(output: str) -> str:
+    """根据输出文件扩展名推断格式，无法识别时为 xlsx"""
+    return _FORMAT_SUFFIXES.get(Path(output).suffix.lower(), "xlsx")
+
+
+def _load_json_value(value, base_dir: Path):
+    """清单字段可直接内嵌 JSON，也可以是相对清单目录的 JSON 文件路径"""
+    if value is None or isinstance(value, (list, dict)):
+        return value
+    with open(base_dir / value, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def run_batch_entry(entry: dict, base_dir: str) -> dict:
+    """执行清单中的一项生成任务，错误按条目隔离"""
+    base = Path(base_dir)
+    output = None
+    try:
+        if not isinstance(entry, dict):
+            raise ValueError("清单项需为 JSON 对象")
+        if not entry.get("output"):
+            raise ValueError("缺少 output 字段")
+        output = str(base / entry["output"])
+        if "data_file" in entry:
+            cases = read_json_records(str(base / entry["data_file"]))
+        else:
+            cases = entry.get("data", [])
+        template = str(base / entry["template"]) if entry.get("template") else None
+        count = create_excel(
+            output, cases, template,
+            schema=_load_json_value(entry.get("schema"), base),
+            traceability=entry.get("traceability", False),
+            requirements=_load_json_value(entry.get("requirements"), base),
+            streaming=entry.get("streaming", False),
+            output_format=entry.get("format"),
+        )
+        return {"output": output, "case_count": count, "error": None}
+    except Exception as e:
+        return {"output": output, "case_count": 0, "error": str(e)}
+
+
+def run_batch(manifest_path: str, jobs: int = 1) -> list:
+    """按清单批量生成多个工作簿
+
+    清单为 JSON 列表，每项包含 output、data_file（或内嵌 data）、template、
+    schema、requirements、traceability、streaming、format，路径相对清单所在目录。
+    jobs > 1 时使用进程池并行生成。
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    base_dir = str(Path(manifest_path).resolve().parent)
+
+    if jobs > 1 and len(entries) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(run_batch_entry, entries, [base_dir] * len(entries)))
+    return [run_batch_entry(entry, base_dir) for entry in entries]
+
+
 def main():
-    parser = argparse.ArgumentParser(description='生成测试用例 Excel')
-    parser.add_argument('-o', '--output', required=True, help='输出文件路径')
-    parser.add_argument('-d', '--data', required=True, help='JSON 格式测试用例数据')
+    parser = argparse.ArgumentParser(description='生成测试用例 Excel（或 CSV / JSONL / Markdown）')
+    parser.add_argument('-o', '--output', help='输出文件路径')
+    parser.add_argument('-d', '--data',
+                        help='测试用例数据：JSON 字符串、JSON/JSONL 文件路径或 -（标准输入）')
+    parser.add_argument('--data-file', help='测试用例数据文件（JSON 数组或 JSON Lines，- 表示标准输入）')
     parser.add_argument('-t', '--template', help='模板文件路径')
-    parser.add_argument('-s', '--schema', help='从 .memory 读取的 schema JSON')
+    parser.add_argument('-s', '--schema', help='从 .memory 读取的 schema：JSON 字符串、文件路径或 -')
     parser.add_argument('--learn', help='学习模板结构并输出 schema')
+    parser.add_argument('--relearn', action='store_true',
+                        help='忽略缓存重新学习模板（与 --learn 一起使用）')
+    parser.add_argument('--project', default='.',
+                        help='项目路径（模板 schema 缓存于其 .memory/template-schemas.json）')
     parser.add_argument('--traceability', action='store_true',
                         help='生成需求追溯矩阵和覆盖率统计 Sheet')
-    parser.add_argument('-r', '--requirements', help='需求列表 JSON（用于追溯矩阵）')
+    parser.add_argument('-r', '--requirements',
+                        help='需求列表（用于追溯矩阵）：JSON 字符串、JSON/JSONL 文件路径或 -')
+    parser.add_argument('--update', metavar='XLSX',
+                        help='增量更新已有的用例工作簿（按用例编号匹配，-o 不指定时覆盖原文件）')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS,
+                        help='输出格式，不指定则按输出文件扩展名推断（默认 xlsx）')
+    parser.add_argument('--stats-only', action='store_true',
+                        help='只计算需求覆盖率与用例分布并输出 JSON，不生成工作簿')
+    parser.add_argument('--streaming', action='store_true',
+                        help='流式写出（write-only 模式），适用于大规模用例集')
+    parser.add_argument('--batch', help='批量生成清单 JSON 文件路径')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='批量模式下的并行进程数（0 表示使用全部 CPU）')
+    timings.add_arguments(parser)
     args = parser.parse_args()
+    timings.begin("generate_excel", args.timings, args.profile)
+
+    data_source = args.data_file or args.data
+    if args.stats_only and not data_source:
+        parser.error('--stats-only 需要指定 -d/--data-file')
+    if args.update and not data_source:
+        parser.error('--update 需要指定 -d/--data-file')
+    if not (args.learn or args.batch or args.stats_only or args.update) \
+            and not (args.output and data_source):
+        parser.error('需要指定 -o 和 -d/--data-file（或使用 --learn / --batch / --stats-only / --update）')
+    if [data_source, args.schema, args.requirements].count('-') > 1:
+        parser.error('标准输入（-）只能用于一个参数')
 
     try:
         if args.learn:
             # 学习模式
-            schema = learn_template(args.learn)
+            schema = cached_learn_template(args.learn, args.project, args.relearn)
             print(json.dumps(schema, ensure_ascii=False, indent=2))
             return
 
-        cases = json.loads(args.data)
-        schema = json.loads(args.schema) if args.schema else None
-        requirements = json.loads(args.requirements) if args.requirements else None
-
-        # 创建 Excel（不保存，先添加其他 Sheet）
-        if args.template and Path(args.template).exists():
-            wb = load_workbook(args.template)
-            ws = wb.active
-            columns = [cell.value for cell in ws[1] if cell.value]
-            start_row = 2
+        if args.batch:
+            jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+            results = run_batch(args.batch, jobs)
+            failed = [r for r in results if r["error"]]
+            for r in results:
+                if r["error"]:
+                    print(f"生成失败: {r['output']}: {r['error']}", file=sys.stderr)
+                else:
+                    print(f"已生成: {r['output']} ({r['case_count']} 条用例)")
+            print(f"批量生成完成: 成功 {len(results) - len(failed)}，失败 {len(failed)}")
+            if failed:
+                sys.exit(1)
+            return
 
-            for row in ws.iter_rows(min_row=start_row, max_row=ws.max_row):
-                for cell in row:
-                    cell.value = None
+        schema = load_json_arg(args.schema)
+        requirements = load_json_arg(args.requirements, records=True)
+        if args.data and not args.data_file and _is_inline_json(args.data):
+            cases = json.loads(args.data)
         else:
-            columns = schema.get("columns", DEFAULT_COLUMNS) if schema else DEFAULT_COLUMNS
-            widths = schema.get("widths", DEFAULT_WIDTHS) if schema else DEFAULT_WIDTHS
-            start_row = 2
-
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "测试用例"
-
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            border = Border(
-                left=Side(style='thin'), right=Side(style='thin'),
-                top=Side(style='thin'), bottom=Side(style='thin')
-            )
-
-            for col, name in enumerate(columns, 1):
-                cell = ws.cell(row=1, column=col, value=name)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
-
-            for i, width in enumerate(widths):
-                if i < len(columns):
-                    ws.column_dimensions[chr(65 + i)].width = width
-
-        # 建立列索引
-        col_index = {}
-        for i, col_name in enumerate(columns):
-            normalized = col_name.lower().strip()
-            standard_name = FIELD_MAP.get(normalized, col_name)
-            col_index[standard_name] = i + 1
-            col_index[col_name] = i + 1
-
-        # 写入数据
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-
-        for row_idx, case in enumerate(cases, start_row):
-            for key, value in case.items():
-                col_num = col_index.get(key)
-                if col_num:
-                    cell = ws.cell(row=row_idx, column=col_num, value=value)
-                    cell.alignment = Alignment(vertical='top', wrap_text=True)
-                    cell.border = border
-
-        end_row = start_row + len(cases) - 1 if cases else start_row
-
-        # 添加数据验证和优先级颜色
-        add_data_validation(ws, start_row, end_row, col_index)
-        apply_priority_colors(ws, start_row, end_row, col_index)
-
-        ws.freeze_panes = 'A2'
+            # 文件 / 标准输入按记录增量读取，流式模式下逐条写入
+            cases = read_json_records(data_source)
+
+        if args.update:
+            summary = update_excel(args.update, cases, args.output, requirements,
+                                   True if args.traceability else None)
+            print(f"已更新: {args.output or args.update}（新增 {summary['added']}，"
+                  f"修改 {summary['changed']}，未变 {summary['unchanged']}，"
+                  f"移除 {summary['removed']}，恢复 {summary['restored']}）")
+            if summary["skipped"]:
+                print(f"警告: 跳过 {summary['skipped']} 条缺少用例编号的用例（无法与已有行匹配）",
+                      file=sys.stderr)
+            return
 
-        # 生成追溯矩阵和覆盖率统计（如果启用）
-        if args.traceability:
-            covered_count, total_req_count = create_traceability_sheet(wb, cases, requirements)
-            create_coverage_stats_sheet(wb, cases, covered_count, total_req_count)
+        if args.stats_only:
+            with stage("analyze"):
+                stats = analyze_cases(cases, requirements)
+            text = json.dumps(stats, ensure_ascii=False, indent=2)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                print(f"已生成: {args.output}")
+            else:
+                print(text)
+            return
 
-        wb.save(args.output)
+        create_excel(args.output, cases, args.template, schema,
+                     args.traceability, requirements, args.streaming, args.project,
+                     args.format)
         print(f"已生成: {args.output}")
 
     except json.JSONDecodeError as e:
         print(f"JSON 解析错误: {e}", file=sys.stderr)
         sys.exit(1)
+    except ModuleNotFoundError as e:
+        if e.name != 'openpyxl':
+            raise
+        print("错误：请先安装 openpyxl: pip install openpyxl", file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"生成失败: {e}", file=sys.stderr)
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
+    # 常驻工作进程运行时转发给它执行，否则在本进程内执行
+    from worker import run_via_worker
+    if not run_via_worker("generate_excel"):
+        main()
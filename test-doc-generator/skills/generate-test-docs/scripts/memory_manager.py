@@ -6,10 +6,15 @@
 
 import argparse
 import json
+import os
 import sys
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+import timings
+from timings import stage
+
 MEMORY_DIR = ".memory"
 FILES = {
     "project_context": "project-context.json",
@@ -21,6 +26,85 @@ FILES = {
     "ambiguity_decisions": "ambiguity-decisions.json"
 }
 
+# 只追加的记录型记忆：类型 -> 记录列表字段名
+RECORD_LISTS = {
+    "generation_history": "generations",
+    "ambiguity_decisions": "decisions"
+}
+# SQLite 后端：存在该文件时，记录型记忆改存数据库（其他记忆仍为 JSON 文件）
+DB_FILE = "memory.db"
+# 生成历史保留策略：最近 keep_runs 条且不早于 keep_days 天（0 表示不按天数）的记录保留原样，
+# 其余按模块、按月汇总进 rollups（可在 user-preferences.json 的 history_retention 中调整）
+RETENTION_DEFAULTS = {"keep_runs": 200, "keep_days": 365}
+# 原始记录超出 keep_runs 该数量后才自动压缩，避免每次追加都重写
+COMPACT_SLACK = 50
+# 跨进程锁文件：读-改-写期间持有，避免并发写入丢失记录
+LOCK_FILE = ".lock"
+# 本进程已持有的锁：锁文件路径 -> 嵌套深度
+_HELD_LOCKS = {}
+
+
+@contextmanager
+def memory_lock(project_path: str):
+    """持有 .memory 的跨进程排他锁（同一进程内可重入）"""
+    with file_lock(Path(project_path) / MEMORY_DIR / LOCK_FILE):
+        yield
+
+
+@contextmanager
+def file_lock(lock_path):
+    """持有 lock_path 文件的跨进程排他锁（同一进程内可重入）"""
+    key = str(Path(lock_path).resolve())
+    if _HELD_LOCKS.get(key):
+        _HELD_LOCKS[key] += 1
+        try:
+            yield
+        finally:
+            _HELD_LOCKS[key] -= 1
+        return
+
+    with open(lock_path, 'a+b') as lock_file:
+        with stage("lock_wait"):
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                # LK_LOCK 仅重试 10 次，长时间竞争时继续等待
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        _HELD_LOCKS[key] = 1
+        try:
+            yield
+        finally:
+            _HELD_LOCKS.pop(key, None)
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_json(file_path: Path, data):
+    """原子写入 JSON：先写临时文件再替换，读者不会看到写了一半的文件"""
+    tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+    try:
+        with stage("write"):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
 
 def init_memory(project_path: str, template_dir: str = "templates",
                 requirements_dir: str = "requirements"):
@@ -37,9 +121,6 @@ def init_memory(project_path: str, template_dir: str = "templates",
         "output_dir": "./test-docs"
     }
 
-    with open(memory_path / FILES["project_context"], 'w', encoding='utf-8') as f:
-        json.dump(context, f, ensure_ascii=False, indent=2)
-
     # 初始化其他文件
     defaults = {
         "template_schemas": {},
@@ -62,64 +143,355 @@ def init_memory(project_path: str, template_dir: str = "templates",
                 "p0_max": 15,
                 "warn_on_imbalance": True
             },
+            "history_retention": dict(RETENTION_DEFAULTS),
             "updated_at": None
         },
         "ambiguity_decisions": {"decisions": []}
     }
 
-    for key, default_value in defaults.items():
-        file_path = memory_path / FILES[key]
-        if not file_path.exists():
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_value, f, ensure_ascii=False, indent=2)
+    with memory_lock(project_path):
+        _write_json(memory_path / FILES["project_context"], context)
+        for key, default_value in defaults.items():
+            file_path = memory_path / FILES[key]
+            if uses_sqlite(project_path, key):
+                continue
+            if not file_path.exists():
+                _write_json(file_path, default_value)
 
     print(f"已初始化记忆: {memory_path}")
     return str(memory_path)
 
 
-def read_memory(project_path: str, memory_type: str) -> dict:
-    """读取记忆文件"""
-    file_path = Path(project_path) / MEMORY_DIR / FILES.get(memory_type, "")
-    if not file_path.exists():
-        return {}
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+def _db_path(project_path: str) -> Path:
+    return Path(project_path) / MEMORY_DIR / DB_FILE
 
 
-def update_memory(project_path: str, memory_type: str, data: dict, merge: bool = True):
-    """更新记忆文件"""
-    file_path = Path(project_path) / MEMORY_DIR / FILES.get(memory_type, "")
+def uses_sqlite(project_path: str, memory_type: str) -> bool:
+    """该记忆类型是否由 SQLite 后端存储"""
+    return memory_type in RECORD_LISTS and _db_path(project_path).exists()
 
-    if merge and file_path.exists():
-        with open(file_path, 'r', encoding='utf-8') as f:
-            existing = json.load(f)
 
-        # 深度合并
-        def deep_merge(base, updates):
-            for key, value in updates.items():
-                if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                    deep_merge(base[key], value)
-                else:
-                    base[key] = value
-            return base
-        data = deep_merge(existing, data)
+def _connect(project_path: str):
+    """打开（必要时创建）记忆数据库"""
+    import sqlite3
 
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    conn = sqlite3.connect(_db_path(project_path), timeout=30)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS documents (
+            memory_type TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            memory_type TEXT NOT NULL,
+            record_type TEXT,
+            date TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_type_date
+            ON records (memory_type, record_type, date);
+        CREATE INDEX IF NOT EXISTS idx_records_date
+            ON records (memory_type, date);
+    """)
+    return conn
 
-    print(f"已更新: {file_path}")
 
+def _insert_records(conn, memory_type: str, records: list):
+    conn.executemany(
+        "INSERT INTO records (memory_type, record_type, date, data) VALUES (?, ?, ?, ?)",
+        [(memory_type, r.get("type"), r.get("date"), json.dumps(r, ensure_ascii=False))
+         for r in records])
 
-def add_generation_record(project_path: str, record: dict):
-    """添加生成记录"""
-    history = read_memory(project_path, "generation_history")
-    if "generations" not in history:
-        history["generations"] = []
 
-    record["date"] = datetime.now().isoformat()
-    history["generations"].append(record)
+def _sqlite_read(project_path: str, memory_type: str) -> dict:
+    conn = _connect(project_path)
+    try:
+        row = conn.execute("SELECT data FROM documents WHERE memory_type = ?",
+                           (memory_type,)).fetchone()
+        rows = conn.execute("SELECT data FROM records WHERE memory_type = ? ORDER BY id",
+                            (memory_type,)).fetchall()
+    finally:
+        conn.close()
+    if row is None and not rows:
+        return {}
+    data = json.loads(row[0]) if row else {}
+    data[RECORD_LISTS[memory_type]] = [json.loads(r[0]) for r in rows]
+    return data
+
+
+def _sqlite_write(project_path: str, memory_type: str, data: dict):
+    doc = dict(data)
+    records = doc.pop(RECORD_LISTS[memory_type], None)
+    conn = _connect(project_path)
+    try:
+        with conn, stage("write"):
+            conn.execute("INSERT OR REPLACE INTO documents (memory_type, data) VALUES (?, ?)",
+                         (memory_type, json.dumps(doc, ensure_ascii=False)))
+            if records is not None:
+                conn.execute("DELETE FROM records WHERE memory_type = ?", (memory_type,))
+                _insert_records(conn, memory_type, records)
+    finally:
+        conn.close()
 
-    update_memory(project_path, "generation_history", history, merge=False)
+
+def read_memory(project_path: str, memory_type: str) -> dict:
+    """读取记忆文件"""
+    with stage("read"):
+        if uses_sqlite(project_path, memory_type):
+            return _sqlite_read(project_path, memory_type)
+
+        file_path = Path(project_path) / MEMORY_DIR / FILES.get(memory_type, "")
+        if not file_path.exists():
+            return {}
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def _deep_merge(base, updates):
+    """深度合并"""
+    for key, value in updates.items():
+        if key in base and isinstance(base[key], dict) and isinstance(value, dict):
+            _deep_merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def update_memory(project_path: str, memory_type: str, data: dict, merge: bool = True,
+                  quiet: bool = False):
+    """更新记忆文件（持锁读-改-写，原子替换）；quiet 时不输出提示，供其他脚本调用"""
+    with memory_lock(project_path):
+        if uses_sqlite(project_path, memory_type):
+            if merge:
+                data = _deep_merge(_sqlite_read(project_path, memory_type), data)
+            _sqlite_write(project_path, memory_type, data)
+            if not quiet:
+                print(f"已更新: {_db_path(project_path)} ({memory_type})")
+            return
+
+        file_path = Path(project_path) / MEMORY_DIR / FILES.get(memory_type, "")
+
+        if merge and file_path.exists():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            data = _deep_merge(existing, data)
+
+        _write_json(file_path, data)
+
+    if not quiet:
+        print(f"已更新: {file_path}")
+
+
+def append_record(project_path: str, memory_type: str, record: dict) -> int:
+    """向记录型记忆追加一条记录（SQLite 后端为 O(1) 插入），返回追加后的记录数"""
+    list_key = RECORD_LISTS[memory_type]
+    with memory_lock(project_path):
+        if uses_sqlite(project_path, memory_type):
+            conn = _connect(project_path)
+            try:
+                with conn:
+                    _insert_records(conn, memory_type, [record])
+                count = conn.execute("SELECT COUNT(*) FROM records WHERE memory_type = ?",
+                                     (memory_type,)).fetchone()[0]
+            finally:
+                conn.close()
+            print(f"已更新: {_db_path(project_path)} ({memory_type})")
+            return count
+
+        data = read_memory(project_path, memory_type)
+        if list_key not in data:
+            data[list_key] = []
+        data[list_key].append(record)
+        update_memory(project_path, memory_type, data, merge=False)
+        return len(data[list_key])
+
+
+def query_records(project_path: str, memory_type: str, record_type: str = None,
+                  since: str = None, until: str = None, limit: int = None) -> list:
+    """按类型 / 日期区间查询记录，SQLite 后端走索引；结果按时间从新到旧"""
+    if uses_sqlite(project_path, memory_type):
+        sql = "SELECT data FROM records WHERE memory_type = ?"
+        params = [memory_type]
+        if record_type:
+            sql += " AND record_type = ?"
+            params.append(record_type)
+        if since:
+            sql += " AND date >= ?"
+            params.append(since)
+        if until:
+            sql += " AND date <= ?"
+            params.append(until)
+        sql += " ORDER BY id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        conn = _connect(project_path)
+        try:
+            return [json.loads(r[0]) for r in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    records = read_memory(project_path, memory_type).get(RECORD_LISTS[memory_type], [])
+    return _filter_records(records, record_type, since, until, limit)
+
+
+def _filter_records(records: list, record_type: str = None, since: str = None,
+                    until: str = None, limit: int = None) -> list:
+    """按类型 / 日期区间过滤记录列表，结果按时间从新到旧"""
+    results = []
+    for record in reversed(records):
+        date = record.get("date") or ""
+        if record_type and record.get("type") != record_type:
+            continue
+        if (since and date < since) or (until and date > until):
+            continue
+        results.append(record)
+        if limit and len(results) >= limit:
+            break
+    return results
+
+
+def migrate_memory(project_path: str, backend: str):
+    """在 JSON 文件与 SQLite 后端之间迁移记录型记忆，原文件保留为 *.migrated"""
+    memory_path = Path(project_path) / MEMORY_DIR
+    db_path = _db_path(project_path)
+
+    with memory_lock(project_path):
+        if backend == "sqlite":
+            if db_path.exists():
+                print(f"已使用 SQLite 后端: {db_path}")
+                return
+            data = {t: read_memory(project_path, t) for t in RECORD_LISTS}
+            for memory_type, content in data.items():
+                _sqlite_write(project_path, memory_type,
+                              content or {RECORD_LISTS[memory_type]: []})
+            for memory_type in RECORD_LISTS:
+                file_path = memory_path / FILES[memory_type]
+                if file_path.exists():
+                    file_path.rename(file_path.with_name(file_path.name + ".migrated"))
+            print(f"已迁移到 SQLite: {db_path}")
+
+        elif backend == "json":
+            if not db_path.exists():
+                print("已使用 JSON 文件后端")
+                return
+            data = {t: _sqlite_read(project_path, t) for t in RECORD_LISTS}
+            db_path.rename(db_path.with_name(db_path.name + ".migrated"))
+            for memory_type, content in data.items():
+                if content:
+                    update_memory(project_path, memory_type, content, merge=False)
+            print(f"已迁移到 JSON 文件: {memory_path}")
+
+        else:
+            raise ValueError(f"无效的存储后端: {backend}，应为 'json' 或 'sqlite'")
+
+
+def get_retention(project_path: str) -> dict:
+    """生成历史的保留策略（user-preferences.json 的 history_retention，缺省项取默认值）"""
+    retention = dict(RETENTION_DEFAULTS)
+    retention.update(get_preferences(project_path).get("history_retention") or {})
+    return retention
+
+
+def _coverage_percent(value):
+    """覆盖率统一为 0-100 的百分数（与 generate_excel --stats-only 一致），兼容 "95%" 写法；无法识别时返回 None"""
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip('%'))
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _normalize_record(record: dict) -> dict:
+    """生成记录入库前把 coverage_rate 统一为百分数"""
+    rate = _coverage_percent(record.get("coverage_rate"))
+    if rate is not None:
+        record["coverage_rate"] = rate
+    return record
+
+
+def _rollup_record(rollups: dict, record: dict):
+    """把一条生成记录累加到 rollups[模块][年-月]（多模块记录计入每个涉及的模块）"""
+    period = (record.get("date") or "")[:7] or "unknown"
+    for module in record.get("modules") or ["未分类"]:
+        bucket = rollups.setdefault(module, {}).setdefault(period, {
+            "runs": 0, "case_count": 0, "types": {}, "priority_distribution": {}})
+        bucket["runs"] += 1
+        bucket["case_count"] += record.get("case_count") or 0
+        doc_type = record.get("type") or "unknown"
+        bucket["types"][doc_type] = bucket["types"].get(doc_type, 0) + 1
+        for priority, count in (record.get("priority_distribution") or {}).items():
+            distribution = bucket["priority_distribution"]
+            distribution[priority] = distribution.get(priority, 0) + count
+        rate = _coverage_percent(record.get("coverage_rate"))
+        if rate is not None:
+            samples = bucket.get("coverage_samples", 0)
+            bucket["coverage_rate"] = round(
+                (bucket.get("coverage_rate", 0) * samples + rate) / (samples + 1), 2)
+            bucket["coverage_samples"] = samples + 1
+        runs = [t for t in (record.get("timings") or {}).values() if isinstance(t, dict)]
+        if runs:
+            bucket["timed_runs"] = bucket.get("timed_runs", 0) + 1
+            bucket["wall_seconds"] = round(
+                bucket.get("wall_seconds", 0) + sum(t.get("wall_s") or 0 for t in runs), 3)
+            bucket["peak_rss_mb"] = max([bucket.get("peak_rss_mb", 0)]
+                                        + [t.get("peak_rss_mb") or 0 for t in runs])
+
+
+def compact_generation_history(project_path: str, keep_runs: int = None,
+                               keep_days: int = None, quiet: bool = False) -> dict:
+    """压缩生成历史：保留最近 keep_runs 条且不早于 keep_days 天的原始记录，其余汇总进 rollups"""
+    from datetime import timedelta
+
+    with memory_lock(project_path):
+        retention = get_retention(project_path)
+        keep_runs = retention["keep_runs"] if keep_runs is None else keep_runs
+        keep_days = retention["keep_days"] if keep_days is None else keep_days
+
+        data = read_memory(project_path, "generation_history")
+        records = data.get("generations", [])
+        kept = records[max(len(records) - keep_runs, 0):]
+        if keep_days:
+            cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+            kept = [r for r in kept if (r.get("date") or "") >= cutoff]
+        kept_ids = {id(r) for r in kept}
+        rolled = [r for r in records if id(r) not in kept_ids]
+        if not rolled:
+            return {"kept": len(records), "rolled_up": 0}
+
+        rollups = data.setdefault("rollups", {})
+        with stage("rollup"):
+            for record in rolled:
+                _rollup_record(rollups, record)
+        data["generations"] = kept
+        data["compacted_at"] = datetime.now().isoformat()
+        update_memory(project_path, "generation_history", data, merge=False, quiet=quiet)
+    return {"kept": len(kept), "rolled_up": len(rolled)}
+
+
+def attach_timings(record: dict, paths: list) -> dict:
+    """把脚本 --timings 写出的计时 JSON 精简后附加到生成记录的 timings（按脚本名索引）"""
+    for path in paths or []:
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        if not isinstance(report, dict) or "total" not in report:
+            raise ValueError(f"不是 --timings 输出的计时文件: {path}")
+        record.setdefault("timings", {})[report.get("script") or Path(path).stem] = \
+            timings.compact(report)
+    return record
+
+
+def add_generation_record(project_path: str, record: dict):
+    """添加生成记录，原始记录超出保留条数一定量后自动压缩"""
+    record["date"] = datetime.now().isoformat()
+    _normalize_record(record)
+    with memory_lock(project_path):
+        count = append_record(project_path, "generation_history", record)
+        if count > get_retention(project_path)["keep_runs"] + COMPACT_SLACK:
+            compact_generation_history(project_path)
 
 
 def clear_memory(project_path: str):
@@ -140,10 +512,11 @@ def get_preferences(project_path: str) -> dict:
 
 def set_preference(project_path: str, key: str, value):
     """设置单个偏好项"""
-    prefs = get_preferences(project_path)
-    prefs[key] = value
-    prefs["updated_at"] = datetime.now().isoformat()
-    update_memory(project_path, "user_preferences", prefs, merge=False)
+    with memory_lock(project_path):
+        prefs = get_preferences(project_path)
+        prefs[key] = value
+        prefs["updated_at"] = datetime.now().isoformat()
+        update_memory(project_path, "user_preferences", prefs, merge=False)
 
 
 def set_interaction_mode(project_path: str, mode: str):
@@ -167,28 +540,284 @@ def save_output_formats(project_path: str, formats: list):
 
 def add_ambiguity_decision(project_path: str, decision: dict):
     """添加歧义处理决策记录"""
-    data = read_memory(project_path, "ambiguity_decisions")
-    if "decisions" not in data:
-        data["decisions"] = []
-
     decision["date"] = datetime.now().isoformat()
-    data["decisions"].append(decision)
-
-    update_memory(project_path, "ambiguity_decisions", data, merge=False)
+    append_record(project_path, "ambiguity_decisions", decision)
     print(f"已记录歧义决策: {decision.get('context', 'unknown')}")
 
 
+# 歧义决策索引：项目路径 -> (存储签名, 索引)，存储文件变化后重建
+_AMBIGUITY_INDEX_CACHE = {}
+# 出现在超过该数量决策中的词项只参与精排，不用于召回候选
+AMBIGUITY_RARE_DF = 256
+AMBIGUITY_MIN_SCORE = 0.3
+
+
+def _tokenize(text: str) -> set:
+    """切分词项：英文 / 数字按词，中文按单字和相邻二字"""
+    import re
+
+    terms = set()
+    for token in re.findall(r'[a-z0-9_]+|[\u4e00-\u9fff]+', (text or "").lower()):
+        if token[0] < '\u4e00':
+            terms.add(token)
+            continue
+        terms.update(token)
+        terms.update(token[i:i + 2] for i in range(len(token) - 1))
+    return terms
+
+
+def build_ambiguity_index(decisions: list) -> dict:
+    """为歧义决策的 context 建立倒排索引（词项 -> 决策下标），附带 IDF 权重"""
+    import math
+
+    terms = [_tokenize(d.get("context", "")) for d in decisions]
+    postings = {}
+    for doc_id, doc_terms in enumerate(terms):
+        for term in doc_terms:
+            postings.setdefault(term, []).append(doc_id)
+    total = len(decisions)
+    idf = {term: math.log(1 + total / len(ids)) for term, ids in postings.items()}
+    return {
+        "decisions": decisions,
+        "terms": terms,
+        "weights": [sum(idf[t] for t in doc_terms) for doc_terms in terms],
+        "postings": postings,
+        "idf": idf,
+    }
+
+
+def search_ambiguity_index(index: dict, context: str, ambiguity_type: str = None,
+                           top_k: int = 5, min_score: float = 0.0) -> list:
+    """返回最相似的 top_k 条决策 [(score, decision)]，同分时新记录优先
+
+    相似度取加权 Dice 与查询覆盖率（决策包含的查询词权重占比）中的较大者，
+    较短的查询被较长的决策上下文完整包含时得分为 1。
+    """
+    import heapq
+    import math
+
+    postings, idf = index["postings"], index["idf"]
+    tokens = _tokenize(context)
+    query = {t for t in tokens if t in idf}
+    if not query:
+        return []
+    # 索引中没有的查询词按最罕见的词计权，不能因为被丢弃而抬高覆盖率
+    unseen_weight = math.log(1 + len(index["decisions"]))
+    query_weight = sum(idf.get(t, unseen_weight) for t in tokens)
+
+    # 召回：只用较少见的词项累加部分得分；全是常见词时退回最少见的一个
+    ordered = sorted(query, key=lambda t: len(postings[t]))
+    recall_terms = [t for t in ordered if len(postings[t]) <= AMBIGUITY_RARE_DF] or ordered[:1]
+    partial = {}
+    for term in recall_terms:
+        weight = idf[term]
+        for doc_id in postings[term][-AMBIGUITY_RARE_DF:]:
+            partial[doc_id] = partial.get(doc_id, 0.0) + weight
+
+    # 精排：部分得分靠前的候选按全部词项重新计分
+    decisions, terms, weights = index["decisions"], index["terms"], index["weights"]
+    if ambiguity_type:
+        candidates = [i for i in partial if decisions[i].get("type") == ambiguity_type]
+    else:
+        candidates = list(partial)
+    candidates = heapq.nlargest(max(top_k * 10, 50), candidates,
+                                key=lambda i: (partial[i], i))
+    scored = []
+    for doc_id in candidates:
+        shared = sum(idf[t] for t in query & terms[doc_id])
+        score = max(2 * shared / (query_weight + weights[doc_id]), shared / query_weight)
+        if score >= min_score:
+            scored.append((score, doc_id))
+    return [(round(score, 4), decisions[doc_id])
+            for score, doc_id in heapq.nlargest(top_k, scored)]
+
+
+def _ambiguity_signature(project_path: str):
+    """歧义决策存储的签名（文件路径、mtime、大小），用于判断索引是否过期"""
+    if uses_sqlite(project_path, "ambiguity_decisions"):
+        path = _db_path(project_path)
+    else:
+        path = Path(project_path) / MEMORY_DIR / FILES["ambiguity_decisions"]
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def load_ambiguity_index(project_path: str) -> dict:
+    """读取（或从缓存取出）项目的歧义决策索引"""
+    signature = _ambiguity_signature(project_path)
+    cache_key = str(Path(project_path).resolve())
+    cached = _AMBIGUITY_INDEX_CACHE.get(cache_key)
+    if cached and cached[0] == signature:
+        return cached[1]
+    decisions = read_memory(project_path, "ambiguity_decisions").get("decisions", [])
+    with stage("ambiguity_index"):
+        index = build_ambiguity_index(decisions)
+    _AMBIGUITY_INDEX_CACHE[cache_key] = (signature, index)
+    return index
+
+
+def find_similar_ambiguities(project_path: str, context: str, ambiguity_type: str = None,
+                             top_k: int = 5, min_score: float = AMBIGUITY_MIN_SCORE) -> list:
+    """查找最相似的 top_k 条历史歧义决策 [(score, decision)]"""
+    return search_ambiguity_index(load_ambiguity_index(project_path), context,
+                                  ambiguity_type, top_k, min_score)
+
+
 def find_similar_ambiguity(project_path: str, ambiguity_type: str, context: str) -> dict:
     """查找类似的历史歧义决策"""
-    data = read_memory(project_path, "ambiguity_decisions")
-    decisions = data.get("decisions", [])
-
-    for decision in reversed(decisions):  # 从最新的开始查找
-        if decision.get("type") == ambiguity_type:
-            # 简单的上下文匹配（可以优化为更智能的匹配）
-            if context.lower() in decision.get("context", "").lower():
-                return decision
-    return None
+    results = find_similar_ambiguities(project_path, context, ambiguity_type, top_k=1)
+    return results[0][1] if results else None
+
+
+def run_batch(project_path: str, operations: list) -> list:
+    """在同一份内存视图上依次执行多个记忆操作，结束时每个改动过的文件只写一次"""
+    import copy
+
+    views = {}     # 记忆类型 -> 已加载（并可能已修改）的数据
+    dirty = set()  # 需要整体写回的记忆类型
+    pending = {}   # SQLite 后端且未整体改写时：记忆类型 -> 待插入的记录
+    appended = set()  # 追加过记录的记忆类型
+
+    def load(memory_type):
+        if memory_type not in FILES:
+            raise ValueError(f"未知记忆类型: {memory_type}")
+        if memory_type not in views:
+            data = read_memory(project_path, memory_type)
+            if pending.get(memory_type):
+                data.setdefault(RECORD_LISTS[memory_type], []).extend(pending[memory_type])
+            views[memory_type] = data
+        return views[memory_type]
+
+    def append(memory_type, record):
+        record["date"] = datetime.now().isoformat()
+        appended.add(memory_type)
+        if uses_sqlite(project_path, memory_type) and memory_type not in dirty:
+            pending.setdefault(memory_type, []).append(record)
+            if memory_type in views:
+                views[memory_type].setdefault(RECORD_LISTS[memory_type], []).append(record)
+        else:
+            load(memory_type).setdefault(RECORD_LISTS[memory_type], []).append(record)
+            dirty.add(memory_type)
+
+    def set_pref(key, value):
+        prefs = load("user_preferences")
+        prefs[key] = value
+        prefs["updated_at"] = datetime.now().isoformat()
+        dirty.add("user_preferences")
+
+    def unchanged(memory_type):
+        return memory_type not in dirty and not pending.get(memory_type)
+
+    def data_of(op):
+        if not isinstance(op["data"], dict):
+            raise ValueError("data 需为 JSON 对象")
+        return op["data"]
+
+    def execute(op):
+        if not isinstance(op, dict):
+            raise ValueError("操作需为 JSON 对象")
+        action = op["action"]
+        if action == "read":
+            return copy.deepcopy(load(op["type"]))
+        if action == "update":
+            memory_type = op["type"]
+            if op.get("merge", True):
+                _deep_merge(load(memory_type), copy.deepcopy(data_of(op)))
+            elif memory_type not in FILES:
+                raise ValueError(f"未知记忆类型: {memory_type}")
+            else:
+                views[memory_type] = copy.deepcopy(data_of(op))
+            dirty.add(memory_type)
+            return None
+        if action == "add-record":
+            append("generation_history",
+                   _normalize_record(attach_timings(dict(data_of(op)), op.get("attach_timings"))))
+            return None
+        if action == "add-ambiguity":
+            append("ambiguity_decisions", dict(data_of(op)))
+            return None
+        if action == "get-prefs":
+            return copy.deepcopy(load("user_preferences"))
+        if action == "set-pref":
+            set_pref(op["key"], op["value"])
+            return None
+        if action == "set-mode":
+            if op.get("mode") not in ("quick", "expert"):
+                raise ValueError(f"无效的交互模式: {op.get('mode')}，应为 'quick' 或 'expert'")
+            set_pref("interaction_mode", op["mode"])
+            return None
+        if action == "get-mode":
+            return load("user_preferences").get("interaction_mode")
+        if action == "save-formats":
+            set_pref("last_output_formats", op["formats"])
+            return None
+        if action == "query":
+            memory_type = op.get("type")
+            if memory_type not in RECORD_LISTS:
+                raise ValueError(f"type 需为 {' / '.join(RECORD_LISTS)}")
+            args = (op.get("record_type"), op.get("since"), op.get("until"), op.get("limit"))
+            if unchanged(memory_type):
+                return query_records(project_path, memory_type, *args)
+            records = load(memory_type).get(RECORD_LISTS[memory_type], [])
+            return copy.deepcopy(_filter_records(records, *args))
+        if action == "find-ambiguity":
+            if unchanged("ambiguity_decisions"):
+                index = load_ambiguity_index(project_path)
+            else:
+                index = build_ambiguity_index(load("ambiguity_decisions").get("decisions", []))
+            top_k = op.get("top_k")
+            results = search_ambiguity_index(index, op["context"], op.get("type"), top_k or 1,
+                                             op.get("min_score", AMBIGUITY_MIN_SCORE))
+            if top_k:
+                return [{"score": score, "decision": copy.deepcopy(decision)}
+                        for score, decision in results]
+            return copy.deepcopy(results[0][1]) if results else None
+        raise ValueError(f"不支持的批量操作: {action}")
+
+    results = []
+    with memory_lock(project_path):
+        for op in operations:
+            # 非对象的操作（如 "read"、null）也只记为该项的错误，不中断整批
+            action = op.get("action") if isinstance(op, dict) else None
+            try:
+                results.append({"action": action, "result": execute(op)})
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                missing = f"缺少字段 {e}" if isinstance(e, KeyError) else str(e)
+                results.append({"action": action, "error": missing})
+
+        # 每个改动过的记忆只写一次；SQLite 后端的追加合并为一次插入
+        for memory_type in dirty:
+            data = views[memory_type]
+            if uses_sqlite(project_path, memory_type):
+                _sqlite_write(project_path, memory_type, data)
+            else:
+                _write_json(Path(project_path) / MEMORY_DIR / FILES[memory_type], data)
+        for memory_type, records in pending.items():
+            if memory_type in dirty and RECORD_LISTS[memory_type] in views[memory_type]:
+                continue
+            conn = _connect(project_path)
+            try:
+                with conn:
+                    _insert_records(conn, memory_type, records)
+            finally:
+                conn.close()
+
+        # 与 add_generation_record 相同：原始记录超出保留条数一定量后自动压缩
+        if "generation_history" in appended:
+            if uses_sqlite(project_path, "generation_history"):
+                conn = _connect(project_path)
+                try:
+                    count = conn.execute("SELECT COUNT(*) FROM records WHERE memory_type = ?",
+                                         ("generation_history",)).fetchone()[0]
+                finally:
+                    conn.close()
+            else:
+                count = len(views["generation_history"].get("generations", []))
+            if count > get_retention(project_path)["keep_runs"] + COMPACT_SLACK:
+                compact_generation_history(project_path, quiet=True)
+    return results
 
 
 def main():
@@ -196,18 +825,33 @@ def main():
     parser.add_argument('--action', required=True,
                        choices=['init', 'read', 'update', 'clear', 'add-record',
                                 'get-prefs', 'set-pref', 'set-mode', 'get-mode',
-                                'add-ambiguity', 'find-ambiguity'],
+                                'add-ambiguity', 'find-ambiguity', 'query', 'migrate', 'batch',
+                                'compact'],
                        help='操作类型')
     parser.add_argument('--project', default='.', help='项目路径')
     parser.add_argument('--type', help='记忆类型')
-    parser.add_argument('--data', help='JSON 格式数据')
+    parser.add_argument('--data', help='JSON 格式数据（batch 为操作列表，- 表示从标准输入读取）')
     parser.add_argument('--key', help='偏好设置键名')
     parser.add_argument('--value', help='偏好设置值')
     parser.add_argument('--mode', help='交互模式 (quick/expert)')
     parser.add_argument('--context', help='歧义上下文')
     parser.add_argument('--template-dir', default='templates', help='模板目录')
     parser.add_argument('--requirements-dir', default='requirements', help='需求目录')
+    parser.add_argument('--record-type', help='按记录的 type 字段过滤（query）')
+    parser.add_argument('--since', help='起始日期（ISO 格式，query）')
+    parser.add_argument('--until', help='截止日期（ISO 格式，query）')
+    parser.add_argument('--limit', type=int, help='最多返回的记录数（query）')
+    parser.add_argument('--top-k', type=int, help='返回最相似的前 K 条决策及相似度（find-ambiguity）')
+    parser.add_argument('--min-score', type=float, default=AMBIGUITY_MIN_SCORE,
+                        help='相似度下限 0-1（find-ambiguity）')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], help='目标存储后端（migrate）')
+    parser.add_argument('--keep-runs', type=int, help='保留的原始生成记录条数（compact，默认取保留策略）')
+    parser.add_argument('--keep-days', type=int, help='保留最近多少天的原始记录（compact，默认取保留策略）')
+    parser.add_argument('--attach-timings', action='append', metavar='PATH',
+                        help='把其他脚本 --timings 写出的计时 JSON 附加到生成记录（add-record，可重复）')
+    timings.add_arguments(parser)
     args = parser.parse_args()
+    timings.begin("memory_manager", args.timings, args.profile)
 
     try:
         if args.action == 'init':
@@ -233,7 +877,8 @@ def main():
             if not args.data:
                 print("错误：需要指定 --data", file=sys.stderr)
                 sys.exit(1)
-            add_generation_record(args.project, json.loads(args.data))
+            record = attach_timings(json.loads(args.data), args.attach_timings)
+            add_generation_record(args.project, record)
 
         elif args.action == 'get-prefs':
             prefs = get_preferences(args.project)
@@ -268,14 +913,48 @@ def main():
             add_ambiguity_decision(args.project, json.loads(args.data))
 
         elif args.action == 'find-ambiguity':
-            if not args.type or not args.context:
-                print("错误：需要指定 --type 和 --context", file=sys.stderr)
+            if not args.context or (not args.type and not args.top_k):
+                print("错误：需要指定 --type 和 --context（或 --context 和 --top-k）", file=sys.stderr)
                 sys.exit(1)
-            result = find_similar_ambiguity(args.project, args.type, args.context)
-            if result:
-                print(json.dumps(result, ensure_ascii=False, indent=2))
+            if args.top_k:
+                results = find_similar_ambiguities(args.project, args.context, args.type,
+                                                   args.top_k, args.min_score)
+                print(json.dumps([{"score": score, "decision": decision}
+                                  for score, decision in results], ensure_ascii=False, indent=2))
             else:
-                print("未找到类似决策")
+                result = find_similar_ambiguity(args.project, args.type, args.context)
+                if result:
+                    print(json.dumps(result, ensure_ascii=False, indent=2))
+                else:
+                    print("未找到类似决策")
+
+        elif args.action == 'query':
+            if args.type not in RECORD_LISTS:
+                print(f"错误：--type 需为 {' / '.join(RECORD_LISTS)}", file=sys.stderr)
+                sys.exit(1)
+            records = query_records(args.project, args.type, args.record_type,
+                                    args.since, args.until, args.limit)
+            print(json.dumps(records, ensure_ascii=False, indent=2))
+
+        elif args.action == 'batch':
+            if not args.data:
+                print("错误：需要指定 --data（操作列表）", file=sys.stderr)
+                sys.exit(1)
+            operations = json.load(sys.stdin) if args.data == '-' else json.loads(args.data)
+            if not isinstance(operations, list):
+                print("错误：--data 需为操作列表", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(run_batch(args.project, operations), ensure_ascii=False, indent=2))
+
+        elif args.action == 'compact':
+            summary = compact_generation_history(args.project, args.keep_runs, args.keep_days)
+            print(f"已压缩生成历史: 保留 {summary['kept']} 条，汇总 {summary['rolled_up']} 条")
+
+        elif args.action == 'migrate':
+            if not args.backend:
+                print("错误：需要指定 --backend (json/sqlite)", file=sys.stderr)
+                sys.exit(1)
+            migrate_memory(args.project, args.backend)
 
     except Exception as e:
         print(f"操作失败: {e}", file=sys.stderr)
@@ -283,4 +962,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # 常驻工作进程运行时转发给它执行，否则在本进程内执行
+    from worker import run_via_worker
+    if not run_via_worker("memory_manager"):
+        main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段计时 - 记录各阶段的墙钟时间、CPU 时间和峰值内存，可选输出 cProfile 文件
+三个脚本的 --timings / --profile 参数使用本模块；未启用时 stage() 直接返回，不影响正常运行
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# 当前进程的计时会话，未启用时为 None
+_session = None
+
+
+def _peak_rss_kb() -> int:
+    """进程峰值常驻内存（KB）：Linux 读 VmHWM（可被重置），其他平台用 ru_maxrss"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _reset_peak() -> bool:
+    """把 VmHWM 重置为当前常驻内存，使下一阶段的峰值只反映该阶段；不支持时返回 False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def begin(script: str, timings: str = None, profile: str = None):
+    """按命令行参数开始记录，进程退出时自动输出
+
+    timings 为 '-' 时把汇总表打印到 stderr，否则写入该 JSON 文件；profile 为 cProfile 输出路径。
+    """
+    global _session
+    if _session is not None or not (timings or profile):
+        return
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    _session = {
+        "script": script,
+        "argv": sys.argv[1:],
+        "timings": timings,
+        "profile": profile,
+        "profiler": profiler,
+        "stages": {} if timings else None,
+        "stack": [],
+        "peak_kb": _peak_rss_kb(),
+        "stage_peaks": _reset_peak(),
+        "started": (time.perf_counter(), time.process_time()),
+    }
+    atexit.register(finish)
+    if profiler:
+        profiler.enable()
+
+
+@contextmanager
+def stage(name: str):
+    """记录一个阶段；同名阶段累加（如逐页提取），嵌套阶段的峰值同时计入外层"""
+    session = _session
+    if session is None or session["stages"] is None:
+        yield
+        return
+
+    stack = session["stack"]
+    entry = session["stages"].get(name)
+    if entry is None:
+        entry = session["stages"][name] = {
+            "stage": name, "depth": len(stack), "count": 0, "wall_s": 0.0,
+            "cpu_s": 0.0, "max_wall_s": 0.0, "peak_rss_mb": 0.0}
+    current = _peak_rss_kb()
+    session["peak_kb"] = max(session["peak_kb"], current)
+    if stack:
+        stack[-1]["peak_kb"] = max(stack[-1]["peak_kb"], current)
+    _reset_peak()
+    frame = {"peak_kb": 0}
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stack.pop()
+        peak = max(frame["peak_kb"], _peak_rss_kb())
+        session["peak_kb"] = max(session["peak_kb"], peak)
+        if stack:
+            stack[-1]["peak_kb"] = max(stack[-1]["peak_kb"], peak)
+        entry["count"] += 1
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu
+        entry["max_wall_s"] = max(entry["max_wall_s"], wall)
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], peak / 1024)
+
+
+def summary() -> dict:
+    """当前会话的计时汇总（阶段按首次进入的顺序排列，外层阶段在前）"""
+    session = _session
+    if session is None:
+        return {}
+    wall_start, cpu_start = session["started"]
+    peak_kb = max(session["peak_kb"], _peak_rss_kb())
+    stages = []
+    for entry in (session["stages"] or {}).values():
+        stages.append({**entry, **{key: round(entry[key], 4)
+                                   for key in ("wall_s", "cpu_s", "max_wall_s")},
+                       "peak_rss_mb": round(entry["peak_rss_mb"], 1)})
+    return {
+        "script": session["script"],
+        "argv": session["argv"],
+        "date": datetime.now().isoformat(),
+        "total": {"wall_s": round(time.perf_counter() - wall_start, 4),
+                  "cpu_s": round(time.process_time() - cpu_start, 4),
+                  "peak_rss_mb": round(peak_kb / 1024, 1)},
+        # process：平台不支持重置峰值，各阶段的峰值是截至该阶段的进程峰值
+        "peak_scope": "stage" if session["stage_peaks"] else "process",
+        "stages": stages,
+    }
+
+
+def format_table(report: dict) -> str:
+    """把计时汇总格式化为对齐的文本表"""
+    lines = [f"{'stage':<28}{'count':>8}{'wall_s':>13}{'cpu_s':>12}{'max_wall_s':>16}{'peak_mb':>12}"]
+    for entry in report["stages"]:
+        name = '  ' * entry["depth"] + entry["stage"]
+        lines.append(f"{name:<28}{entry['count']:>8}{entry['wall_s']:>13.3f}{entry['cpu_s']:>12.3f}"
+                     f"{entry['max_wall_s']:>16.3f}{entry['peak_rss_mb']:>12.1f}")
+    total = report["total"]
+    lines.append(f"{'total':<28}{'':>8}{total['wall_s']:>13.3f}{total['cpu_s']:>12.3f}"
+                 f"{'':>16}{total['peak_rss_mb']:>12.1f}")
+    return "\n".join(lines)
+
+
+def compact(report: dict) -> dict:
+    """精简的计时摘要（总耗时、峰值、各阶段墙钟时间），用于附加到生成记录"""
+    total = report.get("total") or {}
+    return {
+        "wall_s": total.get("wall_s"),
+        "cpu_s": total.get("cpu_s"),
+        "peak_rss_mb": total.get("peak_rss_mb"),
+        "stages": {entry["stage"]: entry["wall_s"] for entry in report.get("stages") or []},
+    }
+
+
+def finish():
+    """结束记录：写出 cProfile 文件和分阶段汇总（重复调用无副作用）"""
+    global _session
+    session = _session
+    if session is None:
+        return
+    profiler = session["profiler"]
+    if profiler:
+        profiler.disable()
+    try:
+        if profiler:
+            profiler.dump_stats(session["profile"])
+            print(f"已写出 cProfile: {session['profile']}（python3 -m pstats 查看）", file=sys.stderr)
+        if session["timings"]:
+            report = summary()
+            if session["timings"] == '-':
+                print(format_table(report), file=sys.stderr)
+            else:
+                path = session["timings"]
+                if os.path.dirname(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+                print(f"已写出分阶段计时: {path}", file=sys.stderr)
+    except OSError as e:
+        print(f"写出计时结果失败: {e}", file=sys.stderr)
+    finally:
+        _session = None
+
+
+def add_arguments(parser):
+    """为脚本的命令行添加 --timings / --profile 参数"""
+    parser.add_argument('--timings', nargs='?', const='-', metavar='PATH',
+                        help='记录各阶段的墙钟时间、CPU 时间和峰值内存；不带值时打印到 stderr，'
+                             '带值时写入 JSON 文件（可用 memory_manager.py add-record --attach-timings 附加到生成记录）')
+    parser.add_argument('--profile', metavar='PATH', help='把整次运行的 cProfile 结果写入该文件')
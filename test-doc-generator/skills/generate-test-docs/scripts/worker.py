@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻工作进程 - 保持依赖已导入、模板已缓存，为脚本调用省去冷启动
+三个脚本在工作进程运行时自动转发给它执行，未运行时在本进程内执行
+
+工作进程逐个处理连接，同一时间只执行一个调用。请求按行传输：调用方发送请求，
+工作进程确认（或拒绝）后调用方回复 go，工作进程才开始执行。调用方在确认超时后放弃，
+未收到 go 的请求不会执行，因此回退到本进程执行不会让同一调用运行两次。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# 可被转发执行的脚本
+SCRIPTS = ("extract_document", "generate_excel", "memory_manager")
+DEFAULT_IDLE_TIMEOUT = 1800
+# 等待工作进程确认请求的秒数（工作进程正忙或无响应时超时，回退到本进程执行）
+ACCEPT_TIMEOUT = 2.0
+# 确认后等待执行结果的秒数
+RUN_TIMEOUT = 3600.0
+# 影响脚本行为的环境变量（本地时间、临时文件目录、区域设置、模块搜索路径），
+# 调用方与工作进程不一致时工作进程拒绝执行，调用方在本进程执行
+WORKER_ENV = ("TZ", "TMPDIR", "LANG", "LC_ALL", "LC_CTYPE", "PYTHONPATH")
+
+
+def _is_private(path: str, kind) -> bool:
+    """path 不是符号链接、类型符合 kind（stat.S_ISDIR / S_ISSOCK）、属于当前用户且组和其他用户无权限"""
+    import stat
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return kind(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def socket_path() -> str:
+    """工作进程的 Unix socket 路径（可用 TEST_DOC_WORKER_SOCKET 覆盖）
+
+    默认位于 $XDG_RUNTIME_DIR，没有时位于临时目录下仅当前用户可访问的子目录。
+    """
+    import stat
+
+    path = os.environ.get("TEST_DOC_WORKER_SOCKET")
+    if path:
+        return path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and _is_private(runtime, stat.S_ISDIR):
+        return os.path.join(runtime, "test-doc-worker.sock")
+    tmp = os.environ.get("TMPDIR", "/tmp")
+    return os.path.join(tmp, f"test-doc-worker-{os.getuid()}", "worker.sock")
+
+
+def _trusted_dir(directory: str) -> bool:
+    """目录属于当前用户，且组和其他用户不可写（不能替换其中的 socket）"""
+    import stat
+
+    try:
+        st = os.lstat(directory)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def _trusted_socket(path: str) -> bool:
+    """socket 及其所在目录都属于当前用户且不对其他用户开放，才可信任并连接"""
+    import stat
+
+    return _trusted_dir(os.path.dirname(os.path.abspath(path))) and _is_private(path, stat.S_ISSOCK)
+
+
+def _should_forward(argv: list) -> bool:
+    """读标准输入或流式输出的调用不转发，保持原有的流式语义；计时 / 性能分析须在本进程内测量"""
+    if os.environ.get("TEST_DOC_NO_WORKER"):
+        return False
+    if any(arg.split('=', 1)[0] in ('--timings', '--profile') for arg in argv):
+        return False
+    return '-' not in argv and '--stream' not in argv
+
+
+def _recv_line(sock) -> bytes:
+    """读取一行（不含换行符），对端关闭时返回已读到的内容"""
+    chunks = []
+    while True:
+        chunk = sock.recv(1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks).rstrip(b'\n')
+
+
+def request(payload: dict, timeout: float = ACCEPT_TIMEOUT, run_timeout: float = RUN_TIMEOUT) -> dict:
+    """向工作进程发送一个请求并等待响应
+
+    timeout 秒内未得到确认、或工作进程拒绝时抛出 OSError，此时请求未被执行；
+    确认后 run_timeout 秒内没有结果、或工作进程中途退出时抛出 RuntimeError。
+    """
+    import socket
+
+    path = socket_path()
+    if not _trusted_socket(path):
+        # 不存在，或可能由其他用户放置：不发送任何内容
+        raise ConnectionRefusedError(f"工作进程 socket 不可用或不可信: {path}")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n')
+        reply = _recv_line(sock)
+        if reply != b'ok':
+            reason = json.loads(reply.decode('utf-8')).get("refused") if reply else "连接已关闭"
+            raise ConnectionRefusedError(f"工作进程未接受请求: {reason}")
+        sock.sendall(b'go\n')
+        sock.settimeout(run_timeout)
+        try:
+            chunks = []
+            while True:
+                chunk = sock.recv(1 << 16)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return json.loads(b''.join(chunks).decode('utf-8'))
+        except (OSError, ValueError) as e:
+            # 请求已开始执行，不能再回退到本进程重复执行
+            raise RuntimeError(f"工作进程执行失败或超时: {e}") from e
+
+
+def run_via_worker(script: str, argv: list = None) -> bool:
+    """工作进程在运行时转发本次调用并以其结果退出；未运行或不适用时返回 False"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not hasattr(os, 'getuid') or not _should_forward(argv):
+        return False
+    if not _trusted_socket(socket_path()):
+        return False
+    payload = {"op": "run", "script": script, "argv": argv, "cwd": os.getcwd(),
+               "env": {name: os.environ.get(name) for name in WORKER_ENV}}
+    try:
+        response = request(payload)
+    except (OSError, ValueError):
+        # 工作进程不可用（已退出、socket 残留、正忙、环境不一致等），请求未执行，回退到本进程执行
+        return False
+    except RuntimeError as e:
+        print(f"错误：{e}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    sys.stdout.flush()
+    sys.exit(response.get("returncode", 1))
+
+
+def _run_script(modules: dict, script: str, argv: list, cwd: str) -> dict:
+    """在工作进程内执行脚本的 main()，捕获输出和退出码"""
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    if script not in modules:
+        return {"returncode": 2, "stdout": "", "stderr": f"未知脚本: {script}\n"}
+
+    out, err = io.StringIO(), io.StringIO()
+    old_argv, old_cwd = sys.argv, os.getcwd()
+    returncode = 0
+    try:
+        os.chdir(cwd)
+        sys.argv = [f"{script}.py"] + list(argv)
+        with redirect_stdout(out), redirect_stderr(err):
+            modules[script].main()
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            returncode = e.code or 0
+        else:
+            err.write(f"{e.code}\n")
+            returncode = 1
+    except Exception:
+        err.write(traceback.format_exc())
+        returncode = 1
+    finally:
+        sys.argv = old_argv
+        os.chdir(old_cwd)
+    return {"returncode": returncode, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+def _env_mismatch(payload: dict) -> list:
+    """调用方与工作进程取值不同的 WORKER_ENV 变量"""
+    env = payload.get("env") or {}
+    return [name for name in WORKER_ENV if env.get(name) != os.environ.get(name)]
+
+
+def serve(idle_timeout: int = DEFAULT_IDLE_TIMEOUT):
+    """启动工作进程：预先导入脚本与依赖，逐个处理请求，空闲超时后退出
+
+    连接按到达顺序串行处理，执行期间到达的调用在确认超时后回退到各自进程执行。
+    """
+    import importlib
+    import socket
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    modules = {name: importlib.import_module(name) for name in SCRIPTS}
+    # 预热重量级依赖，缺失的依赖留到实际调用时再报错
+    for dependency in ("openpyxl", "fitz"):
+        try:
+            importlib.import_module(dependency)
+        except ImportError:
+            pass
+
+    path = socket_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.lexists(directory) and not os.environ.get("TEST_DOC_WORKER_SOCKET"):
+        os.mkdir(directory, 0o700)
+    if not _trusted_dir(directory):
+        raise RuntimeError(f"socket 目录须属于当前用户且其他用户不可写: {directory}")
+    if os.path.lexists(path):
+        # 只清理自己残留的 socket，不删除其他用户放置的文件
+        if not _trusted_socket(path):
+            raise RuntimeError(f"socket 路径已被占用且不属于当前用户: {path}")
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    server.settimeout(idle_timeout)
+
+    started_at = time.time()
+    served = 0
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            with conn:
+                # 读取请求与等待 go 都有超时，卡住的调用方不会阻塞后续请求
+                conn.settimeout(ACCEPT_TIMEOUT)
+                try:
+                    payload = json.loads(_recv_line(conn).decode('utf-8'))
+                    op = payload.get("op")
+                    mismatch = _env_mismatch(payload) if op == "run" else []
+                    if mismatch:
+                        refused = {"refused": f"环境变量与工作进程不一致: {', '.join(mismatch)}"}
+                        conn.sendall(json.dumps(refused, ensure_ascii=False).encode('utf-8') + b'\n')
+                        continue
+                    conn.sendall(b'ok\n')
+                    if _recv_line(conn) != b'go':
+                        # 调用方已超时放弃并回退到本进程执行
+                        continue
+                except (OSError, ValueError, AttributeError):
+                    continue
+                conn.settimeout(None)
+
+                if op == "run":
+                    response = _run_script(modules, payload.get("script"),
+                                           payload.get("argv", []), payload.get("cwd", "."))
+                    served += 1
+                elif op == "status":
+                    response = {"pid": os.getpid(), "uptime": round(time.time() - started_at, 1),
+                                "served": served, "socket": path}
+                elif op == "shutdown":
+                    conn.sendall(json.dumps({"stopped": True}).encode('utf-8'))
+                    break
+                else:
+                    response = {"returncode": 2, "stdout": "", "stderr": f"未知操作: {op}\n"}
+                conn.sendall(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def start(idle_timeout: int = DEFAULT_IDLE_TIMEOUT, wait: float = 10.0) -> dict:
+    """在后台启动工作进程，等待其就绪"""
+    import subprocess
+
+    try:
+        return request({"op": "status"}, timeout=1)
+    except OSError:
+        pass
+
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--action", "serve",
+                      "--idle-timeout", str(idle_timeout)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        try:
+            return request({"op": "status"}, timeout=1)
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("工作进程启动超时")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='管理常驻工作进程')
+    parser.add_argument('--action', required=True, choices=['start', 'stop', 'status', 'serve'],
+                        help='操作类型')
+    parser.add_argument('--idle-timeout', type=int, default=DEFAULT_IDLE_TIMEOUT,
+                        help='空闲多少秒后自动退出')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'getuid'):
+        print("错误：工作进程需要 Unix socket 支持", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.action == 'serve':
+            serve(args.idle_timeout)
+
+        elif args.action == 'start':
+            status = start(args.idle_timeout)
+            print(f"工作进程已运行: pid={status['pid']} socket={status['socket']}")
+
+        elif args.action == 'stop':
+            try:
+                request({"op": "shutdown"}, timeout=5)
+                print("工作进程已停止")
+            except OSError:
+                print("工作进程未运行")
+
+        elif args.action == 'status':
+            try:
+                print(json.dumps(request({"op": "status"}, timeout=5), ensure_ascii=False, indent=2))
+            except OSError:
+                print("工作进程未运行")
+
+    except Exception as e:
+        print(f"操作失败: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""测试公共设置：脚本目录加入 sys.path，测试中不转发给常驻工作进程"""
+
+import os
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "skills" / "generate-test-docs" / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+os.environ["TEST_DOC_NO_WORKER"] = "1"
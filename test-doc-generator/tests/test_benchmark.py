@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import benchmark
+
+CORPUS_ARGS = ["--suite", "corpus", "--pages", "3", "--sections", "3", "--case-counts", "20",
+               "--history-runs", "50", "--decisions", "20"]
+
+
+def _corpus_result(name, seconds, rss):
+    return {"suite": "corpus", "name": name, "items": 1, "unit": "次", "seconds": seconds,
+            "throughput": round(1 / seconds, 1), "peak_rss_mb": rss}
+
+
+def test_corpus_suite_runs_and_saves_baseline(tmp_path, monkeypatch):
+    """小规模语料跑通全部命令，结果与基线文件结构完整，与自身基线比较无回归"""
+    pytest.importorskip("fitz")
+    pytest.importorskip("docx")
+    output, baseline = tmp_path / "results.json", tmp_path / "baseline.json"
+    monkeypatch.setattr("sys.argv", ["benchmark.py"] + CORPUS_ARGS
+                        + ["-o", str(output), "--save-baseline", str(baseline)])
+    benchmark.main()
+
+    results = json.loads(output.read_text(encoding="utf-8"))
+    names = [r["name"] for r in results]
+    assert names[:4] == ["extract_document pdf", "extract_document docx", "extract_document md",
+                         "generate_excel --learn"]
+    assert {"generate_excel 20", "generate_excel 20 --traceability", "generate_excel 20 --template",
+            "memory_manager add-record（含自动压缩）"} <= set(names)
+    assert all(r["suite"] == "corpus" and r["seconds"] > 0 and r["peak_rss_mb"] > 0 for r in results)
+
+    saved = json.loads(baseline.read_text(encoding="utf-8"))
+    assert saved["results"] == results and saved["cpu_count"]
+    compared = benchmark.compare_baseline(results, str(baseline))
+    assert not any(r["regression"] for r in compared)
+
+
+def test_compare_baseline_flags_regressions(tmp_path):
+    """耗时或峰值内存超出容差记为回归；低于噪声下限的耗时差与基线中没有的条目不计"""
+    baseline = tmp_path / "baseline.json"
+    benchmark.save_baseline([_corpus_result("slow", 1.0, 50), _corpus_result("noise", 0.05, 50),
+                             _corpus_result("memory", 1.0, 50), _corpus_result("ok", 1.0, 50)],
+                            str(baseline))
+    results = [_corpus_result("slow", 1.5, 50), _corpus_result("noise", 0.1, 50),
+               _corpus_result("memory", 1.0, 70), _corpus_result("ok", 1.2, 60),
+               _corpus_result("new", 9.0, 500)]
+    compared = {r["name"]: r for r in benchmark.compare_baseline(results, str(baseline), 0.25)}
+    assert {name: r.get("regression") for name, r in compared.items()} == {
+        "slow": True, "noise": False, "memory": True, "ok": False, "new": None}
+    assert compared["slow"]["baseline_seconds"] == 1.0 and "baseline_seconds" not in compared["new"]
+
+
+def test_corpus_regression_exits_nonzero(tmp_path, monkeypatch):
+    """--baseline 比较出回归时以非零状态退出"""
+    baseline = tmp_path / "baseline.json"
+    benchmark.save_baseline([_corpus_result("generate_excel 20", 0.2, 30)], str(baseline))
+    monkeypatch.setattr(benchmark, "bench_corpus",
+                        lambda *args: [_corpus_result("generate_excel 20", 1.0, 30)])
+    monkeypatch.setattr("sys.argv", ["benchmark.py"] + CORPUS_ARGS
+                        + ["--baseline", str(baseline), "-o", str(tmp_path / "out.json")])
+    with pytest.raises(SystemExit) as exc:
+        benchmark.main()
+    assert exc.value.code == 1
+    assert json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))[0]["regression"] is True
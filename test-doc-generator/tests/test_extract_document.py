@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import extract_document
+from extract_document import CACHE_STATS_FILE, cache_stats
+
+
+def _hit_many(cache_dir: str, times: int):
+    for _ in range(times):
+        extract_document._update_cache_stats(Path(cache_dir), hits=1)
+
+
+def test_cache_stats_concurrent_updates(tmp_path):
+    """批量提取的并行进程同时更新计数，不丢失也不写坏 _stats.json"""
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(_hit_many, [str(tmp_path)] * 8, [50] * 8))
+    json.loads((tmp_path / CACHE_STATS_FILE).read_text(encoding='utf-8'))
+    assert cache_stats(str(tmp_path))["hits"] == 400
+
+
+def test_bulk_extract_stops_on_keyboard_interrupt(tmp_path, monkeypatch):
+    """Ctrl-C 中止批量提取，而不是记为单个文件的错误"""
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(extract_document, "extract_document", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        extract_document._extract_to_file("a.md", str(tmp_path / "a.json"))
+
+    def missing_dependency(*args, **kwargs):
+        raise SystemExit(1)
+
+    monkeypatch.setattr(extract_document, "extract_document", missing_dependency)
+    entry = extract_document._extract_to_file("a.md", str(tmp_path / "a.json"))
+    assert entry["error"] and entry["output"] is None
+
+
+def _make_pdf(path, with_toc: bool):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for title in ("Chapter One", "Chapter Two"):
+        page = doc.new_page()
+        page.insert_text((72, 72), title, fontsize=20)
+        for line in range(10):
+            page.insert_text((72, 110 + line * 14), f"{title} body line {line}", fontsize=10)
+    if with_toc:
+        doc.set_toc([[1, "Chapter One", 1], [1, "Chapter Two", 2]])
+    doc.save(path)
+    doc.close()
+
+
+@pytest.mark.parametrize("with_toc", [True, False])
+def test_incremental_pdf_section(tmp_path, monkeypatch, capsys, with_toc):
+    """--incremental 与 --section 组合：增量结果带章节索引，复用的页同样参与标题识别"""
+    pdf, state = tmp_path / "doc.pdf", tmp_path / "state.json"
+    _make_pdf(str(pdf), with_toc)
+
+    argv = ["extract_document.py", "-i", str(pdf), "--incremental"]
+    monkeypatch.setattr("sys.argv", argv + ["-o", str(state)])
+    extract_document.main()
+    first = json.loads(state.read_text(encoding="utf-8"))
+    assert [entry["title"] for entry in first["outline"]] == ["Chapter One", "Chapter Two"]
+    assert first["outline"] == extract_document.extract_pdf(str(pdf))["outline"]
+    capsys.readouterr()
+
+    monkeypatch.setattr("sys.argv", argv + ["--previous", str(state), "--section", "Chapter Two"])
+    extract_document.main()
+    result = json.loads(capsys.readouterr().out)
+    assert result["section"]["title"] == "Chapter Two"
+    assert "Chapter Two body line 9" in result["text"]
+    assert "Chapter One" not in result["text"]
+    # 第二次运行全部复用，章节索引与首次一致
+    second = extract_document.extract_pdf_incremental(str(pdf), first)
+    assert second["diff"]["extracted"] == 0
+    assert second["outline"] == first["outline"]
+
+
+def test_format_detection_prefers_text(tmp_path):
+    """文本扩展名优先于文件头；%PDF- 只在开头的空白或 BOM 之后识别；非 ZIP 的 PK 开头文件按文本读取"""
+    from extract_document import detect_format, sniff_format
+
+    note = tmp_path / "note.md"
+    note.write_text("# 附录\n\n导出格式示例：%PDF-1.7 开头的文件\n", encoding="utf-8")
+    assert detect_format(str(note)) == "markdown"
+    assert "%PDF-1.7" in extract_document.extract_document(str(note))["full_text"]
+
+    quoted = tmp_path / "quoted"
+    quoted.write_bytes("说明：文件头为 %PDF-1.7\n".encode("utf-8"))
+    assert sniff_format(str(quoted)) is None
+    for prefix in (b"", b"\r\n  ", codecs.BOM_UTF8):
+        quoted.write_bytes(prefix + b"%PDF-1.7\n")
+        assert sniff_format(str(quoted)) == "pdf"
+
+    for name in ("pk.txt", "pk"):
+        text = tmp_path / name
+        text.write_bytes(b"PK\x03\x04 looks like a zip header but is plain text\n")
+        assert detect_format(str(text)) == "text"
+        assert "plain text" in extract_document.extract_document(str(text))["full_text"]
+
+
+def test_empty_pdf_raises(tmp_path):
+    """没有任何文本的 PDF 报错，而不是返回空结果"""
+    fitz = pytest.importorskip("fitz")
+    path = tmp_path / "blank.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(str(path))
+    doc.close()
+    with pytest.raises(ValueError, match="没有可提取的文本"):
+        extract_document.extract_document(str(path))
+    with pytest.raises(ValueError, match="没有可提取的文本"):
+        extract_document.extract_pdf_incremental(str(path))
+
+
+MARKDOWN_WITH_CODE = """# 需求说明
+
+## 登录
+用户输入账号密码登录。
+
+```bash
+# 安装依赖
+pip install -r requirements.txt
+```
+
+## 注册
+~~~python
+# 校验手机号
+def check(phone): ...
+~~~
+注册需要手机号。
+"""
+
+
+def test_markdown_sections_skip_code_fences(tmp_path):
+    """章节切分、增量差异和流式记录与章节索引一致：代码块中的 # 注释不是标题"""
+    path = tmp_path / "prd.md"
+    path.write_text(MARKDOWN_WITH_CODE, encoding="utf-8")
+
+    outline = [entry["title"] for entry in extract_document.extract_document(str(path))["outline"]]
+    assert outline == ["需求说明", "登录", "注册"]
+
+    titles = [title for title, _ in extract_document.split_sections(MARKDOWN_WITH_CODE)]
+    assert titles == ["# 需求说明", "## 登录", "## 注册"]
+
+    records = list(extract_document.iter_records(str(path)))
+    sections = [r for r in records if r["type"] == "section"]
+    assert [r["title"] for r in sections] == titles
+    assert "pip install" in sections[1]["text"] and "def check" in sections[2]["text"]
+
+    first = extract_document.extract_text_incremental(str(path), "markdown")
+    path.write_text(MARKDOWN_WITH_CODE.replace("# 安装依赖", "# 安装全部依赖"), encoding="utf-8")
+    second = extract_document.extract_text_incremental(str(path), "markdown", first)
+    assert second["diff"]["changed"] == [{"section": "## 登录"}]
+    assert second["diff"]["added"] == [] and second["diff"]["removed"] == []
+
+
+def _make_xobject_pdf(path, label: str):
+    """正文只引用一个 Form XObject，文字都在 XObject 内"""
+    fitz = pytest.importorskip("fitz")
+    src = fitz.open()
+    src.new_page().insert_text((72, 72), f"Version {label} body", fontsize=12)
+    doc = fitz.open()
+    doc.new_page().show_pdf_page(fitz.Rect(0, 0, 595, 842), src, 0)
+    doc.save(path)
+    doc.close()
+    src.close()
+
+
+def test_incremental_pdf_detects_form_xobject_change(tmp_path):
+    """只修改 Form XObject 内文字的页不复用旧结果"""
+    pdf = tmp_path / "doc.pdf"
+    _make_xobject_pdf(str(pdf), "A")
+    first = extract_document.extract_pdf_incremental(str(pdf))
+    assert "Version A body" in first["full_text"]
+
+    _make_xobject_pdf(str(pdf), "B")
+    second = extract_document.extract_pdf_incremental(str(pdf), first)
+    assert "Version B body" in second["full_text"]
+    assert second["diff"]["extracted"] == 1
+    assert [item["page"] for item in second["diff"]["changed"]] == [1]
+
+
+def _make_styled_docx(path, outline_level=None):
+    """自定义段落样式 “Req Title”，outline_level 不为 None 时样式带大纲级别"""
+    docx = pytest.importorskip("docx")
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    document = docx.Document()
+    style = document.styles.add_style("Req Title", WD_STYLE_TYPE.PARAGRAPH)
+    if outline_level is not None:
+        outline = OxmlElement("w:outlineLvl")
+        outline.set(qn("w:val"), str(outline_level))
+        style.element.get_or_add_pPr().append(outline)
+    document.add_paragraph("登录功能", style="Req Title")
+    document.add_paragraph("用户名和密码校验")
+    document.save(path)
+
+
+def test_incremental_docx_detects_styles_change(tmp_path):
+    """只修改 styles.xml 时段落 XML 不变，标题级别仍按新样式更新并计入 changed"""
+    path = tmp_path / "req.docx"
+    _make_styled_docx(str(path))
+    first = extract_document.extract_docx_incremental(str(path))
+    assert first["outline"] == []
+
+    _make_styled_docx(str(path), outline_level=0)
+    second = extract_document.extract_docx_incremental(str(path), first)
+    assert second["paragraphs"][0]["level"] == 1
+    assert [entry["title"] for entry in second["outline"]] == ["登录功能"]
+    assert [item["position"] for item in second["diff"]["changed"]] == [0]
+    assert second["diff"]["added"] == [] and second["diff"]["removed"] == []
+
+    # 样式未变时全部复用
+    third = extract_document.extract_docx_incremental(str(path), second)
+    assert third["diff"]["extracted"] == 0 and third["diff"]["changed"] == []
+
+
+def _make_long_pdf(path, pages: int, with_toc: bool):
+    """每页一个章节标题加若干正文行，正文字号小于标题"""
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for index in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {index + 1}", fontsize=18)
+        for line in range(index % 4 + 1):
+            page.insert_text((72, 110 + line * 14), f"page {index + 1} line {line}", fontsize=10)
+    if with_toc:
+        doc.set_toc([[1, f"Section {i + 1}", i + 1] for i in range(pages)])
+    doc.save(path)
+    doc.close()
+
+
+@pytest.mark.parametrize("with_toc", [True, False])
+def test_parallel_pdf_matches_serial(tmp_path, with_toc):
+    """按页分片并行提取与逐页提取结果一致：页序、文本、章节索引均相同"""
+    pdf = tmp_path / "long.pdf"
+    _make_long_pdf(str(pdf), 11, with_toc)
+
+    serial = extract_document.extract_pdf(str(pdf))
+    parallel = extract_document.extract_pdf(str(pdf), jobs=3)
+    assert [p["page"] for p in parallel["pages"]] == list(range(1, 12))
+    assert parallel == serial
+    assert len(serial["outline"]) == 11
+
+    records = list(extract_document.iter_records(str(pdf), jobs=3))
+    assert [r["page"] for r in records[1:]] == list(range(1, 12))
+    assert [r["text"] for r in records[1:]] == [p["text"] for p in serial["pages"]]
+
+
+@pytest.mark.parametrize("page_count,parts", [(11, 12), (1, 4), (100, 8), (7, 7)])
+def test_split_pages_covers_all_pages(page_count, parts):
+    ranges = extract_document._split_pages(page_count, parts)
+    assert [i for start, end in ranges for i in range(start, end)] == list(range(page_count))
+    assert len(ranges) <= parts
+
+
+def _make_parity_docx(path):
+    """标题、带大纲级别的自定义样式、制表符 / 换行，以及横向、纵向合并与 gridBefore 的表格"""
+    docx = pytest.importorskip("docx")
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    def set_val(parent, tag, value):
+        node = OxmlElement(tag)
+        node.set(qn("w:val"), str(value))
+        parent.append(node)
+
+    document = docx.Document()
+    document.add_heading("需求规格说明", level=0)
+    document.add_heading("1. 登录", level=1)
+    document.add_paragraph("用户名长度 4-20 字符")
+    document.add_heading("1.1 密码", level=2)
+    run = document.add_paragraph().add_run("字段\t规则")
+    run.add_break()
+    run.add_text("第二行")
+    style = document.styles.add_style("Req Title", WD_STYLE_TYPE.PARAGRAPH)
+    set_val(style.element.get_or_add_pPr(), "w:outlineLvl", 2)
+    document.add_paragraph("2. 注册", style="Req Title")
+    document.add_paragraph("   ")
+
+    table = document.add_table(rows=4, cols=3)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"r{r}c{c}"
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(3, 2))
+    tr = table.rows[3]._tr
+    tr.remove(tr.tc_lst[0])
+    set_val(tr.get_or_add_trPr(), "w:gridBefore", 1)
+    document.add_paragraph("附录")
+    document.save(path)
+
+
+def test_docx_matches_python_docx(tmp_path):
+    """流式解析与 python-docx 原实现输出一致：段落文本与样式、合并单元格、gridBefore"""
+    import benchmark
+
+    path = tmp_path / "parity.docx"
+    _make_parity_docx(str(path))
+    reference = benchmark.legacy_extract_docx(str(path))
+    content = extract_document.extract_docx(str(path))
+
+    assert [{k: v for k, v in p.items() if k != "level"} for p in content["paragraphs"]] \
+        == reference["paragraphs"]
+    assert content["tables"] == reference["tables"]
+    assert content["full_text"] == reference["full_text"]
+    # 合并时 python-docx 把被合并单元格的内容拼接进首个单元格
+    assert reference["tables"][0]["data"][0] == ["r0c0\nr0c1"] * 2 + ["r0c2"]
+    assert reference["tables"][0]["data"][3] == ["r3c1", "r1c2\nr2c2\nr3c2"]
+    assert [(p["text"], p.get("level")) for p in content["paragraphs"] if p.get("level")] \
+        == [("1. 登录", 1), ("1.1 密码", 2), ("2. 注册", 3)]
+
+    # 流式输出与增量提取共用同一解析器
+    blocks = list(extract_document.iter_docx_blocks(str(path)))
+    assert [b["text"] for b in blocks if b["type"] == "paragraph"] \
+        == [p["text"] for p in content["paragraphs"]]
+    assert [b["data"] for b in blocks if b["type"] == "table"] == [t["data"] for t in content["tables"]]
+    incremental = extract_document.extract_docx_incremental(str(path))
+    assert incremental["paragraphs"] == content["paragraphs"] and incremental["tables"] == content["tables"]
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+
+from generate_excel import iter_json_records
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+def test_records_split_across_chunks(chunk_size):
+    """跨块边界的数字、字符串不被拆成两条记录"""
+    array = '[12345, -6.5e3, "长文本", {"用例编号": "TC_001"}, true, null]'
+    expected = [12345, -6.5e3, "长文本", {"用例编号": "TC_001"}, True, None]
+    assert list(iter_json_records(io.StringIO(array), chunk_size)) == expected
+    lines = "12345\n678\n{\"a\": 1}\n"
+    assert list(iter_json_records(io.StringIO(lines), chunk_size)) == [12345, 678, {"a": 1}]
+
+
+@pytest.mark.parametrize("text", ["[,,]", "[1,,2]", "[1,]", "[,1]", "[1 2]", "[1"])
+def test_malformed_array_rejected(text):
+    with pytest.raises(ValueError):
+        list(iter_json_records(io.StringIO(text), 2))
+
+
+def _make_template(path):
+    from openpyxl import Workbook
+    from openpyxl.formatting.rule import CellIsRule
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    from generate_excel import DEFAULT_COLUMNS
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "测试用例"
+    ws.append(DEFAULT_COLUMNS + ["扩展信息"])
+    ws.merge_cells("N1:O1")
+    ws.row_dimensions[1].height = 32
+    ws.append(["TC_示例_001", "示例", "示例行", "P1"])
+    ws.conditional_formatting.add(
+        "D2:D500", CellIsRule(operator="equal", formula=['"P0"'],
+                              fill=PatternFill("solid", start_color="FFC7CE", end_color="FFC7CE")))
+    for formula, ref in (('"P0,P1"', "D2:D500"), ('"EP,BVA"', "F2:F500")):
+        dv = DataValidation(type="list", formula1=formula, allow_blank=True)
+        dv.add(ref)
+        ws.add_data_validation(dv)
+
+    notes = wb.create_sheet("说明")
+    notes.append(["填写说明"])
+    notes.merge_cells("A1:C1")
+    notes["A1"].font = Font(bold=True, size=14)
+    notes.row_dimensions[1].height = 40
+    notes.append(["优先级", "P0 最高"])
+    notes.append(["隐藏行"])
+    notes.row_dimensions[3].hidden = True
+    notes.conditional_formatting.add(
+        "B2:B10", CellIsRule(operator="equal", formula=['"P0 最高"'], font=Font(color="9C0006")))
+    dv = DataValidation(type="list", formula1='"是,否"')
+    dv.add("C2:C5")
+    notes.add_data_validation(dv)
+    wb.save(path)
+
+
+def _sheet_format(ws):
+    """合并单元格、行属性、条件格式与数据验证的可比较摘要"""
+    merged = sorted(str(r) for r in ws.merged_cells.ranges)
+    rows = {idx: (dim.height, dim.hidden) for idx, dim in ws.row_dimensions.items()
+            if dim.height or dim.hidden}
+    formatting = sorted(
+        (str(cf.sqref), rule.type, rule.operator, tuple(rule.formula),
+         rule.dxf.fill.fgColor.rgb if rule.dxf and rule.dxf.fill else None,
+         rule.dxf.font.color.rgb if rule.dxf and rule.dxf.font else None)
+        for cf in ws.conditional_formatting for rule in cf.rules)
+    validations = sorted((str(dv.sqref), dv.formula1) for dv in ws.data_validations.dataValidation)
+    return merged, rows, formatting, validations
+
+
+def test_template_formatting_preserved(tmp_path):
+    """基于模板生成时保留合并单元格、行高、条件格式；模板中与脚本重叠的数据验证被替换"""
+    from openpyxl import load_workbook
+
+    from generate_excel import create_excel
+
+    template = tmp_path / "template.xlsx"
+    output = tmp_path / "out.xlsx"
+    _make_template(template)
+    cases = [{"用例编号": f"TC_{i:03d}", "优先级": "P0", "设计方法": "EP"} for i in range(5)]
+    assert create_excel(str(output), cases, template=str(template)) == 5
+
+    expected = load_workbook(template)
+    actual = load_workbook(output)
+    assert actual.sheetnames == expected.sheetnames
+    assert _sheet_format(actual["说明"]) == _sheet_format(expected["说明"])
+    assert actual["说明"]["A1"].font.bold and actual["说明"]["A1"].font.size == 14
+
+    merged, rows, formatting, validations = _sheet_format(actual["测试用例"])
+    exp_merged, exp_rows, exp_formatting, _ = _sheet_format(expected["测试用例"])
+    assert merged == exp_merged
+    assert rows == exp_rows
+    assert formatting == exp_formatting
+    # 优先级列只有脚本添加的验证，模板中其他列的验证原样保留
+    priority = [formula for ref, formula in validations if ref.startswith("D")]
+    assert priority == ['"P0,P1,P2,P3"']
+    assert ("F2:F500", '"EP,BVA"') in validations
+
+
+def test_update_keeps_trailing_rows_and_fonts(tmp_path):
+    """增量更新：新用例追加在尾部说明行之后，无编号用例跳过，恢复的用例保留原字体"""
+    from openpyxl import load_workbook
+    from openpyxl.styles import Font
+
+    from generate_excel import create_excel, update_excel
+
+    path = tmp_path / "cases.xlsx"
+    cases = [{"用例编号": f"TC_{i:03d}", "用例标题": f"用例{i}", "优先级": "P2"} for i in range(1, 4)]
+    create_excel(str(path), cases)
+    wb = load_workbook(path)
+    ws = wb.active
+    ws["A2"].font = Font(name="Arial", size=13, bold=True)
+    ws["B6"] = "合计：3 条"
+    wb.save(path)
+
+    summary = update_excel(str(path), cases[1:])
+    assert summary["removed"] == 1
+    font = load_workbook(path).active["A2"].font
+    assert font.strike and font.name == "Arial" and font.bold
+
+    new_cases = cases + [{"用例编号": "TC_004", "用例标题": "用例4"}, {"用例标题": "无编号"}]
+    for _ in range(2):
+        summary = update_excel(str(path), new_cases)
+        assert summary["skipped"] == 1
+    assert summary["added"] == 0 and summary["restored"] == 0
+
+    ws = load_workbook(path).active
+    assert ws["B6"].value == "合计：3 条"
+    assert [ws.cell(row=r, column=1).value for r in range(2, ws.max_row + 1)] == [
+        "TC_001", "TC_002", "TC_003", None, None, "TC_004"]
+    font = ws["A2"].font
+    assert not font.strike and font.name == "Arial" and font.size == 13 and font.bold
+    assert font.color == ws["B2"].font.color
+
+
+def test_learn_template_resolves_sheet_parts(tmp_path):
+    """工作表 XML 路径按 workbook.xml 及其关系文件解析，与部件文件名的顺序无关"""
+    import zipfile
+
+    from openpyxl import Workbook
+
+    from generate_excel import learn_template
+
+    wb = Workbook()
+    wb.active.title = "说明"
+    wb.active.append(["填写说明"])
+    ws = wb.create_sheet("用例")
+    ws.append(["用例编号", "用例标题"])
+    ws.append(["TC_登录_001", "示例"])
+    ws.column_dimensions["B"].width = 40
+    wb.active = 1
+    wb.save(tmp_path / "plain.xlsx")
+
+    # 交换两个工作表部件的文件名，并把关系改为相对路径
+    template = tmp_path / "template.xlsx"
+    swapped = {"xl/worksheets/sheet1.xml": "xl/worksheets/sheet2.xml",
+               "xl/worksheets/sheet2.xml": "xl/worksheets/sheet1.xml"}
+    with zipfile.ZipFile(tmp_path / "plain.xlsx") as src, zipfile.ZipFile(template, "w") as dst:
+        for name in src.namelist():
+            data = src.read(name)
+            if name == "xl/_rels/workbook.xml.rels":
+                data = (data.replace(b'"/xl/worksheets/sheet1.xml"', b'"worksheets/sheetB.xml"')
+                        .replace(b'"/xl/worksheets/sheet2.xml"', b'"worksheets/sheet1.xml"')
+                        .replace(b'"worksheets/sheetB.xml"', b'"worksheets/sheet2.xml"'))
+            dst.writestr(swapped.get(name, name), data)
+
+    schema = learn_template(str(template))
+    assert schema["columns"] == ["用例编号", "用例标题"]
+    assert schema["widths"][1] == 40
+    assert schema["id_format"] == "TC_{MODULE}_{SEQ:03d}"
+
+
+def test_template_schema_cache_invalidation(tmp_path, monkeypatch):
+    """模板 schema 缓存：未修改时复用；仅 mtime 变化时不重新学习；内容变化时重新学习"""
+    import os
+
+    from openpyxl import Workbook
+
+    import generate_excel
+    import memory_manager
+
+    memory_manager.init_memory(str(tmp_path))
+    template = tmp_path / "template.xlsx"
+
+    def save_template(columns):
+        wb = Workbook()
+        wb.active.append(columns)
+        wb.save(template)
+
+    learned = []
+    learn = generate_excel.learn_template
+    monkeypatch.setattr(generate_excel, "learn_template",
+                        lambda path: learned.append(path) or learn(path))
+
+    save_template(["用例编号", "用例标题"])
+    first = generate_excel.cached_learn_template(str(template), str(tmp_path))
+    assert generate_excel.cached_learn_template(str(template), str(tmp_path)) == first
+    assert len(learned) == 1
+
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    touched = generate_excel.cached_learn_template(str(template), str(tmp_path))
+    assert len(learned) == 1
+    assert touched["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+    assert touched["columns"] == first["columns"]
+
+    save_template(["用例编号", "用例标题", "优先级"])
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    changed = generate_excel.cached_learn_template(str(template), str(tmp_path))
+    assert len(learned) == 2
+    assert changed["columns"] == ["用例编号", "用例标题", "优先级"]
+    assert changed["sha256"] != first["sha256"]
+
+
+def _make_list_template(path, hyperlink: bool = False):
+    from openpyxl import Workbook
+    from openpyxl.comments import Comment
+    from openpyxl.workbook.defined_name import DefinedName
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    from generate_excel import DEFAULT_COLUMNS
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "测试用例"
+    ws.append(DEFAULT_COLUMNS)
+    ws.append(["TC_示例_001", "示例"])
+    ws["B1"].comment = Comment("从 lists 表中选择模块", "模板作者")
+    ws.auto_filter.ref = "A1:M2"
+    ws.print_title_rows = "1:1"
+    ws.page_setup.orientation = "landscape"
+    ws.page_setup.paperSize = ws.PAPERSIZE_A4
+    ws.page_margins.left = 0.3
+    ws.oddHeader.center.text = "测试用例"
+    if hyperlink:
+        ws["A2"].hyperlink = "https://example.com/TC_示例_001"
+    dv = DataValidation(type="list", formula1="=模块类型列表")
+    dv.add("B2:B500")
+    ws.add_data_validation(dv)
+
+    lists = wb.create_sheet("lists")
+    for module in ("登录", "注册", "支付"):
+        lists.append([module])
+    lists.sheet_state = "hidden"
+    wb.defined_names["模块类型列表"] = DefinedName("模块类型列表", attr_text="lists!$A$1:$A$3")
+    wb.save(path)
+
+
+@pytest.mark.parametrize("hyperlink", [False, True])
+def test_template_workbook_features_preserved(tmp_path, hyperlink):
+    """隐藏的下拉列表 Sheet、定义名称、批注、筛选、打印标题和页面设置随模板保留；
+    含超链接的模板整体载入，结果相同"""
+    from openpyxl import load_workbook
+
+    import generate_excel
+
+    template = tmp_path / "template.xlsx"
+    output = tmp_path / "out.xlsx"
+    _make_list_template(template, hyperlink)
+    assert bool(generate_excel._template_skeleton(str(template))["unsupported"]) == hyperlink
+    cases = [{"用例编号": f"TC_{i:03d}", "模块名称": "登录", "优先级": "P1"} for i in range(3)]
+    assert generate_excel.create_excel(str(output), cases, template=str(template)) == 3
+
+    wb = load_workbook(output)
+    assert wb.sheetnames == ["测试用例", "lists"]
+    assert wb["lists"].sheet_state == "hidden"
+    assert wb.defined_names["模块类型列表"].attr_text == "lists!$A$1:$A$3"
+    ws = wb.active
+    assert ws.title == "测试用例"
+    assert ws["A1"].value == "用例编号" and ws["A2"].value == "TC_000" and ws.max_row == 4
+    assert ws["B1"].comment.text == "从 lists 表中选择模块"
+    assert ws.auto_filter.ref == "A1:M4"
+    assert ws.print_title_rows == "$1:$1"
+    assert ws.page_setup.orientation == "landscape" and ws.page_setup.paperSize == 9
+    assert ws.page_margins.left == 0.3
+    assert ws.oddHeader.center.text == "测试用例"
+    assert ws["A2"].hyperlink is None
+    validations = {str(dv.sqref): dv.formula1 for dv in ws.data_validations.dataValidation}
+    assert validations["B2:B500"] == "=模块类型列表"
+    assert validations["D2:D4"] == '"P0,P1,P2,P3"'
+
+
+def _sheet_snapshot(ws):
+    """单元格值与样式、列宽、冻结窗格、数据验证与条件格式的可比较摘要"""
+    cells = [[(c.value, c.font.b, c.font.color.rgb if c.font.color else None,
+               c.fill.fgColor.rgb, c.alignment.wrap_text, c.alignment.vertical,
+               c.border.left.style, c.number_format) for c in row]
+             for row in ws.iter_rows()]
+    widths = {key: dim.width for key, dim in ws.column_dimensions.items() if dim.width}
+    validations = sorted((str(dv.sqref), dv.formula1, dv.error) for dv in ws.data_validations.dataValidation)
+    return cells, widths, ws.freeze_panes, validations, _sheet_format(ws)[2]
+
+
+@pytest.mark.parametrize("traceability", [False, True])
+def test_streaming_matches_default(tmp_path, traceability):
+    """流式模式与默认模式生成的工作簿在值、样式和数据验证上一致"""
+    from openpyxl import load_workbook
+
+    from generate_excel import create_excel
+
+    cases = [{"用例编号": f"TC_{i:03d}", "模块名称": "登录", "用例标题": f"用例 {i}",
+              "优先级": f"P{i % 4}", "关联需求ID": f"REQ-{i % 3 + 1}", "设计方法": "EP",
+              "测试步骤": "1. 打开页面\n2. 输入", "回归类型": "冒烟"} for i in range(12)]
+    requirements = [{"id": f"REQ-{i}", "name": f"需求 {i}"} for i in range(1, 5)]
+    outputs = {}
+    for streaming in (False, True):
+        output = tmp_path / f"out_{streaming}.xlsx"
+        assert create_excel(str(output), iter(cases), traceability=traceability,
+                            requirements=requirements, streaming=streaming) == len(cases)
+        outputs[streaming] = load_workbook(output)
+
+    default, streamed = outputs[False], outputs[True]
+    assert streamed.sheetnames == default.sheetnames
+    for name in default.sheetnames:
+        assert _sheet_snapshot(streamed[name]) == _sheet_snapshot(default[name]), name
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_manifest_isolates_bad_entries(tmp_path, jobs):
+    """批量清单：不同格式、模板与内嵌数据混合，失败项只记录错误，其他项照常生成"""
+    import json
+
+    from openpyxl import load_workbook
+
+    from generate_excel import run_batch
+
+    cases = [{"用例编号": f"TC_{i:03d}", "用例标题": f"用例 {i}", "优先级": "P1"} for i in range(3)]
+    (tmp_path / "cases.jsonl").write_text(
+        "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in cases), encoding="utf-8")
+    _make_template(tmp_path / "template.xlsx")
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps([
+        {"output": "plain.xlsx", "data": cases, "streaming": True},
+        {"output": "templated.xlsx", "data_file": "cases.jsonl", "template": "template.xlsx"},
+        {"output": "cases.txt", "data_file": "cases.jsonl", "format": "csv"},
+        {"output": "table.md", "data_file": "cases.jsonl"},
+        {"output": "missing.xlsx", "data_file": "missing.jsonl"},
+        {"data": cases},
+        "bad.xlsx",
+    ], ensure_ascii=False), encoding="utf-8")
+
+    results = run_batch(str(manifest), jobs)
+    assert [r["case_count"] for r in results] == [3, 3, 3, 3, 0, 0, 0]
+    assert [bool(r["error"]) for r in results] == [False] * 4 + [True] * 3
+    assert results[5]["error"] == "缺少 output 字段" and results[6]["output"] is None
+
+    assert load_workbook(tmp_path / "plain.xlsx").active["A4"].value == "TC_002"
+    assert load_workbook(tmp_path / "templated.xlsx").sheetnames == ["测试用例", "说明"]
+    assert (tmp_path / "cases.txt").read_text(encoding="utf-8-sig").splitlines()[1].startswith("TC_000,")
+    assert "| TC_001 |" in (tmp_path / "table.md").read_text(encoding="utf-8")
+    assert not (tmp_path / "missing.xlsx").exists()
+
+
+def test_text_writers(tmp_path):
+    """CSV / JSONL / Markdown：格式按扩展名或显式参数决定，列顺序与 xlsx 一致，特殊字符被转义"""
+    import csv
+    import json
+
+    from generate_excel import DEFAULT_COLUMNS, create_excel
+
+    cases = [{"用例编号": "TC_001", "用例标题": "密码含 | 与逗号,", "测试步骤": "1. 打开\n2. 输入",
+              "优先级": "P0"},
+             {"用例编号": "TC_002", "用例标题": "空值", "备注": None}]
+
+    assert create_excel(str(tmp_path / "cases.csv"), iter(cases)) == 2
+    with open(tmp_path / "cases.csv", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == DEFAULT_COLUMNS
+    assert rows[1][DEFAULT_COLUMNS.index("用例标题")] == "密码含 | 与逗号,"
+    assert rows[1][DEFAULT_COLUMNS.index("测试步骤")] == "1. 打开\n2. 输入"
+    assert (tmp_path / "cases.csv").read_bytes().startswith(b"\xef\xbb\xbf")
+
+    assert create_excel(str(tmp_path / "cases.ndjson"), cases) == 2
+    lines = (tmp_path / "cases.ndjson").read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert list(records[0]) == DEFAULT_COLUMNS
+    assert records[0]["测试步骤"] == "1. 打开\n2. 输入" and records[1]["优先级"] is None
+
+    assert create_excel(str(tmp_path / "cases.txt"), cases, output_format="markdown",
+                        schema={"columns": ["用例编号", "用例标题", "测试步骤"]}) == 2
+    table = (tmp_path / "cases.txt").read_text(encoding="utf-8").splitlines()
+    assert table == ["| 用例编号 | 用例标题 | 测试步骤 |",
+                     "|---|---|---|",
+                     "| TC_001 | 密码含 \\| 与逗号, | 1. 打开<br>2. 输入 |",
+                     "| TC_002 | 空值 |  |"]
+
+    with pytest.raises(ValueError):
+        create_excel(str(tmp_path / "cases.md"), cases, traceability=True)
+    with pytest.raises(ValueError):
+        create_excel(str(tmp_path / "cases.xml"), cases, output_format="xml")
+
+
+def test_text_writers_use_template_columns(tmp_path):
+    """指定模板时文本格式使用模板学习到的列"""
+    import json
+
+    from generate_excel import create_excel, learn_template
+
+    template = tmp_path / "template.xlsx"
+    _make_template(template)
+    columns = learn_template(str(template))["columns"]
+    create_excel(str(tmp_path / "cases.jsonl"), [{"用例编号": "TC_001"}], template=str(template))
+    record = json.loads((tmp_path / "cases.jsonl").read_text(encoding="utf-8"))
+    assert list(record) == columns and record["用例编号"] == "TC_001"
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import memory_manager as mm
+from conftest import SCRIPTS_DIR
+
+
+def _project(tmp_path):
+    mm.init_memory(str(tmp_path))
+    return str(tmp_path)
+
+
+def test_short_query_contained_in_longer_context(tmp_path):
+    """较短的查询被较长的决策上下文包含时仍能找到（与原先的子串匹配一致）"""
+    project = _project(tmp_path)
+    mm.add_ambiguity_decision(project, {"type": "BOUNDARY_UNCLEAR",
+                                        "context": "用户名长度限制为6-20个字符，超出时提示错误",
+                                        "user_decision": "6-20 位"})
+    mm.add_ambiguity_decision(project, {"type": "FORMAT_UNCLEAR",
+                                        "context": "Password must contain letters and digits",
+                                        "user_decision": "字母+数字"})
+    mm.add_ambiguity_decision(project, {"type": "BOUNDARY_UNCLEAR",
+                                        "context": "订单金额上限未说明",
+                                        "user_decision": "100000"})
+
+    found = mm.find_similar_ambiguity(project, "BOUNDARY_UNCLEAR", "用户名长度")
+    assert found and found["user_decision"] == "6-20 位"
+    found = mm.find_similar_ambiguity(project, "FORMAT_UNCLEAR", "Password")
+    assert found and found["user_decision"] == "字母+数字"
+    # 查询中索引没有的词仍计入权重，无关查询不会因此得满分
+    assert mm.find_similar_ambiguity(project, "BOUNDARY_UNCLEAR", "上传头像格式") is None
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_batch_add_record_compacts_history(tmp_path, backend):
+    """批量 add-record 与单条 add-record 一样按保留策略自动压缩"""
+    project = _project(tmp_path)
+    if backend == "sqlite":
+        mm.migrate_memory(project, "sqlite")
+    mm.set_preference(project, "history_retention", {"keep_runs": 2, "keep_days": 0})
+    operations = [{"action": "add-record",
+                   "data": {"type": "test_case", "case_count": 1, "modules": ["登录"]}}
+                  for _ in range(80)]
+    results = mm.run_batch(project, operations)
+    assert all("error" not in r for r in results)
+
+    history = mm.read_memory(project, "generation_history")
+    assert len(history["generations"]) == 2
+    rolled = history["rollups"]["登录"]
+    assert sum(bucket["runs"] for bucket in rolled.values()) == 78
+
+
+def test_batch_malformed_operations_do_not_abort(tmp_path):
+    """格式错误的操作只在该项返回 error，前后合法操作的写入照常生效"""
+    project = _project(tmp_path)
+    operations = [
+        {"action": "set-mode", "mode": "quick"},
+        "read",
+        None,
+        {"type": "user_preferences"},
+        {"action": "update", "type": "user_preferences", "data": "quick"},
+        {"action": "add-record", "data": ["登录"]},
+        {"action": "unknown"},
+        {"action": "add-record", "data": {"type": "test_case", "case_count": 3}},
+        {"action": "get-mode"},
+    ]
+    results = mm.run_batch(project, operations)
+
+    assert len(results) == len(operations)
+    assert [("error" in r) for r in results] == [False, True, True, True, True, True, True, False, False]
+    assert results[1]["action"] is None and results[3]["error"] == "缺少字段 'action'"
+    assert results[-1]["result"] == "quick"
+    assert mm.read_memory(project, "user_preferences")["interaction_mode"] == "quick"
+    generations = mm.read_memory(project, "generation_history")["generations"]
+    assert [g["case_count"] for g in generations] == [3]
+
+
+def test_migrate_round_trip_preserves_records(tmp_path):
+    """JSON -> SQLite -> JSON 迁移后记录、汇总与查询结果不变，其他记忆仍为 JSON 文件"""
+    project = _project(tmp_path)
+    mm.set_preference(project, "history_retention", {"keep_runs": 3, "keep_days": 0})
+    for i in range(60):
+        mm.add_generation_record(project, {"type": "test_case" if i % 2 else "test_plan",
+                                           "case_count": i, "modules": [f"模块{i % 3}"]})
+    mm.add_ambiguity_decision(project, {"type": "BOUNDARY_UNCLEAR",
+                                        "context": "用户名长度限制为6-20个字符",
+                                        "user_decision": "6-20 位"})
+    expected = {t: mm.read_memory(project, t) for t in mm.RECORD_LISTS}
+    expected_query = mm.query_records(project, "generation_history", record_type="test_case", limit=2)
+    assert expected["generation_history"]["rollups"]
+
+    memory = tmp_path / mm.MEMORY_DIR
+    mm.migrate_memory(project, "sqlite")
+    assert (memory / mm.DB_FILE).exists()
+    assert not (memory / mm.FILES["generation_history"]).exists()
+    assert (memory / (mm.FILES["generation_history"] + ".migrated")).exists()
+    assert (memory / mm.FILES["user_preferences"]).exists()
+    assert {t: mm.read_memory(project, t) for t in mm.RECORD_LISTS} == expected
+    assert mm.query_records(project, "generation_history", record_type="test_case", limit=2) == expected_query
+    found = mm.find_similar_ambiguity(project, "BOUNDARY_UNCLEAR", "用户名长度")
+    assert found and found["user_decision"] == "6-20 位"
+
+    # SQLite 后端上继续写入，迁回后同样保留
+    mm.add_generation_record(project, {"type": "test_case", "case_count": 99, "modules": ["模块0"]})
+    expected = {t: mm.read_memory(project, t) for t in mm.RECORD_LISTS}
+    mm.migrate_memory(project, "json")
+    assert not (memory / mm.DB_FILE).exists()
+    assert (memory / (mm.DB_FILE + ".migrated")).exists()
+    assert {t: mm.read_memory(project, t) for t in mm.RECORD_LISTS} == expected
+    assert mm.query_records(project, "generation_history", limit=1)[0]["case_count"] == 99
+
+    with pytest.raises(ValueError):
+        mm.migrate_memory(project, "csv")
+
+
+def _append_many(project: str, worker: int, count: int):
+    for i in range(count):
+        mm.add_ambiguity_decision(project, {"type": "BOUNDARY_UNCLEAR", "context": f"{worker}-{i}",
+                                            "user_decision": "x"})
+        mm.set_preference(project, f"worker_{worker}", i)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_writers_lose_nothing(tmp_path, backend):
+    """多个进程同时追加记录、修改偏好，持锁读-改-写不丢失更新"""
+    project = _project(tmp_path)
+    if backend == "sqlite":
+        mm.migrate_memory(project, "sqlite")
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(_append_many, [project] * 4, range(4), [15] * 4))
+
+    contexts = {d["context"] for d in mm.read_memory(project, "ambiguity_decisions")["decisions"]}
+    assert contexts == {f"{w}-{i}" for w in range(4) for i in range(15)}
+    prefs = mm.get_preferences(project)
+    assert [prefs[f"worker_{w}"] for w in range(4)] == [14] * 4
+    assert not list((tmp_path / mm.MEMORY_DIR).glob("*.tmp"))
+
+
+def test_lock_blocks_other_processes_and_is_reentrant(tmp_path):
+    """持锁期间其他进程的写入等待；同一进程内嵌套加锁不死锁"""
+    project = _project(tmp_path)
+    code = f"import memory_manager as mm; mm.set_interaction_mode({project!r}, 'expert')"
+    with mm.memory_lock(project):
+        with mm.memory_lock(project):
+            mm.set_interaction_mode(project, "quick")
+        writer = subprocess.Popen([sys.executable, "-c", code], cwd=str(SCRIPTS_DIR),
+                                  stdout=subprocess.DEVNULL)
+        time.sleep(0.5)
+        assert writer.poll() is None
+        assert mm.get_interaction_mode(project) == "quick"
+    assert writer.wait(timeout=30) == 0
+    assert mm.get_interaction_mode(project) == "expert"
+
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    """写入中途失败时原文件保持完整，临时文件被清理"""
+    project = _project(tmp_path)
+    mm.set_interaction_mode(project, "quick")
+    path = tmp_path / mm.MEMORY_DIR / mm.FILES["user_preferences"]
+    before = path.read_text(encoding="utf-8")
+
+    def broken_dump(data, f, **kwargs):
+        f.write('{"interaction_mode": ')
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(mm.json, "dump", broken_dump)
+    with pytest.raises(OSError):
+        mm.set_interaction_mode(project, "expert")
+    monkeypatch.undo()
+
+    assert path.read_text(encoding="utf-8") == before
+    assert json.loads(before)["interaction_mode"] == "quick"
+    assert not list(path.parent.glob("*.tmp"))
+
+
+def test_coverage_rate_is_a_percentage(tmp_path):
+    """coverage_rate 统一为百分数：--stats-only 的输出可原样记录，"95%" 写法按 95.0 保存并参与汇总"""
+    from generate_excel import analyze_cases
+
+    project = _project(tmp_path)
+    stats = analyze_cases([{"用例编号": "TC_001", "关联需求ID": "REQ-1"}],
+                          [{"id": "REQ-1"}, {"id": "REQ-2"}])
+    assert stats["coverage_rate"] == 50.0
+
+    mm.add_generation_record(project, {"type": "test_case", "modules": ["登录"],
+                                       "coverage_rate": stats["coverage_rate"]})
+    mm.run_batch(project, [{"action": "add-record",
+                            "data": {"type": "test_case", "modules": ["登录"], "coverage_rate": "95%"}}])
+    generations = mm.read_memory(project, "generation_history")["generations"]
+    assert [g["coverage_rate"] for g in generations] == [50.0, 95.0]
+
+    mm.compact_generation_history(project, keep_runs=0, keep_days=0)
+    bucket = next(iter(mm.read_memory(project, "generation_history")["rollups"]["登录"].values()))
+    assert bucket["coverage_rate"] == 72.5 and bucket["coverage_samples"] == 2
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import json
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+from conftest import SCRIPTS_DIR
+
+# 测试机器负载不稳定，冷启动预算按该倍数放宽
+BUDGET_TOLERANCE = 3.0
+
+
+def _modules_after(code: str) -> set:
+    """在干净的解释器中执行代码，返回执行后已加载的重量级依赖"""
+    probe = code + "\nimport json, sys\nprint(json.dumps(sorted({'openpyxl', 'fitz', 'pymupdf'} & set(sys.modules))))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=str(SCRIPTS_DIR), check=True,
+                         capture_output=True, text=True).stdout
+    return set(json.loads(out.splitlines()[-1]))
+
+
+@pytest.mark.parametrize("module", ["generate_excel", "extract_document", "memory_manager"])
+def test_import_does_not_load_heavy_dependencies(module):
+    """导入脚本模块不加载 openpyxl / PyMuPDF，它们只在真正用到时导入"""
+    assert _modules_after(f"import {module}") == set()
+
+
+def test_markdown_writer_does_not_load_openpyxl(tmp_path):
+    """非 xlsx 输出不需要 openpyxl"""
+    output = tmp_path / "cases.md"
+    code = ("import generate_excel\n"
+            f"generate_excel.create_excel({str(output)!r}, [{{'用例编号': 'TC-001', '用例标题': '登录'}}])")
+    assert _modules_after(code) == set()
+    assert "TC-001" in output.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("command", ["memory_manager get-mode", "extract_document markdown",
+                                     "generate_excel markdown"])
+def test_cold_start_within_budget(tmp_path, command):
+    """冷启动增量耗时不超过 STARTUP_BUDGETS_MS（按 BUDGET_TOLERANCE 放宽）"""
+    argv = benchmark._startup_commands(str(tmp_path))[command]
+    baseline = benchmark._min_wall(["-c", "pass"], 3)
+    overhead_ms = (benchmark._min_wall(argv, 3) - baseline) * 1000
+    assert overhead_ms <= benchmark.STARTUP_BUDGETS_MS[command] * BUDGET_TOLERANCE
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import socket
+import stat
+import time
+
+import pytest
+
+import memory_manager
+import worker
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "getuid"), reason="需要 Unix socket")
+
+
+@pytest.fixture
+def listener(tmp_path, monkeypatch):
+    """在 TEST_DOC_WORKER_SOCKET 处监听的伪造 socket，返回 (目录, 路径, 监听 socket)"""
+    directory = tmp_path / "run"
+    directory.mkdir(mode=0o700)
+    path = str(directory / "worker.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    server.settimeout(0.2)
+    monkeypatch.setenv("TEST_DOC_WORKER_SOCKET", path)
+    monkeypatch.delenv("TEST_DOC_NO_WORKER", raising=False)
+    yield directory, path, server
+    server.close()
+
+
+def _connected(server) -> bool:
+    try:
+        conn, _ = server.accept()
+    except socket.timeout:
+        return False
+    conn.close()
+    return True
+
+
+@pytest.mark.parametrize("loosen", ["socket", "directory"])
+def test_untrusted_socket_runs_in_process(listener, loosen):
+    """socket 或其目录对其他用户开放时不连接、不发送 argv，回退到本进程执行"""
+    directory, path, server = listener
+    if loosen == "socket":
+        os.chmod(path, 0o666)
+    else:
+        os.chmod(directory, 0o777)
+    assert worker.run_via_worker("memory_manager", ["--action", "get-mode"]) is False
+    assert not _connected(server)
+
+
+def test_private_socket_is_trusted(listener):
+    directory, path, server = listener
+    os.chmod(path, 0o600)
+    assert worker._trusted_socket(path)
+
+
+def test_default_socket_in_private_directory(tmp_path, monkeypatch):
+    """默认 socket 位于仅当前用户可访问的目录，工作进程可正常启动、响应和停止"""
+    monkeypatch.delenv("TEST_DOC_WORKER_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    path = worker.socket_path()
+    assert os.path.dirname(path) == str(tmp_path / f"test-doc-worker-{os.getuid()}")
+
+    status = worker.start(idle_timeout=30)
+    try:
+        assert status["socket"] == path
+        assert stat.S_IMODE(os.lstat(os.path.dirname(path)).st_mode) == 0o700
+        assert stat.S_IMODE(os.lstat(path).st_mode) & 0o077 == 0
+    finally:
+        worker.request({"op": "shutdown"}, timeout=5)
+
+
+@pytest.fixture
+def running_worker(tmp_path, monkeypatch):
+    """在临时目录中启动的真实工作进程，返回项目目录"""
+    monkeypatch.delenv("TEST_DOC_WORKER_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    worker.start(idle_timeout=60)
+    project = tmp_path / "project"
+    project.mkdir()
+    memory_manager.init_memory(str(project))
+    yield str(project)
+    worker.request({"op": "shutdown"}, timeout=10)
+
+
+def _run_payload(project: str, mode: str) -> dict:
+    return {"op": "run", "script": "memory_manager", "cwd": project,
+            "argv": ["--action", "set-mode", "--mode", mode, "--project", project],
+            "env": {name: os.environ.get(name) for name in worker.WORKER_ENV}}
+
+
+def _mode(project: str):
+    path = os.path.join(project, ".memory", "user-preferences.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("interaction_mode")
+
+
+def test_worker_runs_request(running_worker):
+    response = worker.request(_run_payload(running_worker, "quick"))
+    assert response["returncode"] == 0
+    assert _mode(running_worker) == "quick"
+
+
+def test_env_mismatch_is_refused(running_worker, monkeypatch):
+    """调用方的 TZ 等环境变量与工作进程不同时拒绝执行，调用方回退到本进程"""
+    monkeypatch.setenv("TZ", "Asia/Tokyo" if os.environ.get("TZ") != "Asia/Tokyo" else "UTC")
+    with pytest.raises(ConnectionRefusedError, match="TZ"):
+        worker.request(_run_payload(running_worker, "quick"))
+    assert worker.run_via_worker("memory_manager", ["--action", "get-mode",
+                                                    "--project", running_worker]) is False
+    assert _mode(running_worker) is None
+
+
+def test_busy_worker_falls_back_without_running_twice(running_worker):
+    """工作进程正忙时确认超时，请求放弃且之后也不会被执行"""
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(worker.socket_path())
+    stalled.sendall(json.dumps({"op": "status"}).encode("utf-8") + b"\n")
+    assert worker._recv_line(stalled) == b"ok"
+    # 不回复 go：工作进程等待至 ACCEPT_TIMEOUT，其间的请求得不到确认
+    with pytest.raises(OSError):
+        worker.request(_run_payload(running_worker, "expert"), timeout=0.3)
+    stalled.close()
+
+    time.sleep(worker.ACCEPT_TIMEOUT + 0.5)
+    assert worker.request({"op": "status"})["served"] == 0
+    assert _mode(running_worker) is None